@@ -0,0 +1,5 @@
+"""
+Benchmarks of the byteguide hot paths.
+
+Run `python -m benchmarks --help` from the repository root, see `__main__` for the options.
+"""
@@ -0,0 +1,144 @@
+"""
+Benchmark runner.
+
+Example:
+    python -m benchmarks --projects 200 --versions 10 --files 20 --output results.json
+    python -m benchmarks --output new.json --baseline results.json --threshold 0.25
+
+A synthetic tree is generated in a temporary directory (or `--root`, which must not exist),
+`docfiles_dir` is pointed at it and the cases are timed. The exit code is 1 if a case got
+slower than the baseline by more than the threshold.
+"""
+
+import argparse
+import datetime as dt
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import typing as t
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+
+    Returns:
+        argparse.Namespace: options.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the byteguide scanner, search, metadata and upload paths.")
+    parser.add_argument("--projects", type=int, default=100, help="number of projects")
+    parser.add_argument("--versions", type=int, default=5, help="versions per project")
+    parser.add_argument("--files", type=int, default=10, help="files per version")
+    parser.add_argument("--file-size", type=int, default=4096, help="approximate bytes per file")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generated tree")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per case")
+    parser.add_argument("--cases", nargs="*", help="run only the cases starting with these prefixes")
+    parser.add_argument("--metadata-backend", choices=["json", "sqlite"], default=config.metadata_backend)
+    parser.add_argument("--log-level", default="WARNING", help="byteguide log level while benchmarking")
+    parser.add_argument("--root", type=Path, help="directory to generate the tree in, kept after the run")
+    parser.add_argument("--output", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="compare against these stored results")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown over the baseline")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace, root: Path) -> t.Dict[str, t.Any]:
+    """
+    Generate the tree and time the cases.
+
+    Args:
+        args (argparse.Namespace): options.
+        root (Path): docs directory to generate.
+
+    Returns:
+        t.Dict[str, t.Any]: results document.
+    """
+    # byteguide modules read `docfiles_dir` when they are used, it is switched before
+    # anything touches the catalog and the cases are imported afterwards
+    config.update(docfiles_dir=root, metadata_backend=args.metadata_backend, catalog_check_interval=0)
+
+    from benchmarks.cases import build_cases, time_case  # pylint: disable=import-outside-toplevel
+    from benchmarks.tree import Scale, generate_tree  # pylint: disable=import-outside-toplevel
+
+    scale = Scale(args.projects, args.versions, args.files, args.file_size)
+    generate_tree(root, scale, args.seed)
+
+    results = {}
+
+    for name, (setup, func) in build_cases(scale, args.seed).items():
+        if args.cases and not name.startswith(tuple(args.cases)):
+            continue
+
+        results[name] = time_case(setup, func, args.repeat)
+        print(f"{name:40} median {results[name]['median_ms']:10.3f} ms  min {results[name]['min_ms']:10.3f} ms")
+
+    return {
+        "meta": {
+            "date": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "metadata_backend": args.metadata_backend,
+            "scale": scale._asdict(),  # pylint: disable=no-member
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> int:
+    """
+    Command line entry point.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+
+    Returns:
+        int: exit code.
+    """
+    args = parse_args(argv)
+
+    log.remove()
+    log.add(sys.stderr, level=args.log_level)
+
+    if args.root is not None:
+        args.root.mkdir(parents=True)
+        results = run(args, args.root)
+    else:
+        root = Path(tempfile.mkdtemp(prefix="byteguide-bench-"))
+        try:
+            results = run(args, root)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4), encoding="utf-8")
+
+    if args.baseline is None:
+        return 0
+
+    from benchmarks.compare import compare  # pylint: disable=import-outside-toplevel
+
+    regressions = compare(json.loads(args.baseline.read_text(encoding="utf-8")), results, args.threshold)
+
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression.case}: {regression.baseline_ms:.3f} ms -> {regression.current_ms:.3f} ms "
+            f"({regression.ratio:.2f}x)"
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
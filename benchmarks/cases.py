@@ -0,0 +1,109 @@
+""" Timed benchmark cases. """
+
+import io
+import random
+import statistics
+import time
+import typing as t
+
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.tree import LANGS, TAGS, Scale, project_name, version_zip
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.dtypes import Status
+from byteguide.libs.fs import MetaDataHandler, Uploader, docs_dir_scanner
+
+# name -> (setup, timed function), setup runs before every repetition and is not timed
+Case = t.Tuple[t.Callable[[], None], t.Callable[[], t.Any]]
+
+
+def _no_setup() -> None:
+    """Cases without a setup step."""
+
+
+def time_case(setup: t.Callable[[], None], func: t.Callable[[], t.Any], repeat: int) -> t.Dict[str, float]:
+    """
+    Time a case.
+
+    Args:
+        setup (t.Callable[[], None]): untimed preparation, called before each run.
+        func (t.Callable[[], t.Any]): timed function.
+        repeat (int): number of runs.
+
+    Returns:
+        t.Dict[str, float]: timings in milliseconds.
+    """
+    timings = []
+
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "runs": repeat,
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+        "max_ms": max(timings),
+    }
+
+
+class UploadCase:
+    """
+    Uploads a new version of a project on every run.
+    """
+
+    def __init__(self, project: str, scale: Scale, seed: int) -> None:
+        self.project = project
+        self.scale = scale
+        self.rnd = random.Random(seed)
+        self.uploader = Uploader()
+        self.uniq_key = MetaDataHandler(project).metadata["unique-key"]
+        self.count = 0
+        self.archive = b""
+
+    def setup(self) -> None:
+        """Create the archive of the next version."""
+        self.count += 1
+        self.archive = version_zip(self.rnd, self.project, self._version(), self.scale)
+
+    def _version(self) -> str:
+        return f"9.{self.count}.0"
+
+    def run(self) -> None:
+        """Upload the prepared archive."""
+        archive = FileStorage(stream=io.BytesIO(self.archive), filename=f"{self.project}-{self._version()}.zip")
+        status = self.uploader.upload(archive, self.uniq_key)
+
+        if status != Status.OK:
+            raise RuntimeError(f"benchmark upload failed with {status}")
+
+
+def build_cases(scale: Scale, seed: int) -> t.Dict[str, Case]:
+    """
+    Create the benchmark cases for a generated tree.
+
+    Args:
+        scale (Scale): size of the generated tree.
+        seed (int): seed the tree was generated with.
+
+    Returns:
+        t.Dict[str, Case]: cases by name.
+    """
+    middle = project_name(scale.projects // 2)
+    upload = UploadCase(project_name(0), scale, seed)
+
+    return {
+        "scanner.get_all_projects.cold": (project_catalog.reset, docs_dir_scanner.get_all_projects),
+        "scanner.get_all_projects.warm": (_no_setup, docs_dir_scanner.get_all_projects),
+        "search.lang": (_no_setup, lambda: docs_dir_scanner.search_by_filter(lang=LANGS[0])),
+        "search.tag": (_no_setup, lambda: docs_dir_scanner.search_by_filter(tag=TAGS[0])),
+        "search.pattern": (_no_setup, lambda: docs_dir_scanner.search_by_filter(pattern="bench-proj-1.*")),
+        "search.combined": (_no_setup, lambda: docs_dir_scanner.search_by_filter(lang=LANGS[0], tag=TAGS[0])),
+        "metadata.get_proj_versions": (_no_setup, lambda: docs_dir_scanner.get_proj_versions(middle)),
+        "metadata.read": (_no_setup, lambda: MetaDataHandler(middle).read_metadata()),
+        "metadata.add_version": (_no_setup, lambda: MetaDataHandler(middle).add_version("0.0.1")),
+        "upload": (upload.setup, upload.run),
+    }
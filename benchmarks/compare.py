@@ -0,0 +1,46 @@
+""" Comparison of benchmark results against a baseline. """
+
+import typing as t
+
+
+class Regression(t.NamedTuple):
+    """
+    A case which got slower than allowed.
+    """
+
+    case: str
+    baseline_ms: float
+    current_ms: float
+
+    @property
+    def ratio(self) -> float:
+        """Current over baseline time."""
+        return self.current_ms / self.baseline_ms
+
+
+def compare(baseline: t.Dict, current: t.Dict, threshold: float) -> t.List[Regression]:
+    """
+    Compare the median timings of two result documents.
+
+    Cases missing from either document are ignored.
+
+    Args:
+        baseline (t.Dict): stored results.
+        current (t.Dict): results of this run.
+        threshold (float): allowed slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        t.List[Regression]: cases slower than the baseline by more than the threshold.
+    """
+    regressions = []
+
+    for case, result in current["results"].items():
+        base = baseline["results"].get(case)
+
+        if base is None or base["median_ms"] <= 0:
+            continue
+
+        if result["median_ms"] > base["median_ms"] * (1 + threshold):
+            regressions.append(Regression(case, base["median_ms"], result["median_ms"]))
+
+    return regressions
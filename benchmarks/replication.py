@@ -0,0 +1,342 @@
+"""
+End-to-end check of the replication of a writer to a read-only replica over loopback.
+
+Example:
+    python -m benchmarks.replication --versions 3 --files 20
+
+A writer is served from a separate process on a free local port, the current process uploads
+versions to its docs tree and then syncs a replica from it with `Replicator.sync`, first from a
+snapshot and then incrementally after a new version, a reupload and a delete. The exit code is 1
+if the docs trees differ after a sync, the replica received the unique key of the project or the
+writer serves its replication routes without the token or `metadata.json`.
+"""
+
+import argparse
+import filecmp
+import io
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import typing as t
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.tree import Scale, version_zip
+from byteguide.config import config
+
+PROJECT = "replication-proj"
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+
+    Returns:
+        argparse.Namespace: options.
+    """
+    parser = argparse.ArgumentParser(description="Replicate a writer to a read-only replica and compare the trees.")
+    parser.add_argument("--versions", type=int, default=3, help="versions uploaded before the first sync")
+    parser.add_argument("--files", type=int, default=20, help="files per version")
+    parser.add_argument("--file-size", type=int, default=4096, help="approximate bytes per file")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generated docs")
+    parser.add_argument("--root", type=Path, help="directory for the writer and replica trees, kept after the run")
+    return parser.parse_args(argv)
+
+
+def _setup(docs_dir: Path, token: str, primary: str = "") -> None:
+    """
+    Point the config at the docs tree of the writer, or of the replica if `primary` is set.
+    """
+    config.update(
+        docfiles_dir=docs_dir,
+        readonly=bool(primary),
+        replication_primary=primary,
+        replication_token=token,
+        catalog_check_interval=0,
+    )
+    log.remove()
+    log.add(sys.stderr, level="WARNING")
+
+
+def _serve(docs_dir: Path, token: str, port: t.Any) -> None:
+    """
+    Writer process, serves the app on a free local port and reports the port.
+
+    Args:
+        docs_dir (Path): docs tree of the writer.
+        token (str): replication token.
+        port (t.Any): multiprocessing value the port is written to.
+    """
+    _setup(docs_dir, token)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    from werkzeug.serving import make_server  # pylint: disable=import-outside-toplevel
+
+    from byteguide import app  # pylint: disable=import-outside-toplevel
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    port.value = server.port
+    server.serve_forever()
+
+
+def _upload(rnd: random.Random, scale: Scale, uniq_key: str, version: str, reupload: bool = False) -> None:
+    from byteguide.libs.dtypes import Status  # pylint: disable=import-outside-toplevel
+    from byteguide.libs.fs import Uploader  # pylint: disable=import-outside-toplevel
+
+    archive = FileStorage(
+        stream=io.BytesIO(version_zip(rnd, PROJECT, version, scale)), filename=f"{PROJECT}-{version}.zip"
+    )
+    status = Uploader().upload(archive, uniq_key, reupload=reupload)
+
+    if not status.succeeded or status == Status.UNCHANGED:
+        raise RuntimeError(f"upload of {PROJECT} {version} failed with {status}")
+
+
+def compare_trees(writer: Path, replica: Path) -> t.List[str]:
+    """
+    Compare the published docs of the writer and the replica.
+
+    Hidden bookkeeping directories and `metadata.json` are skipped, the metadata is
+    compared by `compare_metadata`.
+
+    Args:
+        writer (Path): docs tree of the writer.
+        replica (Path): docs tree of the replica.
+
+    Returns:
+        t.List[str]: differences, empty if the trees match.
+    """
+
+    def listing(root: Path) -> t.Dict[str, Path]:
+        return {
+            path.relative_to(root).as_posix(): path
+            for path in root.rglob("*")
+            if not any(part.startswith(".") for part in path.relative_to(root).parts)
+            and path.name != "metadata.json"
+            and (path.is_file() or path.is_symlink())
+        }
+
+    expected, actual = listing(writer), listing(replica)
+    differences = [f"missing on the replica: {path}" for path in sorted(expected.keys() - actual.keys())]
+    differences.extend(f"only on the replica: {path}" for path in sorted(actual.keys() - expected.keys()))
+
+    for path in sorted(expected.keys() & actual.keys()):
+        source, copy = expected[path], actual[path]
+
+        if source.is_symlink() or copy.is_symlink():
+            same = source.is_symlink() and copy.is_symlink() and os.readlink(source) == os.readlink(copy)
+        else:
+            same = filecmp.cmp(source, copy, shallow=False)
+
+        if not same:
+            differences.append(f"differs: {path}")
+
+    return differences
+
+
+def compare_metadata(writer: t.Dict[str, t.Any], replica: t.Dict[str, t.Any]) -> t.List[str]:
+    """
+    Compare the metadata of the project on the writer and the replica.
+
+    Args:
+        writer (t.Dict[str, t.Any]): metadata on the writer.
+        replica (t.Dict[str, t.Any]): metadata on the replica.
+
+    Returns:
+        t.List[str]: differences, empty if the replica has the metadata of the writer without the unique key.
+    """
+    differences = []
+
+    if "unique-key" in replica:
+        differences.append("the replica received the unique key")
+
+    if {key: value for key, value in writer.items() if key != "unique-key"} != replica:
+        differences.append("the metadata differs")
+
+    if list(writer.get("versions", {})) != list(replica.get("versions", {})):
+        differences.append("the versions are not in the same order")
+
+    return differences
+
+
+def check_access(url: str, token: str) -> t.List[str]:
+    """
+    Check that the writer only answers replicas and keeps the project files to itself.
+
+    Args:
+        url (str): URL of the writer.
+        token (str): replication token.
+
+    Returns:
+        t.List[str]: the requests which were answered.
+    """
+    from byteguide.libs.journal import TOKEN_HEADER  # pylint: disable=import-outside-toplevel
+
+    requests = {
+        "snapshot without the token": ("/replication/snapshot", ""),
+        "snapshot with a wrong token": ("/replication/snapshot", token[::-1]),
+        "metadata.json": (f"/replication/projects/{PROJECT}/files/metadata.json", token),
+    }
+    answered = []
+
+    for name, (path, sent_token) in requests.items():
+        request = urllib.request.Request(url + path, headers={TOKEN_HEADER: sent_token} if sent_token else {})
+
+        try:
+            with urllib.request.urlopen(request, timeout=10):
+                answered.append(name)
+        except urllib.error.HTTPError:
+            continue
+
+    return answered
+
+
+def _report(step: str, summary: str, problems: t.Sequence[str]) -> bool:
+    print(f"{step}: {summary}, {len(problems)} problems")
+
+    for problem in problems:
+        print(f"  {problem}")
+
+    return not problems
+
+
+def _sync(step: str, writer_dir: Path, replica_dir: Path, url: str, token: str) -> bool:
+    """
+    Sync the replica from the writer and compare them.
+
+    Args:
+        step (str): name of the step, for the report.
+        writer_dir (Path): docs tree of the writer.
+        replica_dir (Path): docs tree of the replica.
+        url (str): URL of the writer.
+        token (str): replication token.
+
+    Returns:
+        bool: True if the replica matches the writer.
+    """
+    from byteguide.libs.fs import MetaDataHandler  # pylint: disable=import-outside-toplevel
+    from byteguide.libs.replication import replicator  # pylint: disable=import-outside-toplevel
+
+    writer_metadata = MetaDataHandler(PROJECT).read_metadata()
+    _setup(replica_dir, token, url)
+
+    try:
+        started = time.perf_counter()
+        applied = replicator.sync()
+        duration = time.perf_counter() - started
+
+        problems = compare_trees(writer_dir, replica_dir)
+        problems.extend(compare_metadata(writer_metadata, MetaDataHandler(PROJECT).read_metadata()))
+    finally:
+        _setup(writer_dir, token)
+
+    return _report(step, f"{applied} changes applied in {duration:.3f}s", problems)
+
+
+def _start_writer(writer_dir: Path, token: str) -> t.Tuple[multiprocessing.Process, str]:
+    port = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=_serve, args=(writer_dir, token, port), daemon=True)
+    server.start()
+
+    deadline = time.monotonic() + 30
+
+    while not port.value:
+        if not server.is_alive() or time.monotonic() > deadline:
+            server.terminate()
+            raise RuntimeError("the writer did not start")
+        time.sleep(0.05)
+
+    return server, f"http://127.0.0.1:{port.value}"
+
+
+def run(args: argparse.Namespace, root: Path) -> int:
+    """
+    Start the writer, upload and replicate, and compare the trees after each sync.
+
+    Args:
+        args (argparse.Namespace): options.
+        root (Path): directory of the writer and replica trees.
+
+    Returns:
+        int: exit code.
+    """
+    writer_dir, replica_dir = root.joinpath("writer"), root.joinpath("replica")
+    writer_dir.mkdir()
+    replica_dir.mkdir()
+
+    token = uuid.uuid4().hex
+    scale = Scale(projects=1, versions=args.versions, files=args.files, file_size=args.file_size)
+    rnd = random.Random(args.seed)
+
+    _setup(writer_dir, token)
+
+    from byteguide.libs.fs import MetaDataHandler, Uploader  # pylint: disable=import-outside-toplevel
+
+    writer_dir.joinpath(PROJECT).mkdir()
+    uniq_key = MetaDataHandler(PROJECT).init_metadata({"name": PROJECT, "programming-lang": "python", "tags": []})
+
+    for index in range(args.versions):
+        _upload(rnd, scale, uniq_key, f"1.{index}")
+
+    server, url = _start_writer(writer_dir, token)
+    results = []
+
+    try:
+        results.append(_sync("snapshot", writer_dir, replica_dir, url, token))
+
+        answered = check_access(url, token)
+        results.append(_report("access", "requests without the token and for metadata.json", answered))
+
+        _upload(rnd, scale, uniq_key, f"1.{args.versions}")
+        _upload(rnd, scale, uniq_key, "1.0", reupload=True)
+
+        if args.versions > 1:
+            Uploader().delete(PROJECT, "1.1")
+
+        results.append(_sync("incremental", writer_dir, replica_dir, url, token))
+        results.append(_sync("unchanged", writer_dir, replica_dir, url, token))
+    finally:
+        server.terminate()
+        server.join()
+
+    return 0 if all(results) else 1
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> int:
+    """
+    Command line entry point.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+
+    Returns:
+        int: exit code.
+    """
+    args = parse_args(argv)
+    root = args.root or Path(tempfile.mkdtemp(prefix="byteguide-replication-"))
+
+    if args.root is not None:
+        root.mkdir(parents=True)
+
+    try:
+        return run(args, root)
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Multi-process stress test of the metadata writes.
+
+Example:
+    python -m benchmarks.stress --processes 8 --threads 3 --versions 10
+    python -m benchmarks.stress --metadata-backend sqlite
+
+Worker processes add versions to the same project concurrently with `MetaDataHandler.add_version`,
+while the main process keeps reading the metadata. The exit code is 1 if a version entry was lost
+or a read failed, e.g. on a partially written `metadata.json`.
+"""
+
+import argparse
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import threading
+import typing as t
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+
+PROJECT = "stress-proj"
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+
+    Returns:
+        argparse.Namespace: options.
+    """
+    parser = argparse.ArgumentParser(description="Add versions to one project from many processes at once.")
+    parser.add_argument("--processes", type=int, default=8, help="worker processes")
+    parser.add_argument("--threads", type=int, default=3, help="threads per worker process")
+    parser.add_argument("--versions", type=int, default=10, help="versions added by each thread")
+    parser.add_argument("--metadata-backend", choices=["json", "sqlite"], default=config.metadata_backend)
+    parser.add_argument("--root", type=Path, help="docs directory to use, kept after the run")
+    return parser.parse_args(argv)
+
+
+def _setup(root: Path, backend: str) -> None:
+    config.update(docfiles_dir=root, metadata_backend=backend)
+    log.remove()
+    log.add(sys.stderr, level="WARNING")
+
+
+def _add_versions(root: Path, backend: str, worker: int, threads: int, versions: int) -> None:
+    """
+    Worker process, adds `threads` x `versions` versions.
+
+    Args:
+        root (Path): docs directory.
+        backend (str): metadata backend.
+        worker (int): index of the worker, makes the versions unique.
+        threads (int): threads of the worker.
+        versions (int): versions added by each thread.
+    """
+    _setup(root, backend)
+
+    from byteguide.libs.fs import MetaDataHandler  # pylint: disable=import-outside-toplevel
+
+    def add(thread: int) -> None:
+        for index in range(versions):
+            MetaDataHandler(PROJECT).add_version(f"{worker}.{thread}.{index}")
+
+    pool = [threading.Thread(target=add, args=(thread,)) for thread in range(threads)]
+
+    for thread in pool:
+        thread.start()
+
+    for thread in pool:
+        thread.join()
+
+
+def run(args: argparse.Namespace, root: Path) -> int:
+    """
+    Register the project, start the workers and check the result.
+
+    Args:
+        args (argparse.Namespace): options.
+        root (Path): docs directory.
+
+    Returns:
+        int: exit code.
+    """
+    _setup(root, args.metadata_backend)
+
+    from byteguide.libs.fs import MetaDataHandler  # pylint: disable=import-outside-toplevel
+
+    root.joinpath(PROJECT).mkdir()
+    MetaDataHandler(PROJECT).init_metadata({"name": PROJECT, "programming-lang": "python", "tags": []})
+
+    workers = [
+        multiprocessing.Process(
+            target=_add_versions, args=(root, args.metadata_backend, worker, args.threads, args.versions)
+        )
+        for worker in range(args.processes)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    failed_reads = 0
+
+    while any(worker.is_alive() for worker in workers):
+        try:
+            MetaDataHandler(PROJECT).read_metadata()
+        except Exception as e:  # pylint: disable=broad-except
+            failed_reads += 1
+            print(f"read failed: {e}")
+
+    for worker in workers:
+        worker.join()
+
+    expected = args.processes * args.threads * args.versions
+    stored = len(MetaDataHandler(PROJECT).read_metadata().get("versions", {}))
+    crashed = sum(1 for worker in workers if worker.exitcode != 0)
+
+    print(f"{stored} of {expected} versions stored, {failed_reads} failed reads, {crashed} crashed workers")
+    return 0 if stored == expected and not failed_reads and not crashed else 1
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> int:
+    """
+    Command line entry point.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+
+    Returns:
+        int: exit code.
+    """
+    args = parse_args(argv)
+
+    if args.root is not None:
+        args.root.mkdir(parents=True)
+        return run(args, args.root)
+
+    root = Path(tempfile.mkdtemp(prefix="byteguide-stress-"))
+
+    try:
+        return run(args, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+""" Generator of synthetic `docfiles_dir` trees. """
+
+import datetime as dt
+import io
+import random
+import typing as t
+import uuid
+import zipfile
+from pathlib import Path
+
+from byteguide.libs.metastore import get_metadata_backend
+
+LANGS = ("python", "java", "go", "rust", "c++", "javascript")
+TAGS = ("ml", "web", "db", "cli", "infra", "api", "core", "ui", "data", "ops")
+WORDS = (
+    "connection pool request response thread process cache index query schema client server "
+    "config deploy version upload archive stream buffer socket timeout retry handler module"
+).split()
+
+
+class Scale(t.NamedTuple):
+    """
+    Size of a synthetic tree.
+    """
+
+    projects: int
+    versions: int  # per project
+    files: int  # per version
+    file_size: int  # approximate bytes per file
+
+
+def project_name(index: int) -> str:
+    """Name of the n-th synthetic project."""
+    return f"bench-proj-{index}"
+
+
+def html_page(rnd: random.Random, title: str, size: int) -> str:
+    """
+    Create an HTML page of roughly `size` bytes of prose.
+
+    Args:
+        rnd (random.Random): random source.
+        title (str): page title.
+        size (int): approximate size.
+
+    Returns:
+        str: page content.
+    """
+    paragraphs = []
+    length = 0
+
+    while length < size:
+        paragraph = " ".join(rnd.choice(WORDS) for _ in range(60))
+        paragraphs.append(f"<p>{paragraph}</p>")
+        length += len(paragraph) + 7
+
+    return f"<html><head><title>{title}</title></head><body>{''.join(paragraphs)}</body></html>"
+
+
+def version_files(rnd: random.Random, name: str, version: str, scale: Scale) -> t.Dict[str, str]:
+    """
+    Create the files of a version, `index.html` first.
+
+    Args:
+        rnd (random.Random): random source.
+        name (str): project name.
+        version (str): version.
+        scale (Scale): tree size.
+
+    Returns:
+        t.Dict[str, str]: relative path to content.
+    """
+    files = {"index.html": html_page(rnd, f"{name} {version}", scale.file_size)}
+
+    for index in range(1, scale.files):
+        files[f"pages/section-{index % 10}/page-{index}.html"] = html_page(rnd, f"page {index}", scale.file_size)
+
+    return files
+
+
+def version_zip(rnd: random.Random, name: str, version: str, scale: Scale) -> bytes:
+    """
+    Create the upload archive of a version.
+
+    Args:
+        rnd (random.Random): random source.
+        name (str): project name.
+        version (str): version.
+        scale (Scale): tree size.
+
+    Returns:
+        bytes: zip archive.
+    """
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path, content in version_files(rnd, name, version, scale).items():
+            archive.writestr(path, content)
+
+    return buffer.getvalue()
+
+
+def project_metadata(rnd: random.Random, name: str, versions: t.Sequence[str]) -> t.Dict[str, t.Any]:
+    """
+    Create the metadata of a registered project, as `MetaDataHandler` stores it.
+
+    Args:
+        rnd (random.Random): random source.
+        name (str): project name.
+        versions (t.Sequence[str]): uploaded versions, oldest first.
+
+    Returns:
+        t.Dict[str, t.Any]: project metadata.
+    """
+    upload_date = dt.datetime(2023, 1, 1)
+    uploads = {}
+
+    for version in versions:
+        upload_date += dt.timedelta(days=rnd.randint(1, 30))
+        uploads[version] = {"upload-date": upload_date.strftime("%Y-%m-%d %H:%M:%S")}
+
+    return {
+        "name": name,
+        "description": f"Synthetic project {name}",
+        "owner": "Bench Mark",
+        "owner-email": "bench@example.com",
+        "programming-lang": rnd.choice(LANGS),
+        "tags": rnd.sample(TAGS, 3),
+        "unique-key": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "versions": dict(reversed(uploads.items())),  # latest first, like `sort_versions`
+    }
+
+
+def generate_tree(root: Path, scale: Scale, seed: int = 0) -> t.List[str]:
+    """
+    Populate `root` (the configured `docfiles_dir`) with synthetic projects.
+
+    The metadata is stored with the configured metadata backend.
+
+    Args:
+        root (Path): docs directory, it must be the configured `docfiles_dir`.
+        scale (Scale): tree size.
+        seed (int, optional): random seed, the same seed creates the same tree. Defaults to 0.
+
+    Returns:
+        t.List[str]: names of the created projects.
+    """
+    rnd = random.Random(seed)
+    backend = get_metadata_backend()
+    names = []
+
+    for index in range(scale.projects):
+        name = project_name(index)
+        projdir = root.joinpath(name)
+        versions = [f"1.{minor}.0" for minor in range(scale.versions)]
+
+        for version in versions:
+            for path, content in version_files(rnd, name, version, scale).items():
+                target = projdir.joinpath(version, path)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_text(content, encoding="utf-8")
+
+        if versions:
+            projdir.joinpath("latest").symlink_to(versions[-1])
+
+        projdir.mkdir(exist_ok=True)
+        projdir.joinpath("changelog.html").write_text("<html>changes</html>", encoding="utf-8")
+        backend.store(name, project_metadata(rnd, name, versions))
+        names.append(name)
+
+    return names
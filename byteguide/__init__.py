@@ -3,17 +3,31 @@ from flask import Flask
 
 from byteguide.config import config
 from byteguide.libs.jinja_fltrs import register_filters
+from byteguide.libs.metrics import register_request_metrics
+from byteguide.libs.profiler import request_profiler
+from byteguide.routes.api import api_routes
 from byteguide.routes.common import common_routes
 from byteguide.routes.display import display_routes
+from byteguide.routes.docs import docs_routes
 from byteguide.routes.manage import manage_routes
+from byteguide.routes.replication import replication_routes
 
 app = Flask(__name__)
 
 app.config.from_object(config)
 app.config["MAX_CONTENT_LENGTH"] = config.max_content_mb * 1024 * 1024
 
+app.register_blueprint(api_routes)
 app.register_blueprint(common_routes)
 app.register_blueprint(display_routes)
+app.register_blueprint(docs_routes)
 app.register_blueprint(manage_routes)
+app.register_blueprint(replication_routes)
+
+if config.metrics_enabled:
+    register_request_metrics(app)
+
+if config.profiling_enabled:
+    app.wsgi_app = request_profiler.wrap(app.wsgi_app)  # type: ignore[method-assign]
 
 register_filters()
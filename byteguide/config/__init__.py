@@ -19,6 +19,13 @@ class Config:
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def update(self, **kwargs):
+        """
+        Override configuration options, e.g. to point `docfiles_dir` somewhere else.
+        """
+        self.kwargs.update(kwargs)
+        self._attributes(kwargs)
+
     def __repr__(self):
         return f"Config({self.kwargs})"
 
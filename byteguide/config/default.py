@@ -11,7 +11,7 @@ def get():
     """
     return {
         "docfiles_dir": Path("/home/nmhatre/byte_guide_docs"),
-        "docfiles_link_root": "/static/docfiles",
+        "docfiles_link_root": "/docs",
         "copyright": "",
         "title": "byteguide",
         "welcome": "Hello there!, \n - From byte/guide!",
@@ -24,9 +24,58 @@ def get():
         "host": "127.0.0.1",
         "port": 29000,
         "debug": False,
+        "workers": 4,
+        "threads": 4,
+        "worker_max_requests": 1000,
+        "worker_max_requests_jitter": 100,
+        "worker_timeout": 60,
+        "graceful_timeout": 30,
         "readonly": True,
         "disable_delete": False,
         "max_content_mb": 10,
+        "max_stream_upload_mb": 1024,
+        "metadata_backend": "json",
+        "page_cache_enabled": True,
+        "page_cache_entries": 512,
+        "page_cache_max_bytes": 32 * 1024 * 1024,
+        "metrics_enabled": True,
+        "profiling_enabled": True,
+        "profile_header": "X-Byteguide-Profile",
+        "profile_token": "",
+        "profile_admin_addresses": ["127.0.0.1", "::1"],
+        "profile_sample_rate": 0.0,
+        "profile_keep": 50,
+        "api_page_size": 50,
+        "api_max_page_size": 500,
+        "catalog_check_interval": 5,
+        "docs_version_max_age": 5 * 60,
+        "docs_latest_max_age": 60,
+        "docs_x_sendfile": False,
+        "dedup_enabled": True,
+        "upload_workers": 2,
+        "upload_queue_size": 16,
+        "upload_jobs_history": 100,
+        "upload_session_ttl": 24 * 60 * 60,
+        "upload_spool_ttl": 24 * 60 * 60,
+        "batch_upload_workers": 4,
+        "batch_max_items": 100,
+        "extract_workers": 4,
+        "retention_enabled": True,
+        "retention_interval": 60 * 60,
+        "retention_keep_latest_n": 0,
+        "retention_keep_days": 0,
+        "replication_journal_enabled": True,
+        "replication_primary": "",
+        "replication_token": "",
+        "replication_interval": 30,
+        "replication_batch_size": 500,
+        "replication_timeout": 30,
+        "search_index_enabled": True,
+        "precompress_enabled": True,
+        "precompress_brotli": True,
+        "precompress_min_bytes": 1024,
+        "precompress_workers": 4,
+        "precompress_suffixes": [".html", ".htm", ".css", ".js", ".json", ".svg", ".txt", ".xml", ".map"],
         "enable_email_notification": False,
         "smpt_server": "",
         "smpt_port": 587,
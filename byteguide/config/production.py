@@ -0,0 +1,13 @@
+"""Production configuration."""
+
+
+def get():
+    """
+    Get the production configuration.
+
+    Returns:
+        The production configuration.
+    """
+    return {
+        "debug": False,
+    }
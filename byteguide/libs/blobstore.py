@@ -0,0 +1,219 @@
+""" Content-addressed storage of documentation files. """
+
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import time
+import typing as t
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+
+HASH_ALGORITHM = "sha256"
+
+
+def new_hash() -> "hashlib._Hash":
+    """
+    Create a hash object for content addressing.
+
+    Returns:
+        hashlib._Hash: empty hash object.
+    """
+    return hashlib.new(HASH_ALGORITHM)
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Get the content hash of a file.
+
+    Args:
+        path (Path): file to hash.
+        chunk_size (int, optional): read size. Defaults to 1MB.
+
+    Returns:
+        str: hex digest of the file content.
+    """
+    digest = new_hash()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Stores each distinct file content once under `docfiles_dir/.blobs/<2 hex>/<digest>`.
+
+    Version trees hardlink their files to the blobs, so identical files across versions
+    and projects share a single inode (and page cache). The link count of a blob is its
+    reference count: a blob whose only link is the store itself is no longer used by
+    any version and is removed by `collect_garbage`.
+
+    Blobs are read-only, anything writing into a version tree must create new files
+    instead of modifying existing ones in place.
+    """
+
+    STORE_DIR = ".blobs"
+    TMP_DIR = "tmp"
+    STALE_TMP_S = 60 * 60
+    # errors for which a hardlink can not be created and the file is copied instead
+    LINK_ERRORS = (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.ENOTSUP)
+
+    def __init__(self) -> None:
+        self._gc_lock = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        """Root directory of the store."""
+        return config.docfiles_dir.joinpath(self.STORE_DIR)
+
+    def blob_path(self, digest: str) -> Path:
+        """
+        Get the path of a blob.
+
+        Args:
+            digest (str): content hash.
+
+        Returns:
+            Path: path of the blob.
+        """
+        return self.root.joinpath(digest[:2], digest)
+
+    def temp_file(self) -> Path:
+        """
+        Get a new temporary path inside the store, on the same filesystem as the blobs.
+
+        Returns:
+            Path: temporary file path (the file is not created).
+        """
+        tmp_dir = self.root.joinpath(self.TMP_DIR)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tmp_dir.joinpath(uuid.uuid4().hex)
+
+    def store(self, temp_path: Path, digest: str, target: Path) -> bool:
+        """
+        Place a file written to a `temp_file` path at `target`, sharing the blob of the same content.
+
+        The temporary file is linked to `target` before the blob is looked up, so a blob
+        removed concurrently by `collect_garbage` is simply replaced by the new content.
+
+        Args:
+            temp_path (Path): file written to a `temp_file` path, it is consumed.
+            digest (str): content hash of the file.
+            target (Path): path in the version tree, it must not exist.
+
+        Returns:
+            bool: True if the content was already stored, False if a new blob was created.
+        """
+        if not self.link(temp_path, target):
+            temp_path.unlink()  # copied, the target can not be deduplicated
+            return False
+
+        blob = self.blob_path(digest)
+        link_path = self.temp_file()
+
+        try:
+            os.link(blob, link_path)
+        except FileNotFoundError:
+            pass
+        else:
+            os.replace(link_path, target)
+            temp_path.unlink()
+            return True
+
+        blob.parent.mkdir(exist_ok=True)
+        os.chmod(temp_path, 0o444)
+        os.replace(temp_path, blob)
+
+        return False
+
+    def link(self, source: Path, target: Path) -> bool:
+        """
+        Hardlink a file, copying it if it can not be hardlinked.
+
+        Args:
+            source (Path): existing file.
+            target (Path): new path.
+
+        Returns:
+            bool: True if the file was hardlinked, False if it was copied.
+        """
+        try:
+            os.link(source, target)
+            return True
+        except OSError as e:
+            if e.errno not in self.LINK_ERRORS:
+                raise
+
+        shutil.copyfile(source, target)
+        return False
+
+    def collect_garbage(self) -> int:
+        """
+        Remove the blobs which are not linked from any version tree anymore.
+
+        Returns:
+            int: number of removed blobs.
+        """
+        if not self.root.is_dir():
+            return 0
+
+        removed = 0
+
+        with self._gc_lock:
+            self._remove_stale_temp_files()
+
+            for bucket in self.root.iterdir():
+                if bucket.name == self.TMP_DIR or not bucket.is_dir():
+                    continue
+
+                for blob in bucket.iterdir():
+                    try:
+                        if blob.stat().st_nlink == 1:
+                            blob.unlink()
+                            removed += 1
+                    except FileNotFoundError:
+                        continue
+
+        if removed:
+            log.info(f"removed {removed} unused blobs")
+
+        return removed
+
+    def _remove_stale_temp_files(self) -> None:
+        """
+        Remove temporary files left behind by interrupted uploads.
+        """
+        tmp_dir = self.root.joinpath(self.TMP_DIR)
+
+        if not tmp_dir.is_dir():
+            return
+
+        now = time.time()
+
+        for temp_path in tmp_dir.iterdir():
+            try:
+                if now - temp_path.stat().st_mtime > self.STALE_TMP_S:
+                    temp_path.unlink()
+            except FileNotFoundError:
+                continue
+
+    def stats(self) -> t.Dict[str, int]:
+        """
+        Get the number of blobs and the bytes they use.
+
+        Returns:
+            t.Dict[str, int]: blob count and total size.
+        """
+        blobs = [blob for bucket in self.root.glob("??") for blob in bucket.iterdir()]
+        return {"blobs": len(blobs), "bytes": sum(blob.stat().st_size for blob in blobs)}
+
+
+blob_store = BlobStore()
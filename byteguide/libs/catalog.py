@@ -0,0 +1,353 @@
+""" In-memory catalog of the projects hosted by byteguide. """
+
+import re
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+from byteguide.libs.dtypes import ProjectEntry
+from byteguide.libs.metastore import get_metadata_backend
+from byteguide.libs.util import compile_pattern
+
+# (metadata backend stamp, project dir mtime)
+Stamp = t.Tuple[t.Tuple[int, int], int]
+
+
+class ProjectCatalog:  # pylint: disable=too-many-instance-attributes
+    """
+    Process-wide catalog of the projects found in `docfiles_dir`.
+
+    The catalog is loaded from disk on first use and then kept up to date in place
+    by the uploader and metadata handler (see `refresh` and `remove`). Changes made
+    outside the app are picked up by comparing directory and `metadata.json`
+    modification times (or the revision of the metadata database), at most once every
+    `catalog_check_interval` seconds.
+
+    Secondary indexes (language, tag and lowercase name to projects) are maintained
+    along with the entries, so filters are answered with set intersections.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._projects: t.Dict[str, ProjectEntry] = {}
+        self._stamps: t.Dict[str, Stamp] = {}
+        self._by_lang: t.Dict[str, t.Set[str]] = {}
+        self._by_tag: t.Dict[str, t.Set[str]] = {}
+        self._by_name: t.Dict[str, str] = {}
+        self._docs_dir: t.Optional[Path] = None
+        self._docs_dir_mtime = 0
+        self._last_check = 0.0
+        self.generation = 0
+
+    @staticmethod
+    def _stamp(proj_dir: Path) -> t.Optional[Stamp]:
+        """
+        Get the modification stamp of a project directory.
+
+        Args:
+            proj_dir (Path): project directory.
+
+        Returns:
+            t.Optional[Stamp]: stamp of the project, None if it has no metadata.
+        """
+        meta_stamp = get_metadata_backend().stamp(proj_dir.name)
+
+        try:
+            dir_stat = proj_dir.stat()
+        except OSError:
+            return None
+
+        return None if meta_stamp is None else (meta_stamp, dir_stat.st_mtime_ns)
+
+    def _index(self, name: str, entry: ProjectEntry) -> None:
+        """
+        Add a project to the secondary indexes.
+
+        Args:
+            name (str): project directory name.
+            entry (ProjectEntry): project entry.
+        """
+        metadata = entry.metadata
+
+        if metadata.get("programming-lang"):
+            self._by_lang.setdefault(metadata["programming-lang"].lower(), set()).add(name)
+
+        for tag in metadata.get("tags", []):
+            self._by_tag.setdefault(tag.lower(), set()).add(name)
+
+        self._by_name[metadata["name"].lower()] = name
+
+    def _unindex(self, name: str) -> None:
+        """
+        Remove a project from the secondary indexes.
+
+        Args:
+            name (str): project directory name.
+        """
+        entry = self._projects.get(name)
+
+        if entry is None:
+            return
+
+        metadata = entry.metadata
+        keys = [(self._by_tag, tag.lower()) for tag in metadata.get("tags", [])]
+
+        if metadata.get("programming-lang"):
+            keys.append((self._by_lang, metadata["programming-lang"].lower()))
+
+        for index, key in keys:
+            names = index.get(key, set())
+            names.discard(name)
+            if not names:
+                index.pop(key, None)
+
+        self._by_name.pop(entry.metadata["name"].lower(), None)
+
+    def _drop(self, name: str) -> None:
+        """
+        Drop a project from the catalog.
+
+        Args:
+            name (str): project directory name.
+        """
+        if name in self._projects:
+            self._unindex(name)
+            del self._projects[name]
+            self._stamps.pop(name, None)
+            self.generation += 1
+
+    def _load_project(self, proj_dir: Path) -> None:
+        """
+        (Re)load a single project into the catalog, dropping it if it is gone.
+
+        Args:
+            proj_dir (Path): project directory.
+        """
+        name = proj_dir.name
+        stamp = self._stamp(proj_dir)
+
+        if stamp is None or not proj_dir.is_dir():
+            self._drop(name)
+            return
+
+        entry = ProjectEntry(proj_dir, get_metadata_backend().load(name))
+
+        if "name" not in entry.metadata:
+            log.warning(f"Skipping {proj_dir}, metadata does not contain project name")
+            self._drop(name)
+            return
+
+        self._unindex(name)
+        self._projects[name] = entry
+        self._index(name, entry)
+        self._stamps[name] = stamp
+        self.generation += 1
+
+    def _reload(self, docs_dir: Path) -> None:
+        """
+        Load the full catalog from `docs_dir`.
+
+        Args:
+            docs_dir (Path): docs directory.
+        """
+        log.info(f"loading project catalog from {docs_dir}...")
+
+        self._projects = {}
+        self._stamps = {}
+        self._by_lang = {}
+        self._by_tag = {}
+        self._by_name = {}
+        self._docs_dir = docs_dir
+        self._docs_dir_mtime = docs_dir.stat().st_mtime_ns
+
+        for entry in docs_dir.iterdir():
+            if entry.is_dir() and not entry.name.startswith("."):
+                self._load_project(entry)
+
+        self.generation += 1
+
+    def _revalidate(self, docs_dir: Path) -> None:
+        """
+        Pick up changes made to `docs_dir` outside the app.
+
+        Args:
+            docs_dir (Path): docs directory.
+        """
+        docs_dir_mtime = docs_dir.stat().st_mtime_ns
+
+        if docs_dir_mtime != self._docs_dir_mtime:
+            # projects were added or removed
+            self._docs_dir_mtime = docs_dir_mtime
+            on_disk = {entry.name for entry in docs_dir.iterdir() if entry.is_dir() and not entry.name.startswith(".")}
+
+            for name in set(self._projects) - on_disk:
+                self._load_project(docs_dir.joinpath(name))
+
+            for name in on_disk - set(self._projects):
+                self._load_project(docs_dir.joinpath(name))
+
+        for name, stamp in list(self._stamps.items()):
+            proj_dir = docs_dir.joinpath(name)
+            if self._stamp(proj_dir) != stamp:
+                self._load_project(proj_dir)
+
+    def _ensure_fresh(self) -> t.Optional[Path]:
+        """
+        Make sure the catalog reflects the current state of `docfiles_dir`.
+
+        Returns:
+            t.Optional[Path]: docs directory, None if it does not exist.
+        """
+        docs_dir = config.docfiles_dir
+
+        if not docs_dir.is_dir():
+            return None
+
+        if docs_dir != self._docs_dir:
+            self._reload(docs_dir)
+            self._last_check = time.monotonic()
+
+        elif time.monotonic() - self._last_check >= config.catalog_check_interval:
+            self._revalidate(docs_dir)
+            self._last_check = time.monotonic()
+
+        return docs_dir
+
+    def projects(self) -> t.List[ProjectEntry]:
+        """
+        Get all the projects in the catalog.
+
+        Returns:
+            t.List[ProjectEntry]: list of projects.
+        """
+        with self._lock:
+            if self._ensure_fresh() is None:
+                return []
+            return list(self._projects.values())
+
+    def get(self, project: str) -> t.Optional[ProjectEntry]:
+        """
+        Get a single project from the catalog.
+
+        Args:
+            project (str): project name.
+
+        Returns:
+            t.Optional[ProjectEntry]: project entry, None if the project is unknown.
+        """
+        with self._lock:
+            if self._ensure_fresh() is None:
+                return None
+            return self._projects.get(project)
+
+    def current_generation(self) -> int:
+        """
+        Get the generation of the catalog, it changes whenever a project changes.
+
+        Returns:
+            int: catalog generation.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return self.generation
+
+    def lookup(self, name: str) -> t.Optional[ProjectEntry]:
+        """
+        Get a project by its name, ignoring case.
+
+        Args:
+            name (str): project name.
+
+        Returns:
+            t.Optional[ProjectEntry]: project entry, None if the project is unknown.
+        """
+        with self._lock:
+            if self._ensure_fresh() is None:
+                return None
+
+            dir_name = self._by_name.get(name.lower())
+            return self._projects.get(dir_name) if dir_name else None
+
+    def refresh(self, project: str) -> None:
+        """
+        Reload a project after it was changed by the app.
+
+        Args:
+            project (str): project name.
+        """
+        with self._lock:
+            if self._docs_dir is None or self._docs_dir != config.docfiles_dir:
+                return  # not loaded yet, first access will read everything
+
+            self._load_project(self._docs_dir.joinpath(project))
+
+    def remove(self, project: str) -> None:
+        """
+        Drop a project from the catalog.
+
+        Args:
+            project (str): project name.
+        """
+        with self._lock:
+            self._drop(project)
+
+    def reset(self) -> None:
+        """
+        Forget the loaded catalog, the next access reloads it from disk.
+        """
+        with self._lock:
+            self._docs_dir = None
+
+    def find(
+        self,
+        lang: t.Optional[str] = None,
+        pattern: t.Optional[str] = None,
+        tag: t.Optional[str] = None,
+    ) -> t.List[ProjectEntry]:
+        """
+        Find the projects matching all the given filters, using the indexes of the metadata backend
+        if it has any (SQLite), the secondary indexes of the catalog otherwise.
+
+        Args:
+            lang (t.Optional[str], optional): programming language. Defaults to None.
+            pattern (t.Optional[str], optional): project name regex (`re.match`). Defaults to None.
+            tag (t.Optional[str], optional): project tag. Defaults to None.
+
+        Returns:
+            t.List[ProjectEntry]: matching projects, empty if no filter is given.
+        """
+        with self._lock:
+            if self._ensure_fresh() is None:
+                return []
+
+            candidates: t.Optional[t.Set[str]] = None
+            indexed = get_metadata_backend().find(lang=lang, tag=tag) if lang or tag else None
+
+            if indexed is not None:
+                candidates = set(indexed) & self._projects.keys()
+            else:
+                if lang:
+                    candidates = set(self._by_lang.get(lang.lower(), ()))
+
+                if tag:
+                    tagged = self._by_tag.get(tag.lower(), set())
+                    candidates = tagged & candidates if candidates is not None else set(tagged)
+
+            if pattern:
+                try:
+                    pattern_ = compile_pattern(pattern)
+                except re.error as e:
+                    log.exception(e)
+                    return []
+
+                named = {name for name, entry in self._projects.items() if pattern_.match(entry.metadata["name"])}
+                candidates = named & candidates if candidates is not None else named
+
+            return [self._projects[name] for name in candidates or ()]
+
+
+project_catalog = ProjectCatalog()
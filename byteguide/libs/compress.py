@@ -0,0 +1,147 @@
+""" Precompression of uploaded documentation files. """
+
+import gzip
+import os
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger as log
+from werkzeug.datastructures import Accept
+
+from byteguide.config import config
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# most preferred encoding first
+ENCODINGS: t.Tuple[t.Tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+
+
+class Precompressor:
+    """
+    Writes `.gz` (and `.br`, if `brotli` is installed) siblings next to compressible files.
+
+    Compression runs once at upload time on a thread pool (zlib and brotli release the
+    GIL), the doc-serving route then picks the precompressed variant with `negotiate`.
+    """
+
+    # keep a variant only if it saves at least this fraction of the original size
+    MIN_SAVING = 0.1
+
+    @staticmethod
+    def _is_compressible(path: Path) -> bool:
+        if path.suffix.lower() not in config.precompress_suffixes:
+            return False
+
+        return path.stat().st_size >= config.precompress_min_bytes
+
+    @staticmethod
+    def _has_variants(path: Path) -> bool:
+        """
+        Check if a file already has up to date variants, e.g. linked from the previous version by a delta upload.
+
+        Args:
+            path (Path): compressible file.
+
+        Returns:
+            bool: True if a variant with the modification time of the file exists.
+        """
+        mtime = path.stat().st_mtime_ns
+
+        for _, suffix in ENCODINGS:
+            try:
+                if path.with_name(path.name + suffix).stat().st_mtime_ns == mtime:
+                    return True
+            except FileNotFoundError:
+                continue
+
+        return False
+
+    def _write_variant(self, path: Path, suffix: str, data: bytes, compressed: bytes) -> bool:
+        if len(compressed) > len(data) * (1 - self.MIN_SAVING):
+            return False
+
+        variant = path.with_name(path.name + suffix)
+        # never write through an existing file, it may be a hardlink to a shared blob
+        variant.unlink(missing_ok=True)
+        variant.write_bytes(compressed)
+
+        # keep timestamps in sync, conditional requests rely on them
+        stat = path.stat()
+        os.utime(variant, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return True
+
+    def compress_file(self, path: Path) -> int:
+        """
+        Write the precompressed variants of a single file.
+
+        Args:
+            path (Path): file to compress.
+
+        Returns:
+            int: number of variants written.
+        """
+        data = path.read_bytes()
+        written = 0
+
+        if self._write_variant(path, ".gz", data, gzip.compress(data, compresslevel=9, mtime=0)):
+            written += 1
+
+        if brotli is not None and config.precompress_brotli:
+            if self._write_variant(path, ".br", data, brotli.compress(data)):
+                written += 1
+
+        return written
+
+    def compress_tree(self, root: Path) -> int:
+        """
+        Precompress all the compressible files of a directory tree, files with up to date variants are skipped.
+
+        Args:
+            root (Path): root of the tree, e.g. a staged version directory.
+
+        Returns:
+            int: number of variants written.
+        """
+        files = [
+            path
+            for path in root.rglob("*")
+            if path.is_file() and self._is_compressible(path) and not self._has_variants(path)
+        ]
+
+        if not files:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=config.precompress_workers) as pool:
+            written = sum(pool.map(self.compress_file, files))
+
+        log.info(f"precompressed {len(files)} files of {root}, {written} variants written")
+        return written
+
+
+def negotiate(path: Path, accept_encodings: Accept) -> t.Tuple[Path, t.Optional[str]]:
+    """
+    Pick the precompressed variant of a file the client accepts.
+
+    Args:
+        path (Path): requested file.
+        accept_encodings (Accept): parsed `Accept-Encoding` header.
+
+    Returns:
+        t.Tuple[Path, t.Optional[str]]: file to send and its content encoding (None for the original file).
+    """
+    for encoding, suffix in ENCODINGS:
+        if not accept_encodings[encoding]:
+            continue
+
+        variant = path.with_name(path.name + suffix)
+        if variant.is_file():
+            return variant, encoding
+
+    return path, None
+
+
+precompressor = Precompressor()
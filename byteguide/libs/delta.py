@@ -0,0 +1,126 @@
+""" Delta uploads, a version is built from a published version and the changed files only. """
+
+import typing as t
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+from byteguide.libs.blobstore import BlobStore, blob_store
+from byteguide.libs.compress import ENCODINGS
+from byteguide.libs.extract import ExtractedFile, Extractor, safe_member_path
+from byteguide.libs.locks import project_locks
+from byteguide.libs.manifest import manifest_store
+
+# moved to the project root when a version is published, see `Uploader.move_changelog_to_root`
+CHANGELOG = "changelog.html"
+
+
+class Delta(t.NamedTuple):
+    """
+    Changes uploaded on top of a published version, see `Uploader.upload_delta`.
+    """
+
+    base: t.Optional[str] = None  # version to start from, None for the uploaded version
+    deleted: t.Tuple[str, ...] = ()  # paths of the base version to leave out
+    reupload: bool = False  # replace the uploaded version if it exists and is not the base
+
+    def removed_paths(self, manifest: t.Optional[t.Dict[str, t.Any]], label: str) -> t.Set[str]:
+        """
+        Check the deleted paths against the manifest of the base version.
+
+        Args:
+            manifest (t.Optional[t.Dict[str, t.Any]]): manifest of the base version.
+            label (str): base version, for the error messages, e.g. `proj 1.0`.
+
+        Returns:
+            t.Set[str]: normalized deleted paths.
+        """
+        if manifest is None:
+            raise ValueError(f"{label} has no manifest, upload the full archive instead")
+
+        known = {entry[0] for entry in manifest["entries"]}
+        removed = set()
+
+        for path in self.deleted:
+            rel_path = safe_member_path(path)
+
+            if rel_path is None or rel_path.as_posix() not in known:
+                raise ValueError(f"{path!r} is not a file of {label}")
+
+            removed.add(rel_path.as_posix())
+
+        return removed
+
+
+def link_with_variants(source: Path, target: Path) -> None:
+    """
+    Hardlink a file and its precompressed variants.
+
+    Args:
+        source (Path): file of the base version.
+        target (Path): path in the new version tree.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    blob_store.link(source, target)
+
+    for _, suffix in ENCODINGS:
+        variant = source.with_name(source.name + suffix)
+
+        if variant.is_file():
+            blob_store.link(variant, target.with_name(target.name + suffix))
+
+
+def link_base_files(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    extract: Extractor,
+    project: str,
+    base: str,
+    removed: t.AbstractSet[str],
+    dest: Path,
+    store: t.Optional[BlobStore],
+) -> t.List[ExtractedFile]:
+    """
+    Extract a delta archive and hardlink the other files of the base version next to it.
+
+    Precompressed variants of the linked files are linked too, so only the extracted
+    files are compressed again.
+
+    Args:
+        extract (Extractor): extracts the delta archive.
+        project (str): project name.
+        base (str): base version.
+        removed (t.AbstractSet[str]): paths of the base version to leave out.
+        dest (Path): target directory, e.g. a staged version directory.
+        store (t.Optional[BlobStore]): store to deduplicate with.
+
+    Returns:
+        t.List[ExtractedFile]: files of the new version.
+    """
+    files = extract(dest, store)
+    replaced = {file.path for file in files}
+    base_dir = config.docfiles_dir.joinpath(project, base)
+
+    # the base version can not be replaced while its files are linked
+    with project_locks.hold(project):
+        manifest = manifest_store.load(project, base)
+
+        if manifest is None:
+            raise ValueError(f"{project} {base} has no manifest")
+
+        for path, size, mtime, digest in manifest["entries"]:
+            if path in replaced or path in removed:
+                continue
+
+            source = base_dir.joinpath(path)
+
+            if source.is_file():
+                link_with_variants(source, dest.joinpath(path))
+            elif path == CHANGELOG:
+                continue  # moved to the project directory, it is not part of the new version
+            else:
+                raise FileNotFoundError(f"{source} is listed in the manifest but missing")
+
+            files.append(ExtractedFile(path, size, mtime, digest))
+
+    log.info(f"built {project} from {base}: {len(replaced)} files uploaded, {len(removed)} removed")
+    return files
@@ -3,9 +3,12 @@ Contains the data types used by the server.
 """
 import enum
 import json
+import threading
+import types
 import typing as t
 from pathlib import Path
 
+import natsort
 from loguru import logger as log
 
 
@@ -19,54 +22,152 @@ class Status(enum.Enum):
     NOT_FOUND = "NOT_FOUND"
     NOT_REGISTERED = "NOT_REGISTERED"
     NOT_A_VALID_ZIP_FILE = "NOT_A_VALID_ZIP_FILE"
+    NOT_A_VALID_ARCHIVE = "NOT_A_VALID_ARCHIVE"
     ALREADY_EXISTS = "ALREADY_EXISTS"
     INVALID_NAME = "INVALID_NAME"
     INVALID_VERSION = "INVALID_VERSION"
     INVALID_UNIQUE_KEY = "INVALID_UNIQUE_KEY"
+    UNCHANGED = "UNCHANGED"
 
+    @property
+    def succeeded(self) -> bool:
+        """True if the upload succeeded, including a reupload which did not change anything."""
+        return self in (Status.OK, Status.UNCHANGED)
 
-class ProjectEntry:  # pylint: disable=too-few-public-methods
+
+# guards the first computation of the lazy fields of the project entries
+_ENTRY_LOCK = threading.RLock()
+
+natural_key = natsort.natsort_keygen()
+
+
+class ProjectEntry:
     """
-    Represents a project entry.
+    Immutable record of a project, entries of the project catalog are shared between requests.
+
+    Fields are computed on first access and kept: the metadata (read from `metadata.json`
+    unless given), the (version, upload date) pairs, their natural order, the sort key of
+    the project and its template data. Entries use `__slots__`, so thousands of them stay
+    small.
     """
 
-    def __init__(self, path: Path):
-        self.path = path
-        self.metadata = self._load_metadata()
-        self.versions = self.metadata.get("versions", [])
-        self.has_changelog = self.path.joinpath("changelog.html").is_file()
+    __slots__ = ("path", "_raw", "_metadata", "_sorted_versions", "_sort_key", "_has_changelog", "_template_data")
+
+    path: Path
+    _raw: t.Optional[t.Dict]
+
+    def __init__(self, path: Path, metadata: t.Optional[t.Dict] = None):
+        """
+        Args:
+            path (Path): project directory.
+            metadata (t.Optional[t.Dict], optional): project metadata as stored by the metadata backend.
+                Defaults to None, to read `metadata.json` from the project directory.
+        """
+        object.__setattr__(self, "path", path)
+        object.__setattr__(self, "_raw", metadata)
+
+        for slot in self.__slots__[2:]:
+            object.__setattr__(self, slot, None)
+
+    def __setattr__(self, name: str, value: t.Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
 
-    def _load_metadata(self) -> t.Dict:
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def _lazy(self, slot: str, compute: t.Callable[[], t.Any]) -> t.Any:
+        """
+        Get a lazy field, computing it on first access.
+
+        Args:
+            slot (str): slot of the field.
+            compute (t.Callable[[], t.Any]): computes the field.
+
+        Returns:
+            t.Any: field value.
+        """
+        value = getattr(self, slot)
+
+        if value is None:
+            with _ENTRY_LOCK:
+                value = getattr(self, slot)
+
+                if value is None:
+                    value = compute()
+                    object.__setattr__(self, slot, value)
+
+        return value
+
+    @property
+    def metadata(self) -> t.Mapping[str, t.Any]:
+        """Read-only project metadata, `versions` are (version, upload date) pairs."""
+        return self._lazy("_metadata", self._load_metadata)
+
+    @property
+    def versions(self) -> t.Tuple[t.Tuple[str, str], ...]:
+        """(version, upload date) pairs, in upload order."""
+        return self.metadata.get("versions", ())
+
+    @property
+    def sorted_versions(self) -> t.Tuple[t.Tuple[str, str], ...]:
+        """(version, upload date) pairs, in natural version order."""
+        return self._lazy("_sorted_versions", lambda: tuple(natsort.natsorted(self.versions, key=lambda x: x[0])))
+
+    @property
+    def sort_key(self) -> t.Any:
+        """Natural sort key of the project name, case is ignored."""
+        return self._lazy("_sort_key", lambda: natural_key(self.metadata.get("name", self.path.name).lower()))
+
+    @property
+    def has_changelog(self) -> bool:
+        """True if the project has a `changelog.html`."""
+        return self._lazy("_has_changelog", self.path.joinpath("changelog.html").is_file)
+
+    @property
+    def template_data(self) -> t.Mapping[str, t.Any]:
+        """Read-only project data for the templates, with the versions in natural order."""
+        return self._lazy(
+            "_template_data",
+            lambda: types.MappingProxyType(
+                {**self.metadata, "versions": self.sorted_versions, "changelog": self.has_changelog}
+            ),
+        )
+
+    def _load_metadata(self) -> t.Mapping[str, t.Any]:
         """
         Load the project metadata.
 
         Returns:
             The project metadata.
         """
-        metadata_path = self.path.joinpath("metadata.json")
+        data = self._raw
+        object.__setattr__(self, "_raw", None)  # only the converted metadata is kept
 
-        if not metadata_path.exists():
-            log.warning(f"Project {self.path} does not contain metadata.json")
-            return {}
+        if data is None:
+            metadata_path = self.path.joinpath("metadata.json")
 
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+            if not metadata_path.exists():
+                log.warning(f"Project {self.path} does not contain metadata.json")
+                return types.MappingProxyType({})
 
-        if not data.get("versions"):
-            log.warning(f"Project {self.path} metadata does not contain any versions")
-            return data
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        elif not data:
+            log.warning(f"Project {self.path} does not have any metadata")
+            return types.MappingProxyType({})
 
-        versions = []
+        data = dict(data)
 
-        for ver, ver_meta in data["versions"].items():
-            upload_date = ver_meta["upload-date"].split(" ")[0]
-            versions.append((ver, upload_date))
+        if not data.get("versions"):
+            log.warning(f"Project {self.path} metadata does not contain any versions")
+            return types.MappingProxyType(data)
 
-        data["versions"] = versions
+        data["versions"] = tuple(
+            (ver, ver_meta["upload-date"].split(" ")[0]) for ver, ver_meta in data["versions"].items()
+        )
 
-        return data
+        return types.MappingProxyType(data)
 
     def __repr__(self) -> str:
-        return (
-            f"{self.__class__.__name__}(" f"{self.path=}, {self.has_changelog=}, {self.metadata=}, {self.versions=})"
-        ).replace("self.", "")
+        return f"{self.__class__.__name__}(path={self.path!r}, metadata={dict(self.metadata)!r})"
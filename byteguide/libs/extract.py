@@ -0,0 +1,504 @@
+""" Extraction of uploaded documentation archives. """
+
+import contextlib
+import functools
+import io
+import os
+import tarfile
+import time
+import typing as t
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from loguru import logger as log
+
+from byteguide.config import config
+from byteguide.libs.blobstore import BlobStore, new_hash
+from byteguide.libs.metrics import EXTRACT_THROUGHPUT, EXTRACTED_BYTES, EXTRACTED_FILES
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+CHUNK_SIZE = 1024 * 1024
+
+# members up to this size are read and written in a single call
+SMALL_FILE_SIZE = 64 * 1024
+
+# archives with fewer files are extracted by the calling thread
+PARALLEL_MIN_FILES = 64
+
+# archive suffix -> tarfile stream compression, None for zip archives
+ARCHIVE_FORMATS: t.Dict[str, t.Optional[str]] = {
+    ".zip": None,
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.zst": "zst",
+}
+
+
+# errors raised for corrupt or truncated tar streams
+TAR_ERRORS: t.Tuple[t.Type[Exception], ...] = (tarfile.TarError, EOFError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
+
+
+class InvalidArchiveError(ValueError):
+    """
+    Raised when an uploaded archive can not be read.
+    """
+
+
+def archive_suffix(filename: str) -> t.Optional[str]:
+    """
+    Get the archive suffix of a file name, e.g. `.tar.gz` for `proj-1.0.tar.gz`.
+
+    Args:
+        filename (str): file name.
+
+    Returns:
+        t.Optional[str]: one of the `ARCHIVE_FORMATS`, None if the file is not a supported archive.
+    """
+    # longest suffixes first, `.tar.gz` must not be taken for `.gz`
+    for suffix in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if filename.lower().endswith(suffix):
+            return suffix
+    return None
+
+
+class ExtractedFile(t.NamedTuple):
+    """
+    Represents a file written by the extraction.
+    """
+
+    path: str  # relative to the version directory, posix style
+    size: int
+    mtime: int  # seconds since epoch
+    digest: str
+
+
+# extracts an uploaded archive into a (staged) directory, deduplicating through the blob store if given
+Extractor = t.Callable[[Path, t.Optional[BlobStore]], t.List[ExtractedFile]]
+
+
+def safe_member_path(name: str) -> t.Optional[PurePosixPath]:
+    """
+    Get the relative path an archive member is extracted to.
+
+    Args:
+        name (str): member name.
+
+    Returns:
+        t.Optional[PurePosixPath]: relative path, None if the member would escape the target directory.
+    """
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+
+    return PurePosixPath(*parts)
+
+
+def _copy_hashed(source: t.IO[bytes], target: Path) -> t.Tuple[int, str]:
+    """
+    Copy a stream into a new file, hashing it on the way.
+
+    Args:
+        source (t.IO[bytes]): stream to copy.
+        target (Path): file to create.
+
+    Returns:
+        t.Tuple[int, str]: size and content hash.
+    """
+    digest = new_hash()
+    size = 0
+
+    with open(target, "xb") as out:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+
+    return size, digest.hexdigest()
+
+
+def write_member(source: t.IO[bytes], target: Path, blob_store: t.Optional[BlobStore]) -> t.Tuple[int, str]:
+    """
+    Write a single archive member, deduplicated through the blob store if given.
+
+    Args:
+        source (t.IO[bytes]): member content.
+        target (Path): path in the version tree, it must not exist.
+        blob_store (t.Optional[BlobStore]): store to deduplicate with.
+
+    Returns:
+        t.Tuple[int, str]: size and content hash.
+    """
+    if blob_store is None:
+        return _copy_hashed(source, target)
+
+    temp_path = blob_store.temp_file()
+
+    try:
+        size, digest = _copy_hashed(source, temp_path)
+        blob_store.store(temp_path, digest, target)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    return size, digest
+
+
+def write_small_member(data: bytes, target: Path, blob_store: t.Optional[BlobStore]) -> t.Tuple[int, str]:
+    """
+    Write a small archive member read at once, see `write_member`.
+
+    Args:
+        data (bytes): member content.
+        target (Path): path in the version tree, it must not exist.
+        blob_store (t.Optional[BlobStore]): store to deduplicate with.
+
+    Returns:
+        t.Tuple[int, str]: size and content hash.
+    """
+    digest = new_hash()
+    digest.update(data)
+    path = target if blob_store is None else blob_store.temp_file()
+
+    try:
+        with open(path, "xb") as out:
+            out.write(data)
+
+        if blob_store is not None:
+            blob_store.store(path, digest.hexdigest(), target)
+    finally:
+        if blob_store is not None and path.exists():
+            path.unlink()
+
+    return len(data), digest.hexdigest()
+
+
+class _PositionalReader(io.RawIOBase):
+    """
+    Read-only file with its own position, reading a file descriptor or buffer shared with other readers.
+    """
+
+    def __init__(self, pread: t.Callable[[int, int], bytes], size: int) -> None:
+        super().__init__()
+        self._pread = pread
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer: t.Any) -> int:
+        data = self._pread(min(len(buffer), max(self._size - self._position, 0)), self._position)
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+@contextlib.contextmanager
+def _shared_archive(archive: zipfile.ZipFile) -> t.Iterator[t.Optional[t.Callable[[], zipfile.ZipFile]]]:
+    """
+    Share the file of an open archive between threads.
+
+    Args:
+        archive (zipfile.ZipFile): open archive, backed by a file or an in-memory buffer.
+
+    Yields:
+        t.Optional[t.Callable[[], zipfile.ZipFile]]: opens another handle on the archive, None if
+            the archive can not be shared.
+    """
+    source: t.Any = archive.fp
+    view: t.Optional[memoryview] = None
+
+    try:
+        fd = source.fileno() if hasattr(os, "pread") else None
+    except (AttributeError, OSError, ValueError):  # e.g. io.UnsupportedOperation for io.BytesIO
+        fd = None
+
+    if fd is not None:
+        pread = functools.partial(_pread_fd, fd)
+        size = os.fstat(fd).st_size
+    elif hasattr(source, "getbuffer"):
+        view = source.getbuffer()
+        pread = functools.partial(_pread_buffer, view)
+        size = len(view)
+    else:
+        yield None
+        return
+
+    try:
+        yield lambda: zipfile.ZipFile(_PositionalReader(pread, size))  # pylint: disable=consider-using-with
+    finally:
+        if view is not None:
+            view.release()  # an exported buffer can not be closed
+
+
+def _pread_fd(fd: int, size: int, offset: int) -> bytes:
+    return os.pread(fd, size, offset)
+
+
+def _pread_buffer(view: memoryview, size: int, offset: int) -> bytes:
+    return bytes(view[offset : offset + size])
+
+
+def plan_zip(archive: zipfile.ZipFile) -> t.Tuple[t.List[t.Tuple[int, PurePosixPath]], t.Set[PurePosixPath]]:
+    """
+    Select the members of a zip archive to extract.
+
+    Args:
+        archive (zipfile.ZipFile): archive to extract.
+
+    Returns:
+        t.Tuple[t.List[t.Tuple[int, PurePosixPath]], t.Set[PurePosixPath]]: (index in the archive,
+            relative path) of the files to write, in archive order, and the directories to create.
+    """
+    files: t.Dict[PurePosixPath, int] = {}
+    directories = set()
+
+    for index, member in enumerate(archive.infolist()):
+        rel_path = safe_member_path(member.filename)
+
+        if rel_path is None:
+            log.warning(f"skipping unsafe archive member {member.filename!r}")
+            continue
+
+        if member.is_dir():
+            directories.add(rel_path)
+            continue
+
+        files[rel_path] = index  # duplicate member, the last one wins
+        directories.add(rel_path.parent)
+
+    return sorted((index, rel_path) for rel_path, index in files.items()), directories
+
+
+def _extract_zip_members(
+    archive: zipfile.ZipFile,
+    members: t.Sequence[t.Tuple[int, PurePosixPath]],
+    dest: Path,
+    blob_store: t.Optional[BlobStore],
+) -> t.List[t.Tuple[int, ExtractedFile]]:
+    """
+    Write some of the files of a zip archive, their directories must exist.
+
+    Args:
+        archive (zipfile.ZipFile): handle on the archive, used by a single thread.
+        members (t.Sequence[t.Tuple[int, PurePosixPath]]): (index in the archive, relative path) of the files.
+        dest (Path): target directory.
+        blob_store (t.Optional[BlobStore]): store to deduplicate with.
+
+    Returns:
+        t.List[t.Tuple[int, ExtractedFile]]: index in the archive and extracted file.
+    """
+    infolist = archive.infolist()
+    extracted = []
+
+    for index, rel_path in members:
+        member = infolist[index]
+        target = dest.joinpath(rel_path)
+
+        if member.file_size <= SMALL_FILE_SIZE:
+            size, digest = write_small_member(archive.read(member), target, blob_store)
+        else:
+            with archive.open(member) as source:
+                size, digest = write_member(source, target, blob_store)
+
+        extracted.append((index, ExtractedFile(rel_path.as_posix(), size, int(os.stat(target).st_mtime), digest)))
+
+    return extracted
+
+
+def _extract_zip_stripe(
+    open_handle: t.Callable[[], zipfile.ZipFile],
+    dest: Path,
+    blob_store: t.Optional[BlobStore],
+    members: t.Sequence[t.Tuple[int, PurePosixPath]],
+) -> t.List[t.Tuple[int, ExtractedFile]]:
+    with open_handle() as archive:
+        return _extract_zip_members(archive, members, dest, blob_store)
+
+
+def _report(kind: str, extracted: t.Sequence[ExtractedFile], started: float, workers: int = 1) -> None:
+    """
+    Record the size and throughput of an extraction.
+
+    Args:
+        kind (str): archive format, e.g. "zip".
+        extracted (t.Sequence[ExtractedFile]): extracted files.
+        started (float): `time.perf_counter()` when the extraction started.
+        workers (int, optional): number of threads which extracted the archive. Defaults to 1.
+    """
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    total = sum(file.size for file in extracted)
+
+    EXTRACTED_FILES.inc(len(extracted))
+    EXTRACTED_BYTES.inc(total)
+    EXTRACT_THROUGHPUT.observe(total / elapsed, format=kind)
+
+    log.info(
+        f"extracted {len(extracted)} files ({total / 1024 / 1024:.1f} MB) from {kind} archive in {elapsed:.2f}s, "
+        f"{total / 1024 / 1024 / elapsed:.1f} MB/s with {workers} worker(s)"
+    )
+
+
+def extract_zip(
+    archive: zipfile.ZipFile,
+    dest: Path,
+    blob_store: t.Optional[BlobStore] = None,
+    workers: t.Optional[int] = None,
+) -> t.List[ExtractedFile]:
+    """
+    Extract a zip archive, hashing every file and deduplicating it through the blob store.
+
+    The directories are created first, then the files are split between `workers` threads,
+    each reading the archive through its own `ZipFile` handle so members are inflated in
+    parallel. Small archives are extracted by the calling thread.
+
+    Args:
+        archive (zipfile.ZipFile): archive to extract.
+        dest (Path): target directory, e.g. a staged version directory.
+        blob_store (t.Optional[BlobStore], optional): store to deduplicate with. Defaults to None.
+        workers (t.Optional[int], optional): number of threads. Defaults to None, for `extract_workers`
+            capped by the number of CPUs.
+
+    Returns:
+        t.List[ExtractedFile]: extracted files, in archive order.
+    """
+    started = time.perf_counter()
+    files, directories = plan_zip(archive)
+
+    if workers is None:
+        workers = min(config.extract_workers, os.cpu_count() or 1)
+
+    workers = max(min(workers, len(files)), 1)
+
+    for directory in sorted(directories):
+        dest.joinpath(directory).mkdir(parents=True, exist_ok=True)
+
+    with _shared_archive(archive) as open_handle:
+        if open_handle is None or workers == 1 or len(files) < PARALLEL_MIN_FILES:
+            workers = 1
+            results = _extract_zip_members(archive, files, dest, blob_store)
+        else:
+            extract_stripe = functools.partial(_extract_zip_stripe, open_handle, dest, blob_store)
+            # interleaved stripes, so large and small files are spread evenly
+            stripes = [files[offset::workers] for offset in range(workers)]
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="byteguide-extract") as pool:
+                results = [result for stripe in pool.map(extract_stripe, stripes) for result in stripe]
+
+    extracted = [file for _, file in sorted(results, key=lambda result: result[0])]
+    _report("zip", extracted, started, workers)
+
+    return extracted
+
+
+def _open_tar_stream(stream: t.IO[bytes], compression: str) -> tarfile.TarFile:
+    """
+    Open a tar archive for sequential reading, the stream is never seeked.
+
+    Args:
+        stream (t.IO[bytes]): archive content, e.g. the body of a request as it arrives.
+        compression (str): "" (plain tar), "gz" or "zst".
+
+    Returns:
+        tarfile.TarFile: archive in stream mode.
+    """
+    if compression == "zst":
+        if zstandard is None:
+            raise InvalidArchiveError("zstandard is required to extract .tar.zst archives (pip install zstandard)")
+
+        stream = zstandard.ZstdDecompressor().stream_reader(stream)
+
+    if compression == "gz":
+        return tarfile.open(fileobj=stream, mode="r|gz")
+
+    return tarfile.open(fileobj=stream, mode="r|")
+
+
+def extract_tar(
+    stream: t.IO[bytes], compression: str, dest: Path, blob_store: t.Optional[BlobStore] = None
+) -> t.List[ExtractedFile]:
+    """
+    Extract a tar archive while it is read, hashing every file and deduplicating it through the blob store.
+
+    Only directories and regular files are extracted, links and special files are skipped
+    as are members which would escape `dest`.
+
+    Args:
+        stream (t.IO[bytes]): archive content.
+        compression (str): "" (plain tar), "gz" or "zst".
+        dest (Path): target directory, e.g. a staged version directory.
+        blob_store (t.Optional[BlobStore], optional): store to deduplicate with. Defaults to None.
+
+    Returns:
+        t.List[ExtractedFile]: extracted files, once per path.
+    """
+    started = time.perf_counter()
+    extracted: t.Dict[str, ExtractedFile] = {}
+
+    try:
+        with _open_tar_stream(stream, compression) as archive:
+            for member in archive:
+                rel_path = safe_member_path(member.name)
+
+                if rel_path is None or not (member.isfile() or member.isdir()):
+                    log.warning(f"skipping unsafe archive member {member.name!r}")
+                    continue
+
+                target = dest.joinpath(rel_path)
+
+                if member.isdir():
+                    target.mkdir(parents=True, exist_ok=True)
+                    continue
+
+                target.parent.mkdir(parents=True, exist_ok=True)
+
+                if target.exists():
+                    target.unlink()  # duplicate member, the last one wins (never write into a shared blob)
+                    extracted.pop(rel_path.as_posix(), None)  # listed once, in the position of the last member
+
+                source = archive.extractfile(member)
+                assert source is not None, f"{member.name} is a regular file"
+                size, digest = write_member(source, target, blob_store)
+
+                extracted[rel_path.as_posix()] = ExtractedFile(
+                    rel_path.as_posix(), size, int(os.stat(target).st_mtime), digest
+                )
+
+    except TAR_ERRORS as e:
+        raise InvalidArchiveError(f"invalid archive: {e}") from e
+    except OSError as e:
+        if e.errno is not None:
+            raise  # a real I/O error, e.g. disk full
+        raise InvalidArchiveError(f"invalid archive: {e}") from e  # e.g. gzip.BadGzipFile
+
+    files = list(extracted.values())
+    _report(f"tar.{compression}" if compression else "tar", files, started)
+
+    return files
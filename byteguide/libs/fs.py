@@ -1,14 +1,15 @@
 """ Filesystem related utilities. """
 
 import datetime as dt
-import json
-import re
+import functools
+import os
 import shutil
 import tempfile
 import typing as t
 import uuid
 import zipfile
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import natsort
@@ -16,14 +17,48 @@ from loguru import logger as log
 from werkzeug.datastructures.file_storage import FileStorage
 
 from byteguide.config import config
+from byteguide.libs.blobstore import blob_store, hash_file
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.compress import precompressor
+from byteguide.libs.delta import CHANGELOG, Delta, link_base_files
 from byteguide.libs.dtypes import Status
+from byteguide.libs.extract import (
+    ARCHIVE_FORMATS,
+    ExtractedFile,
+    Extractor,
+    InvalidArchiveError,
+    archive_suffix,
+    extract_tar,
+    extract_zip,
+)
+from byteguide.libs.journal import replication_journal
+from byteguide.libs.locks import project_locks
+from byteguide.libs.manifest import manifest_store
+from byteguide.libs.metrics import UPLOAD_STAGE_DURATION, UPLOADS, StageTimer
+from byteguide.libs.metastore import get_metadata_backend
+from byteguide.libs.publish import version_publisher
+from byteguide.libs.search_index import full_text_index
 from byteguide.libs.util import (
     ProjectEntry,
     Validators,
+    compile_pattern,
     get_directory_listing,
-    project_sort_key,
 )
 
+# called with the name of each upload stage as it starts
+ProgressCallback = t.Callable[[str], None]
+
+# spool bundle entries in memory up to this size, on disk beyond
+BUNDLE_SPOOL_BYTES = 4 * 1024 * 1024
+
+
+def _no_progress(stage: str) -> None:  # pylint: disable=unused-argument
+    """Default progress callback, does nothing."""
+
+
+# blobs are freed once the version trees linking them are removed
+version_publisher.on_collected(blob_store.collect_garbage)
+
 
 class Uploader:
     """
@@ -51,26 +86,55 @@ class Uploader:
 
         return True
 
-    def _retrieve_name_and_version_from_zip(self, filename: FileStorage) -> t.Tuple[str, str]:
+    def _retrieve_name_and_version(self, filename: FileStorage) -> t.Tuple[str, str, str]:
         """
-        Retrieve project name and version from the zip file name.
+        Retrieve project name and version from the archive file name.
 
         Args:
-            filename (Path): zip file name.
+            filename (Path): archive file name, e.g. `proj_name-version.zip` or `proj_name-version.tar.gz`.
 
         Returns:
-            Tuple[str, str]: project name and version.
+            Tuple[str, str, str]: project name, version and archive suffix (one of `ARCHIVE_FORMATS`).
         """
         name = filename.filename
 
         assert isinstance(name, str), f"{filename=} must be a string!"
-        assert name.endswith(".zip"), f"{filename=} must be a .zip file! (e.g. proj_name-version.zip)"
 
-        name = name[:-4]
+        suffix = archive_suffix(name)
+        assert suffix, f"{filename=} must be one of {', '.join(ARCHIVE_FORMATS)} (e.g. proj_name-version.zip)"
+
+        name = name[: -len(suffix)]
         name, version = name.rsplit("-", maxsplit=1)
-        return name, version
+        return name, version, suffix
 
-    def upload(self, filename: FileStorage, uniq_key: str, reupload: bool = False) -> Status:
+    def check_key(self, filename: str, uniq_key: str) -> Status:
+        """
+        Check that an archive name belongs to a registered project and the unique key is the project's.
+
+        Args:
+            filename (str): archive file name, e.g. `proj_name-version.zip`.
+            uniq_key (str): unique key for the project.
+
+        Returns:
+            Status: OK, NOT_REGISTERED or INVALID_UNIQUE_KEY.
+        """
+        name, _, _ = self._retrieve_name_and_version(FileStorage(filename=filename))
+
+        if not Validators.is_valid_name(name) or not config.docfiles_dir.joinpath(name).is_dir():
+            return Status.NOT_REGISTERED
+
+        if MetaDataHandler(project=name).metadata.get("unique-key") != uniq_key:
+            return Status.INVALID_UNIQUE_KEY
+
+        return Status.OK
+
+    def upload(
+        self,
+        filename: FileStorage,
+        uniq_key: str,
+        reupload: bool = False,
+        progress: ProgressCallback = _no_progress,
+    ) -> Status:
         """
         Upload a version zip file to byteguide.
 
@@ -78,13 +142,136 @@ class Uploader:
             filename (Path): uploaded file to be decompressed and stored.
             uniq_key (str): unique key for the project.
             reupload (bool, optional): reupload version. Defaults to False.
+            progress (ProgressCallback, optional): called with the name of each stage as it starts.
+
+        Returns:
+            Status: One of the Status enum values.
+        """
+        timer = StageTimer(UPLOAD_STAGE_DURATION, progress)
+        status = Status.ERROR
+
+        try:
+            status = self._upload(filename, uniq_key, reupload, timer)
+        finally:
+            timer.finish()
+            UPLOADS.inc(status=status.value)
+
+        return status
+
+    def upload_delta(
+        self,
+        filename: FileStorage,
+        uniq_key: str,
+        delta: Delta,
+        progress: ProgressCallback = _no_progress,
+    ) -> Status:
+        """
+        Publish a version built from a published version and an archive of the added and changed files only.
+
+        The client compares its build with the manifest of the base version
+        (`/api/projects/<name>/<version>/manifest`), uploads the files which differ and lists
+        the ones to delete. Unchanged files are hardlinked from the base version, the new
+        tree is then published atomically like a full upload.
+
+        Args:
+            filename (FileStorage): archive of the added and changed files, named `proj_name-version.<ext>`.
+            uniq_key (str): unique key for the project.
+            delta (Delta): base version and deleted paths.
+            progress (ProgressCallback, optional): called with the name of each stage as it starts.
 
         Returns:
             Status: One of the Status enum values.
         """
+        timer = StageTimer(UPLOAD_STAGE_DURATION, progress)
+        status = Status.ERROR
+
+        try:
+            status = self._upload_delta(filename, uniq_key, delta, timer)
+        finally:
+            timer.finish()
+            UPLOADS.inc(status=status.value)
+
+        return status
+
+    def upload_many(
+        self,
+        files: t.Sequence[FileStorage],
+        uniq_keys: t.Mapping[str, str],
+        default_key: str = "",
+        reupload: bool = False,
+    ) -> t.List[t.Dict[str, str]]:
+        """
+        Upload several version zip files, possibly of different projects, on a worker pool.
+
+        Metadata updates of a project are serialized by the project lock, the `latest`
+        symlink ends up pointing to the latest version whatever order they finish in.
+
+        Args:
+            files (t.Sequence[FileStorage]): uploaded files.
+            uniq_keys (t.Mapping[str, str]): unique key of each project.
+            default_key (str, optional): unique key of the projects missing from `uniq_keys`. Defaults to "".
+            reupload (bool, optional): reupload versions. Defaults to False.
+
+        Returns:
+            t.List[t.Dict[str, str]]: `file`, `status` and `message` of each file, in the given order.
+        """
+
+        def upload_one(uploaded_file: FileStorage) -> t.Dict[str, str]:
+            result = {"file": str(uploaded_file.filename), "status": Status.ERROR.value, "message": ""}
+
+            try:
+                name, _, _ = self._retrieve_name_and_version(uploaded_file)
+                uniq_key = uniq_keys.get(name, default_key)
+                result["status"] = self.upload(uploaded_file, uniq_key=uniq_key, reupload=reupload).value
+            except Exception as e:  # pylint: disable=broad-except
+                log.error(e)
+                result["message"] = str(e)
+
+            return result
+
+        with ThreadPoolExecutor(max_workers=config.batch_upload_workers) as pool:
+            return list(pool.map(upload_one, files))
+
+    @staticmethod
+    def expand_bundle(bundle: FileStorage) -> t.List[FileStorage]:
+        """
+        Get the version zip files (`proj_name-version.zip`) contained in a bundle zip file.
+
+        Args:
+            bundle (FileStorage): uploaded bundle.
+
+        Returns:
+            t.List[FileStorage]: version zip files, spooled to temporary files.
+        """
+        files = []
+
+        with zipfile.ZipFile(bundle) as archive:
+            members = [member for member in archive.infolist() if not member.is_dir()]
+
+            if len(members) > config.batch_max_items:
+                raise ValueError(f"Bundle contains {len(members)} files, at most {config.batch_max_items} are allowed.")
+
+            for member in members:
+                # pylint: disable-next=consider-using-with
+                spooled = tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_BYTES)
+
+                with archive.open(member) as source:
+                    shutil.copyfileobj(source, spooled)
+
+                spooled.seek(0)
+                files.append(FileStorage(stream=spooled, filename=Path(member.filename).name))
+
+        return files
+
+    def _upload(self, filename: FileStorage, uniq_key: str, reupload: bool, progress: ProgressCallback) -> Status:
+        """
+        Validate and publish an uploaded version, see `upload`.
+        """
         status = None
+        progress("validating")
 
-        name, version = self._retrieve_name_and_version_from_zip(filename)
+        name, version, suffix = self._retrieve_name_and_version(filename)
+        compression = ARCHIVE_FORMATS[suffix]
 
         projdir = config.docfiles_dir.joinpath(name)
         verdir = projdir.joinpath(version)
@@ -106,37 +293,146 @@ class Uploader:
             elif verdir.exists() and not reupload:
                 status = Status.ALREADY_EXISTS
 
-            else:
-                if not verdir.exists():
-                    verdir.mkdir()
-
+            elif compression is None:
                 # This is insecure, we are only accepting things from trusted sources.
                 with zipfile.ZipFile(filename) as compressed_file:
-                    if self.is_valid_zip_file(compressed_file):
-                        try:
-                            # Extract full archive to temporary directory
-                            temp_dir = tempfile.mkdtemp()
-                            compressed_file.extractall(temp_dir)
-
-                            shutil.rmtree(verdir)  # clear possibly existing target dir
-                            shutil.move(temp_dir, verdir)
-                            shutil.rmtree(temp_dir, ignore_errors=True)
-
-                        except Exception as e:  # pylint: disable=broad-except
-                            log.error(e)
-                            status = Status.ERROR
-
-                        else:
-                            self.update_version_metadata(name, version)
-                            self.create_latest_symlink(name)
-                            self.move_changelog_to_root(verdir, projdir)
-                            status = Status.OK
-
-                    else:
+                    if not self.is_valid_zip_file(compressed_file):
                         status = Status.NOT_A_VALID_ZIP_FILE
+                    elif verdir.exists() and manifest_store.matches_zip(name, version, compressed_file):
+                        log.info(f"{name} {version} is unchanged, skipping the reupload")
+                        status = Status.UNCHANGED
+                    else:
+                        extract = functools.partial(extract_zip, compressed_file)
+                        status = self._publish_version(extract, projdir, version, progress)
+
+            else:
+                # tar archives are extracted as they are read, the root index is checked afterwards
+                extract = functools.partial(extract_tar, filename.stream, compression)
+                status = self._publish_version(extract, projdir, version, progress)
 
         return status
 
+    def _upload_delta(self, filename: FileStorage, uniq_key: str, delta: Delta, progress: ProgressCallback) -> Status:
+        """
+        Validate and publish a delta upload, see `upload_delta`.
+        """
+        progress("validating")
+
+        status = self.check_key(str(filename.filename), uniq_key)
+        if status != Status.OK:
+            return status
+
+        name, version, suffix = self._retrieve_name_and_version(filename)
+        base = delta.base or version
+        projdir = config.docfiles_dir.joinpath(name)
+
+        if not Validators.is_valid_version(version):
+            return Status.INVALID_VERSION
+
+        if not Validators.is_valid_version(base) or not projdir.joinpath(base).is_dir():
+            return Status.NOT_FOUND
+
+        if base != version and projdir.joinpath(version).exists() and not delta.reupload:
+            return Status.ALREADY_EXISTS
+
+        removed = delta.removed_paths(manifest_store.load(name, base), f"{name} {base}")
+        compression = ARCHIVE_FORMATS[suffix]
+
+        if compression is None:
+            with zipfile.ZipFile(filename) as compressed_file:
+                extract = functools.partial(
+                    link_base_files, functools.partial(extract_zip, compressed_file), name, base, removed
+                )
+                return self._publish_version(extract, projdir, version, progress)
+
+        extract = functools.partial(
+            link_base_files, functools.partial(extract_tar, filename.stream, compression), name, base, removed
+        )
+        return self._publish_version(extract, projdir, version, progress)
+
+    def _publish_version(
+        self,
+        extract: Extractor,
+        projdir: Path,
+        version: str,
+        progress: ProgressCallback,
+    ) -> Status:
+        """
+        Extract the archive next to the version directory and swap it in atomically.
+
+        The manifest of the version is written along with it. A reupload with the same files
+        as the published version is discarded, the version is left untouched.
+
+        Args:
+            extract (Extractor): extracts the version archive into a directory.
+            projdir (Path): project directory.
+            version (str): version to publish.
+            progress (ProgressCallback): called with the name of each stage as it starts.
+
+        Returns:
+            Status: One of the Status enum values.
+        """
+        name = projdir.name
+        staged = version_publisher.stage(projdir, version)
+
+        try:
+            progress("extracting")
+            extracted = extract(staged, blob_store if config.dedup_enabled else None)
+
+            if not staged.joinpath("index.html").is_file():
+                log.error("Failed to find root index file!")
+                version_publisher.discard(staged)
+                return Status.NOT_A_VALID_ARCHIVE
+
+            # the changelog is moved to the project directory, it is not part of the published version
+            changelog = next((file for file in extracted if file.path == CHANGELOG), None)
+            extracted = [file for file in extracted if file.path != CHANGELOG]
+            previous = manifest_store.load(name, version) if projdir.joinpath(version).exists() else None
+
+            if (
+                previous is not None
+                and manifest_store.same_files(previous, extracted)
+                and not self._changelog_changed(changelog, projdir)
+            ):
+                log.info(f"{name} {version} is unchanged, skipping the reupload")
+                version_publisher.discard(staged)
+                return Status.UNCHANGED
+
+            self.move_changelog_to_root(staged, projdir)
+
+            if config.precompress_enabled:
+                progress("precompressing")
+                precompressor.compress_tree(staged)
+
+            progress("publishing")
+            with project_locks.hold(name):
+                # the manifest must describe the tree which ends up published
+                version_publisher.publish(staged, projdir.joinpath(version))
+                manifest_store.save(name, manifest_store.build(version, extracted))
+                replication_journal.record("version", name, version)
+
+        except InvalidArchiveError as e:
+            log.error(e)
+            version_publisher.discard(staged)
+            return Status.NOT_A_VALID_ARCHIVE
+
+        except Exception as e:  # pylint: disable=broad-except
+            log.error(e)
+            version_publisher.discard(staged)
+            return Status.ERROR
+
+        progress("updating-metadata")
+        with project_locks.hold(name):
+            self.update_version_metadata(name, version)
+            progress("symlinking")
+            self.create_latest_symlink(name)
+        project_catalog.refresh(name)
+
+        progress("indexing")
+        self.index_version(name, version)
+
+        return Status.OK
+
     def delete(self, project: str, version: str) -> t.Tuple[bool, str]:
         """
         Delete a version from the project.
@@ -150,17 +446,59 @@ class Uploader:
         """
         version_dir = config.docfiles_dir.joinpath(project, version)
 
-        if not version_dir.exists():
-            return False, "Version not found!"
+        with project_locks.hold(project):
+            if not version_dir.exists():
+                return False, "Version not found!"
+
+            # point `latest` elsewhere before the directory disappears
+            metadata_handler = MetaDataHandler(project)
+            metadata_handler.delete_version(version)
+            self.update_latest_symlink(project)
+            manifest_store.remove(project, version)
+
+            try:
+                version_publisher.retire(version_dir)
+            except Exception as e:  # pylint: disable=broad-except
+                log.error(e)
+                return False, str(e)
+
+            replication_journal.record("delete", project, version)
+
+        if config.search_index_enabled:
+            full_text_index.delete_version(project, version)
+
+        return True, "Version deleted successfully!"
+
+    @staticmethod
+    def index_version(project: str, version: str) -> None:
+        """
+        Add the pages of a published version to the full-text search index.
+
+        Args:
+            project (str): project name.
+            version (str): published version.
+        """
+        if not config.search_index_enabled:
+            return
 
         try:
-            shutil.rmtree(version_dir)
+            full_text_index.index_version(project, version, config.docfiles_dir.joinpath(project, version))
         except Exception as e:  # pylint: disable=broad-except
-            log.error(e)
-            return False, str(e)
+            # the version is already published, a broken index must not fail the upload
+            log.exception(e)
 
-        MetaDataHandler(project).delete_version(version)
-        return True, "Version deleted successfully!"
+    @classmethod
+    def update_latest_symlink(cls, name: str) -> None:
+        """
+        Point the `latest` symlink to the latest remaining version, remove it if there is none.
+
+        Args:
+            name (str): project name.
+        """
+        if MetaDataHandler(name).get_latest_version():
+            cls.create_latest_symlink(name)
+        else:
+            config.docfiles_dir.joinpath(name, "latest").unlink(missing_ok=True)
 
     @staticmethod
     def create_latest_symlink(name: str) -> None:
@@ -174,10 +512,10 @@ class Uploader:
         proj_dir = config.docfiles_dir.joinpath(name)
         latest_link = proj_dir.joinpath("latest")
 
-        if latest_link.exists():
-            latest_link.unlink()
-
-        latest_link.symlink_to(latest_ver)
+        # replace the link atomically, so `latest` never disappears for readers
+        temp_link = proj_dir.joinpath(f".latest-{uuid.uuid4().hex}")
+        temp_link.symlink_to(latest_ver)
+        os.replace(temp_link, latest_link)
 
     @staticmethod
     def update_version_metadata(project: str, version: str) -> str:
@@ -202,6 +540,26 @@ class Uploader:
 
         return proj_metadata.get_latest_version()
 
+    @staticmethod
+    def _changelog_changed(changelog: t.Optional[ExtractedFile], projdir: Path) -> bool:
+        """
+        Check if an uploaded changelog differs from the one in the project directory.
+
+        Args:
+            changelog (t.Optional[ExtractedFile]): uploaded changelog, None if the archive has none.
+            projdir (Path): project directory.
+
+        Returns:
+            bool: True if publishing the upload would replace the changelog.
+        """
+        if changelog is None:
+            return False
+
+        try:
+            return hash_file(projdir.joinpath(CHANGELOG)) != changelog.digest
+        except FileNotFoundError:
+            return True
+
     def move_changelog_to_root(self, verdir: Path, projdir: Path) -> None:
         """
         Move the changelog file to the project root.
@@ -210,9 +568,17 @@ class Uploader:
             verdir (Path): version directory.
             projdir (Path): project directory.
         """
-        changelog = verdir.joinpath("changelog.html")
-        if changelog.exists():
-            shutil.move(changelog, projdir)  # type: ignore[arg-type]
+        changelog = verdir.joinpath(CHANGELOG)
+        root_changelog = projdir.joinpath(CHANGELOG)
+
+        if not changelog.exists():
+            return
+
+        if root_changelog.exists() and os.path.samefile(changelog, root_changelog):
+            # both link the same blob, rename(2) would leave the version's link in place
+            changelog.unlink()
+        else:
+            os.replace(changelog, root_changelog)
 
 
 class MetaDataHandler:
@@ -223,7 +589,8 @@ class MetaDataHandler:
     def __init__(self, project: str):
         """
         Handles metadata for projects.
-        Metadata is stored in a JSON file named `metadata.json` in the project directory.
+        Metadata is stored by the backend selected with the `metadata_backend` config option,
+        by default in a JSON file named `metadata.json` in the project directory (see `metastore`).
 
         Metadata is a JSON object with the following keys:
 
@@ -235,8 +602,10 @@ class MetaDataHandler:
         - `tags`: list of tags for the project
         - `unique-key`: unique key for the project
         - `versions`: list of versions of the project
-        - `keep-latest-n`: latest N versions of the project
-          [optional] [not implemented yet]
+        - `keep-latest-n`: keep only the latest N versions of the project [optional]
+        - `keep-days`: keep only the versions uploaded in the last N days [optional]
+        - `pinned-versions`: versions which are never removed by retention [optional]
+          (see `retention`, a version is kept if any of the rules keeps it)
         - `notify-owner-on-update`: notify project owner when a new version is uploaded
           [optional] [not implemented yet]
 
@@ -247,6 +616,7 @@ class MetaDataHandler:
         self.docs_dir = config.docfiles_dir
         self.project_dir = self.docs_dir.joinpath(project)
         self.meta_file_name = "metadata.json"
+        self.backend = get_metadata_backend()
         self.metadata = self.read_metadata()
 
     def _get_metadata_file(self) -> Path:
@@ -259,16 +629,7 @@ class MetaDataHandler:
         Returns:
             The project metadata.
         """
-        metadata_file = self._get_metadata_file()
-
-        log.info(f"reading {metadata_file}...")
-
-        if metadata_file.exists():
-            with open(metadata_file, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
-
-            return metadata
-        return {}
+        return self.backend.load(self.project)
 
     def init_metadata(self, metadata: t.Dict) -> str:
         """
@@ -280,12 +641,27 @@ class MetaDataHandler:
         Returns:
             str: unique key for the project.
         """
-        metadata_file = self._get_metadata_file()
+        with project_locks.hold(self.project):
+            if self.backend.exists(self.project):
+                raise FileExistsError(f"Metadata for project {self.project} already exists.")
 
-        if metadata_file.exists():
-            raise FileExistsError(f"Metadata file for project {metadata_file} already exists.")
+            unique_key = str(uuid.uuid4())
+            self.save(self._normalize(metadata, unique_key))
 
-        unique_key = str(uuid.uuid4())
+        return unique_key
+
+    @staticmethod
+    def _normalize(metadata: t.Dict, unique_key: str) -> t.Dict:
+        """
+        Normalize the metadata of a newly registered project.
+
+        Args:
+            metadata (t.Dict): project metadata.
+            unique_key (str): unique key for the project.
+
+        Returns:
+            t.Dict: normalized metadata.
+        """
 
         metadata["unique-key"] = unique_key
 
@@ -297,9 +673,7 @@ class MetaDataHandler:
         if "programming-lang" in metadata:
             metadata["programming-lang"] = metadata["programming-lang"].lower()
 
-        self.save(metadata)
-
-        return unique_key
+        return metadata
 
     def add_version(self, version: str) -> None:
         """
@@ -308,14 +682,18 @@ class MetaDataHandler:
         Args:
             version (str): version to add.
         """
-        if "versions" not in self.metadata:
-            self.metadata["versions"] = {}
+        with project_locks.hold(self.project):
+            # re-read under the lock, another worker may have changed the metadata
+            self.metadata = self.read_metadata()
 
-        _upload_time = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if "versions" not in self.metadata:
+                self.metadata["versions"] = {}
 
-        self.metadata["versions"][version] = {"upload-date": _upload_time}
-        self.sort_versions()
-        self.save()
+            _upload_time = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            self.metadata["versions"][version] = {"upload-date": _upload_time}
+            self.sort_versions()
+            self.save()
 
     def delete_version(self, version: str) -> None:
         """
@@ -324,10 +702,14 @@ class MetaDataHandler:
         Args:
             version (str): version to delete.
         """
-        if version in self.metadata["versions"]:
-            del self.metadata["versions"][version]
-            self.sort_versions()
-            self.save()
+        with project_locks.hold(self.project):
+            # re-read under the lock, another worker may have changed the metadata
+            self.metadata = self.read_metadata()
+
+            if version in self.metadata.get("versions", {}):
+                del self.metadata["versions"][version]
+                self.sort_versions()
+                self.save()
 
     def sort_versions(self) -> None:
         """
@@ -347,7 +729,7 @@ class MetaDataHandler:
         Returns:
             str: latest version of the project.
         """
-        if "versions" not in self.metadata:
+        if not self.metadata.get("versions"):
             return ""
 
         return list(self.metadata["versions"])[0]
@@ -360,15 +742,19 @@ class MetaDataHandler:
             metadata (t.Optional[t.Dict], optional): project metadata. Defaults to None.
         """
         metadata = metadata or self.metadata
-        metadata_file = self._get_metadata_file()
 
-        with open(metadata_file, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=4)
+        self.backend.store(self.project, metadata)
+
+        project_catalog.refresh(self.project)
+        replication_journal.record("project", self.project)
 
 
 class DocsDirScanner:
     """
     Scans the docs directory and creates the list of projects.
+
+    Projects under the configured `docfiles_dir` are served from the in-memory
+    `project_catalog`, any other directory is scanned from disk.
     """
 
     def __init__(self) -> None:
@@ -386,20 +772,30 @@ class DocsDirScanner:
         """
         projects = OrderedDict()
 
-        for project in natsort.natsorted(all_projects, key=project_sort_key):
-            project_metadata = project.metadata
+        for project in sorted(all_projects, key=lambda entry: entry.sort_key):
+            data = project.template_data  # computed once per entry, shared between requests
+            projects[data["name"]] = data
 
-            if "versions" in project_metadata:
-                versions = natsort.natsorted(project_metadata["versions"], key=lambda x: x[0])
-            else:
-                versions = []
+        return projects
 
-            project_metadata["versions"] = versions
-            project_metadata["changelog"] = project.has_changelog
+    @staticmethod
+    def _list_projects(docfiles_dir: t.Optional[Path] = None) -> t.List[ProjectEntry]:
+        """
+        List the projects of a docs directory.
 
-            projects[project_metadata["name"]] = project_metadata
+        Args:
+            docfiles_dir (t.Optional[Path], optional): docs directory. Defaults to None.
 
-        return projects
+        Returns:
+            t.List[ProjectEntry]: list of projects.
+        """
+        if docfiles_dir is None or docfiles_dir == config.docfiles_dir:
+            return project_catalog.projects()
+
+        if not docfiles_dir.is_dir():
+            return []
+
+        return get_directory_listing(path=docfiles_dir)
 
     def get_proj_metadata(self, project: Path) -> t.Optional[t.Dict[str, t.Any]]:
         """
@@ -428,27 +824,61 @@ class DocsDirScanner:
         Returns:
             t.Dict[str, t.Any]: project versions.
         """
-        docfiles_dir = config.docfiles_dir
-        proj_dir = docfiles_dir.joinpath(project)
+        entry = project_catalog.get(project)
 
-        if not docfiles_dir.is_dir() or not proj_dir.is_dir():
+        if entry is None or not entry.metadata:
             return {}
 
-        project_metadata = self.get_proj_metadata(proj_dir)
-
-        if not project_metadata:
-            return {}
+        project_metadata = dict(entry.metadata)
 
         log.debug(project_metadata)
-        if "versions" in project_metadata:
-            versions = natsort.natsorted(project_metadata["versions"], key=lambda x: x[0])
-        else:
-            versions = []
-
-        project_metadata["versions"] = ["latest", *versions]
+        project_metadata["versions"] = ["latest", *(ver for ver, _ in entry.sorted_versions)]
 
         return project_metadata
 
+    def get_project(self, name: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """
+        Get a single project as template data.
+
+        Args:
+            name (str): project name, case is ignored.
+
+        Returns:
+            t.Optional[t.Dict[str, t.Any]]: project data, None if the project is unknown.
+        """
+        entry = project_catalog.lookup(name)
+
+        if entry is None or not entry.metadata:
+            return None
+
+        return next(iter(self.projects_as_template_data([entry]).values()))
+
+    def get_manifest(self, name: str, version: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """
+        Get the manifest of a version.
+
+        Args:
+            name (str): project name, case is ignored.
+            version (str): version, or "latest".
+
+        Returns:
+            t.Optional[t.Dict[str, t.Any]]: manifest, None if the project, version or manifest is unknown.
+        """
+        entry = project_catalog.lookup(name)
+
+        if entry is None:
+            return None
+
+        project = entry.path.name
+
+        if version == "latest":
+            version = MetaDataHandler(project).get_latest_version()
+
+        if version not in {ver for ver, _ in entry.versions}:
+            return None
+
+        return manifest_store.load(project, version)
+
     def get_all_projects(self, docfiles_dir: t.Optional[Path] = None) -> t.Dict[str, t.List[str]]:
         """
         Create the list of the projects.
@@ -456,12 +886,7 @@ class DocsDirScanner:
         The list of projects is computed by walking the `docfiles_dir` and
         searching for project paths (<project-name>/<version>/index.html)
         """
-        docfiles_dir = docfiles_dir or config.docfiles_dir
-
-        if not docfiles_dir.is_dir():
-            return {}
-
-        all_projects: t.List[ProjectEntry] = get_directory_listing(path=docfiles_dir)
+        all_projects = self._list_projects(docfiles_dir)
 
         return self.projects_as_template_data(all_projects)
 
@@ -484,14 +909,10 @@ class DocsDirScanner:
         Returns:
             t.Dict[str, t.List[str]]: list of projects matching the filter.
         """
-        docfiles_dir = docfiles_dir or config.docfiles_dir
-
-        if not docfiles_dir.is_dir():
-            return {}
-
-        all_proj_dirs = get_directory_listing(path=docfiles_dir)
-
-        filtered_result = self.apply_filter(all_proj_dirs, lang, pattern, tag)
+        if docfiles_dir is None or docfiles_dir == config.docfiles_dir:
+            filtered_result = project_catalog.find(lang=lang, pattern=pattern, tag=tag)
+        else:
+            filtered_result = self.apply_filter(self._list_projects(docfiles_dir), lang, pattern, tag)
 
         if filtered_result:
             return self.projects_as_template_data(filtered_result)
@@ -505,7 +926,7 @@ class DocsDirScanner:
         tag: t.Optional[str],
     ) -> t.List[ProjectEntry]:
         """
-        Apply the filter to the list of projects and return matching projects.
+        Apply the filter to the list of projects and return projects matching all the given filters.
 
         Args:
             all_projects (t.OrderedDict[str, t.Dict[str, t.Any]]): list of projects.
@@ -513,22 +934,26 @@ class DocsDirScanner:
             pattern (t.Optional[str], optional): project name pattern. Defaults to None.
             tag (t.Optional[str], optional): project tag. Defaults to None.
         """
+        if not (pattern or lang or tag):
+            return []
+
+        result = all_projects
+
         if pattern:
             try:
-                pattern_ = re.compile(pattern)
-                result = [proj for proj in all_projects if pattern_.match(proj.metadata["name"])]
+                pattern_ = compile_pattern(pattern)
+                result = [proj for proj in result if pattern_.match(proj.metadata["name"])]
             except Exception as e:  # pylint: disable=broad-except
                 log.exception(e)
                 result = []
-            return result
 
         if lang:
-            return [proj for proj in all_projects if proj.metadata["programming-lang"] == lang.lower()]
+            result = [proj for proj in result if proj.metadata["programming-lang"] == lang.lower()]
 
         if tag:
-            return [proj for proj in all_projects if tag.lower() in proj.metadata["tags"]]
+            result = [proj for proj in result if tag.lower() in proj.metadata["tags"]]
 
-        return []
+        return result
 
 
 docs_dir_scanner = DocsDirScanner()
@@ -0,0 +1,308 @@
+""" Background upload jobs. """
+
+import enum
+import json
+import os
+import threading
+import time
+import typing as t
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger as log
+from werkzeug.datastructures.file_storage import FileStorage
+
+from byteguide.config import config
+from byteguide.libs.fs import Uploader
+
+
+class JobState(enum.Enum):
+    """
+    Represents the state of an upload job.
+    """
+
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the upload queue can not accept more jobs.
+    """
+
+
+class UploadJob:  # pylint: disable=too-many-instance-attributes
+    """
+    Represents an upload running in the background.
+    """
+
+    def __init__(self, filename: str, spool_dir: Path, uniq_key: str, reupload: bool):
+        self.job_id = uuid.uuid4().hex
+        self.filename = filename
+        self.archive = spool_dir.joinpath(f"{self.job_id}.archive")
+        self.details = spool_dir.joinpath(f"{self.job_id}.json")
+        self.uniq_key = uniq_key
+        self.reupload = reupload
+        self.state = JobState.QUEUED
+        self.stage = ""
+        self.status: t.Optional[str] = None
+        self.message = ""
+        self.created = time.time()
+        self.started: t.Optional[float] = None
+        self.finished: t.Optional[float] = None
+        self.timings: t.Dict[str, float] = {}
+        self._stage_started = 0.0
+
+    def enter_stage(self, stage: str) -> None:
+        """
+        Record the start of an upload stage, closing the previous one.
+
+        Args:
+            stage (str): name of the stage.
+        """
+        now = time.monotonic()
+
+        if self.stage:
+            self.timings[self.stage] = round(now - self._stage_started, 4)
+
+        self.stage = stage
+        self._stage_started = now
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        """
+        Get the job as a JSON serializable dict.
+
+        Returns:
+            t.Dict[str, t.Any]: job details.
+        """
+        return {
+            "job-id": self.job_id,
+            "file": self.filename,
+            "state": self.state.value,
+            "stage": self.stage,
+            "status": self.status,
+            "message": self.message,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "timings": self.timings,
+        }
+
+
+class UploadJobQueue:
+    """
+    Runs uploads on a bounded pool of background workers.
+
+    The request only spools the archive to `docfiles_dir/.uploads` and enqueues a job.
+    Job details are written next to the spooled archives as well, so the status can
+    be queried from any server process. Spool files not written to for `upload_spool_ttl`
+    seconds are removed when a job is submitted.
+    """
+
+    SPOOL_DIR = ".uploads"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, UploadJob]" = OrderedDict()
+        self._pending = 0
+        self._executor: t.Optional[ThreadPoolExecutor] = None
+        self._executor_pid = 0
+        self._uploader = Uploader()
+
+    def _spool_dir(self) -> Path:
+        spool_dir = config.docfiles_dir.joinpath(self.SPOOL_DIR)
+        spool_dir.mkdir(exist_ok=True)
+        return spool_dir
+
+    def _sweep(self, spool_dir: Path) -> None:
+        """
+        Remove the archives and job details not written to for `upload_spool_ttl` seconds,
+        e.g. of jobs queued before a restart or finished long ago.
+
+        Args:
+            spool_dir (Path): spool directory.
+        """
+        deadline = time.time() - config.upload_spool_ttl
+
+        with self._lock:
+            active = {job_id for job_id, job in self._jobs.items() if job.finished is None}
+
+        for entry in spool_dir.iterdir():
+            try:
+                if entry.stem not in active and entry.stat().st_mtime < deadline:
+                    log.info(f"removing stale upload spool file {entry.name}")
+                    entry.unlink()
+            except FileNotFoundError:
+                continue
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # worker threads do not survive a fork, create the pool in the current process
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=config.upload_workers, thread_name_prefix="byteguide-upload"
+            )
+            self._executor_pid = os.getpid()
+
+        return self._executor
+
+    def _persist(self, job: UploadJob) -> None:
+        """
+        Write the job details, replacing the previous ones atomically.
+
+        Args:
+            job (UploadJob): job to persist.
+        """
+        temp_file = job.details.with_suffix(".tmp")
+        temp_file.write_text(json.dumps(job.to_dict()), encoding="utf-8")
+        os.replace(temp_file, job.details)
+
+    def submit(self, uploaded_file: FileStorage, uniq_key: str, reupload: bool = False) -> UploadJob:
+        """
+        Spool an uploaded archive and enqueue its upload.
+
+        Args:
+            uploaded_file (FileStorage): uploaded archive.
+            uniq_key (str): unique key for the project.
+            reupload (bool, optional): reupload version. Defaults to False.
+
+        Returns:
+            UploadJob: the queued job.
+
+        Raises:
+            QueueFullError: if `upload_queue_size` jobs are already waiting or running.
+        """
+        return self._enqueue(str(uploaded_file.filename), uniq_key, reupload, uploaded_file.save)
+
+    def submit_file(self, archive: Path, filename: str, uniq_key: str, reupload: bool = False) -> UploadJob:
+        """
+        Enqueue the upload of an archive already on disk, the archive is moved to the spool directory.
+
+        Args:
+            archive (Path): archive, on the same filesystem as `docfiles_dir`.
+            filename (str): name of the archive, e.g. `proj_name-version.tar.gz`.
+            uniq_key (str): unique key for the project.
+            reupload (bool, optional): reupload version. Defaults to False.
+
+        Returns:
+            UploadJob: the queued job.
+
+        Raises:
+            QueueFullError: if `upload_queue_size` jobs are already waiting or running.
+        """
+        return self._enqueue(filename, uniq_key, reupload, lambda spooled: os.replace(archive, spooled))
+
+    def _enqueue(self, filename: str, uniq_key: str, reupload: bool, spool: t.Callable[[Path], t.Any]) -> UploadJob:
+        """
+        Spool an archive with `spool` and enqueue its upload.
+
+        Args:
+            filename (str): name of the archive.
+            uniq_key (str): unique key for the project.
+            reupload (bool): reupload version.
+            spool (t.Callable[[Path], t.Any]): writes the archive to the given path.
+
+        Returns:
+            UploadJob: the queued job.
+        """
+        with self._lock:
+            if self._pending >= config.upload_queue_size:
+                raise QueueFullError(f"Upload queue is full ({self._pending} jobs pending), try again later.")
+            self._pending += 1
+
+        try:
+            spool_dir = self._spool_dir()
+            self._sweep(spool_dir)
+            job = UploadJob(filename, spool_dir, uniq_key, reupload)
+            spool(job.archive)
+            self._persist(job)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > config.upload_jobs_history:
+                _, expired = self._jobs.popitem(last=False)
+                if expired.finished is not None:
+                    expired.details.unlink(missing_ok=True)
+
+        self._get_executor().submit(self._run, job)
+        log.info(f"queued upload job {job.job_id} for {filename}")
+
+        return job
+
+    def _run(self, job: UploadJob) -> None:
+        """
+        Run the upload pipeline for a job.
+
+        Args:
+            job (UploadJob): job to run.
+        """
+        job.state = JobState.RUNNING
+        job.started = time.time()
+
+        def progress(stage: str) -> None:
+            job.enter_stage(stage)
+            self._persist(job)
+
+        try:
+            with open(job.archive, "rb") as archive:
+                uploaded_file = FileStorage(stream=archive, filename=job.filename)
+                status = self._uploader.upload(
+                    uploaded_file, uniq_key=job.uniq_key, reupload=job.reupload, progress=progress
+                )
+
+        except Exception as e:  # pylint: disable=broad-except
+            log.exception(e)
+            job.state = JobState.FAILED
+            job.message = str(e)
+
+        else:
+            job.state = JobState.DONE
+            job.status = status.value
+
+        finally:
+            job.enter_stage("finished")
+            job.finished = time.time()
+            job.archive.unlink(missing_ok=True)
+
+            with self._lock:
+                self._pending -= 1
+
+                # a job dropped from the history while it ran is not looked up any more
+                if job.job_id in self._jobs:
+                    self._persist(job)
+                else:
+                    job.details.unlink(missing_ok=True)
+
+    def get(self, job_id: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """
+        Get the details of a job.
+
+        Args:
+            job_id (str): id of the job.
+
+        Returns:
+            t.Optional[t.Dict[str, t.Any]]: job details, None if the job is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is not None:
+            return job.to_dict()
+
+        # the job may have been submitted to another server process
+        job_file = config.docfiles_dir.joinpath(self.SPOOL_DIR, f"{job_id}.json")
+
+        if not job_id.isalnum() or not job_file.is_file():
+            return None
+
+        return json.loads(job_file.read_text(encoding="utf-8"))
+
+
+upload_jobs = UploadJobQueue()
@@ -0,0 +1,142 @@
+""" Append-only journal of the changes made to the docs tree, read by the replicas. """
+
+import json
+import os
+import time
+import typing as t
+from pathlib import Path
+
+from byteguide.config import config
+from byteguide.libs.metastore import get_metadata_backend
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+# sent by the replicas, checked against `replication_token`
+TOKEN_HEADER = "X-Replication-Token"
+
+
+class ReplicationJournal:
+    """
+    Log of the changes made by the writer, replicas replay it to catch up (see `replication`).
+
+    Every change is a JSON line of `docfiles_dir/.replication/journal.jsonl`:
+    `{"seq": ..., "time": ..., "event": ..., "project": ..., "version": ...}` where `event` is
+
+    - `project`: the metadata of the project changed (registration, new or deleted version...)
+    - `version`: a version was published
+    - `delete`: a version was deleted
+
+    `seq` is the byte offset of the line, a replica resumes reading right after the last
+    event it applied. Appends of several processes are serialized with an `flock`, lines
+    are never rewritten. Nothing is recorded by read-only nodes.
+    """
+
+    JOURNAL_DIR = ".replication"
+    JOURNAL_NAME = "journal.jsonl"
+
+    @property
+    def path(self) -> Path:
+        """Journal file."""
+        return config.docfiles_dir.joinpath(self.JOURNAL_DIR, self.JOURNAL_NAME)
+
+    def record(self, event: str, project: str, version: t.Optional[str] = None) -> None:
+        """
+        Append an event to the journal.
+
+        Args:
+            event (str): "project", "version" or "delete".
+            project (str): project name.
+            version (t.Optional[str], optional): version, for version events. Defaults to None.
+        """
+        if not config.replication_journal_enabled or config.readonly:
+            return
+
+        self.path.parent.mkdir(exist_ok=True)
+
+        with open(self.path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+            entry = {"seq": f.seek(0, os.SEEK_END), "time": time.time(), "event": event, "project": project}
+
+            if version is not None:
+                entry["version"] = version
+
+            f.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def end(self) -> int:
+        """
+        Get the offset the next event will be written at.
+
+        Returns:
+            int: size of the journal.
+        """
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def read(self, after: int = 0, limit: int = 500) -> t.Tuple[t.List[t.Dict[str, t.Any]], int]:
+        """
+        Read the events written from an offset on.
+
+        Args:
+            after (int, optional): offset to read from, `0` or the offset returned by a previous read.
+                Defaults to 0.
+            limit (int, optional): maximum number of events. Defaults to 500.
+
+        Returns:
+            t.Tuple[t.List[t.Dict[str, t.Any]], int]: events and the offset to read the next ones from.
+        """
+        try:
+            f = open(self.path, "rb")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            if after:
+                raise ValueError(f"{after} is not the offset of an event") from None
+            return [], 0
+
+        events: t.List[t.Dict[str, t.Any]] = []
+        offset = after
+
+        with f:
+            if after:
+                f.seek(after - 1)
+                if f.read(1) != b"\n":
+                    raise ValueError(f"{after} is not the offset of an event")
+
+            for line in f:
+                if not line.endswith(b"\n") or len(events) >= limit:
+                    break  # still being appended, or the page is full
+
+                events.append(json.loads(line))
+                offset += len(line)
+
+        return events, offset
+
+    def snapshot(self) -> t.Dict[str, t.Any]:
+        """
+        Describe the whole docs tree as events, for a replica starting from scratch.
+
+        The journal offset is taken first, changes made while listing are replayed as well.
+        The projects are read from the metadata backend, the catalog of this process may be
+        behind the changes made by the other ones.
+
+        Returns:
+            t.Dict[str, t.Any]: `seq` to read the journal from afterwards and the `events`.
+        """
+        seq = self.end()
+        backend = get_metadata_backend()
+        events: t.List[t.Dict[str, t.Any]] = []
+
+        for project in backend.list_projects():
+            versions = backend.load(project).get("versions") or {}
+            events.extend({"event": "version", "project": project, "version": version} for version in versions)
+            events.append({"event": "project", "project": project})
+
+        return {"seq": seq, "events": events}
+
+
+replication_journal = ReplicationJournal()
@@ -0,0 +1,108 @@
+""" Locks serializing changes to a project across threads and processes. """
+
+import contextlib
+import threading
+import typing as t
+
+from byteguide.config import config
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+class ProjectLocks:  # pylint: disable=too-few-public-methods
+    """
+    Per-project exclusive locks.
+
+    Threads of a process are serialized with a re-entrant lock, processes with an
+    `flock` on `docfiles_dir/.locks/<project>.lock`, which the OS releases if the
+    holder dies. Nested acquisitions by the same thread are allowed.
+    """
+
+    LOCK_DIR = ".locks"
+
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._locks: t.Dict[str, threading.RLock] = {}
+        self._depth: t.Dict[str, int] = {}
+        self._files: t.Dict[str, t.IO] = {}
+
+    def _thread_lock(self, project: str) -> threading.RLock:
+        with self._guard:
+            return self._locks.setdefault(project, threading.RLock())
+
+    def _lock_file(self, project: str) -> t.IO:
+        lock_dir = config.docfiles_dir.joinpath(self.LOCK_DIR)
+        lock_dir.mkdir(exist_ok=True)
+
+        lock_file = open(lock_dir.joinpath(f"{project}.lock"), "a+b")  # pylint: disable=consider-using-with
+
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+        return lock_file
+
+    @contextlib.contextmanager
+    def hold(self, project: str) -> t.Iterator[None]:
+        """
+        Hold the lock of a project.
+
+        Args:
+            project (str): project name.
+
+        Example:
+            with project_locks.hold("my-proj"):
+                ...  # read-modify-write the project metadata
+        """
+        with self._thread_lock(project):
+            # only the thread holding the RLock touches the depth/file of the project
+            depth = self._depth.get(project, 0)
+
+            if depth == 0:
+                self._files[project] = self._lock_file(project)
+
+            self._depth[project] = depth + 1
+
+            try:
+                yield
+            finally:
+                self._depth[project] -= 1
+
+                if self._depth[project] == 0:
+                    # closing the file releases the flock
+                    self._files.pop(project).close()
+                    del self._depth[project]
+
+    @contextlib.contextmanager
+    def try_exclusive(self, name: str) -> t.Iterator[bool]:
+        """
+        Take a lock shared by all the server processes without waiting, e.g. for a background task.
+
+        Args:
+            name (str): name of the lock file, e.g. `.pruner.lock`.
+
+        Yields:
+            bool: True if the lock is held, False if another process holds it.
+
+        Example:
+            with project_locks.try_exclusive(".pruner.lock") as acquired:
+                if acquired:
+                    ...  # run the task
+        """
+        lock_dir = config.docfiles_dir.joinpath(self.LOCK_DIR)
+        lock_dir.mkdir(exist_ok=True)
+
+        with open(lock_dir.joinpath(name), "a+b") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+
+            yield True
+
+
+project_locks = ProjectLocks()
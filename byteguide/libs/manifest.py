@@ -0,0 +1,204 @@
+""" Per-version manifests of the uploaded files. """
+
+import json
+import os
+import typing as t
+import uuid
+import zipfile
+from pathlib import Path
+
+from byteguide.config import config
+from byteguide.libs.blobstore import HASH_ALGORITHM, hash_file, new_hash
+from byteguide.libs.compress import ENCODINGS
+from byteguide.libs.extract import CHUNK_SIZE, ExtractedFile, plan_zip
+
+COLUMNS = ("path", "size", "mtime", "digest")
+
+
+class ManifestStore:
+    """
+    Keeps a manifest of every uploaded version: path, size, modification time and content hash of each file.
+
+    Manifests are built from the files written by the extraction, no tree is walked, and
+    stored as `docfiles_dir/<project>/.manifests/<version>.json`. Files are listed as
+    `[path, size, mtime, digest]` rows (see `COLUMNS`), sorted by path.
+    """
+
+    MANIFEST_DIR = ".manifests"
+
+    @staticmethod
+    def path(project: str, version: str) -> Path:
+        """
+        Get the manifest file of a version.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+
+        Returns:
+            Path: manifest file.
+        """
+        return config.docfiles_dir.joinpath(project, ManifestStore.MANIFEST_DIR, f"{version}.json")
+
+    @staticmethod
+    def build(version: str, files: t.Iterable[ExtractedFile]) -> t.Dict[str, t.Any]:
+        """
+        Build the manifest of a version.
+
+        Args:
+            version (str): version.
+            files (t.Iterable[ExtractedFile]): files of the version, as returned by the extraction.
+
+        Returns:
+            t.Dict[str, t.Any]: manifest.
+        """
+        entries = sorted([file.path, file.size, file.mtime, file.digest] for file in files)
+
+        return {
+            "version": version,
+            "algorithm": HASH_ALGORITHM,
+            "files": len(entries),
+            "size": sum(entry[1] for entry in entries),
+            "columns": list(COLUMNS),
+            "entries": entries,
+        }
+
+    def scan(self, project: str, version: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """
+        Build the manifest of a version uploaded before manifests were recorded, by walking its tree.
+
+        Precompressed variants are left out, like for an upload.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+
+        Returns:
+            t.Optional[t.Dict[str, t.Any]]: manifest, None if the version does not exist.
+        """
+        root = config.docfiles_dir.joinpath(project, version)
+
+        if not root.is_dir():
+            return None
+
+        variants = {suffix for _, suffix in ENCODINGS}
+        files = []
+
+        for path in root.rglob("*"):
+            if not path.is_file() or (path.suffix in variants and path.with_suffix("").is_file()):
+                continue
+
+            stat = path.stat()
+            files.append(
+                ExtractedFile(path.relative_to(root).as_posix(), stat.st_size, int(stat.st_mtime), hash_file(path))
+            )
+
+        return self.build(version, files)
+
+    def save(self, project: str, manifest: t.Dict[str, t.Any]) -> None:
+        """
+        Store the manifest of a version, replacing the previous one atomically.
+
+        Args:
+            project (str): project name.
+            manifest (t.Dict[str, t.Any]): manifest, see `build`.
+        """
+        path = self.path(project, manifest["version"])
+        path.parent.mkdir(exist_ok=True)
+
+        temp_path = path.with_name(f".{path.name}-{uuid.uuid4().hex}")
+        temp_path.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+        os.replace(temp_path, path)
+
+    def load(self, project: str, version: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """
+        Get the manifest of a version.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+
+        Returns:
+            t.Optional[t.Dict[str, t.Any]]: manifest, None if the version has none (e.g. uploaded by
+                an older byteguide).
+        """
+        try:
+            return json.loads(self.path(project, version).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def remove(self, project: str, version: str) -> None:
+        """
+        Remove the manifest of a version.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+        """
+        self.path(project, version).unlink(missing_ok=True)
+
+    @staticmethod
+    def _contents(manifest: t.Dict[str, t.Any]) -> t.Dict[str, t.Tuple[int, str]]:
+        return {path: (size, digest) for path, size, _, digest in manifest["entries"]}
+
+    def same_files(self, manifest: t.Dict[str, t.Any], files: t.Iterable[ExtractedFile]) -> bool:
+        """
+        Check if extracted files have the same paths and contents as a manifest, modification times are ignored.
+
+        Args:
+            manifest (t.Dict[str, t.Any]): manifest of the published version.
+            files (t.Iterable[ExtractedFile]): extracted files.
+
+        Returns:
+            bool: True if nothing changed.
+        """
+        return manifest.get("algorithm") == HASH_ALGORITHM and self._contents(manifest) == {
+            file.path: (file.size, file.digest) for file in files
+        }
+
+    def matches_zip(self, project: str, version: str, archive: zipfile.ZipFile) -> bool:
+        """
+        Check if a zip archive contains exactly the files of a published version, without extracting it.
+
+        Paths and sizes are compared first, members are only hashed if all of them match.
+
+        Args:
+            project (str): project name.
+            version (str): published version.
+            archive (zipfile.ZipFile): uploaded archive.
+
+        Returns:
+            bool: True if uploading the archive would not change the version.
+        """
+        manifest = self.load(project, version)
+
+        if manifest is None or manifest.get("algorithm") != HASH_ALGORITHM:
+            return False
+
+        expected = self._contents(manifest)
+        files, _ = plan_zip(archive)
+        infolist = archive.infolist()
+
+        if len(files) != len(expected):
+            return False
+
+        for index, rel_path in files:
+            known = expected.get(rel_path.as_posix())
+
+            if known is None or known[0] != infolist[index].file_size:
+                return False
+
+        for index, rel_path in files:
+            digest = new_hash()
+
+            with archive.open(infolist[index]) as source:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):  # pylint: disable=cell-var-from-loop
+                    digest.update(chunk)
+
+            if digest.hexdigest() != expected[rel_path.as_posix()][1]:
+                return False
+
+        return True
+
+
+manifest_store = ManifestStore()
@@ -0,0 +1,366 @@
+""" Storage backends for project metadata. """
+
+import abc
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import typing as t
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import natsort
+from loguru import logger as log
+
+from byteguide.config import config
+
+# changes whenever the stored metadata of a project changes
+Stamp = t.Tuple[int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    lang TEXT,
+    document TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS projects_lang ON projects (lang);
+CREATE TABLE IF NOT EXISTS tags (
+    project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (project, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+CREATE TABLE IF NOT EXISTS versions (
+    project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+    version TEXT NOT NULL,
+    upload_date TEXT NOT NULL,
+    PRIMARY KEY (project, version)
+);
+"""
+
+
+class MetadataBackend(abc.ABC):
+    """
+    Base class of the metadata storage backends.
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    def load(self, project: str) -> t.Dict:
+        """
+        Load the metadata of a project.
+
+        Args:
+            project (str): project name.
+
+        Returns:
+            t.Dict: project metadata, empty if the project has none.
+        """
+
+    @abc.abstractmethod
+    def store(self, project: str, metadata: t.Dict) -> None:
+        """
+        Store the metadata of a project, replacing the existing one.
+
+        Args:
+            project (str): project name.
+            metadata (t.Dict): project metadata.
+        """
+
+    @abc.abstractmethod
+    def exists(self, project: str) -> bool:
+        """
+        Check if a project has metadata.
+
+        Args:
+            project (str): project name.
+
+        Returns:
+            bool: True if the project has metadata.
+        """
+
+    @abc.abstractmethod
+    def stamp(self, project: str) -> t.Optional[Stamp]:
+        """
+        Get a value which changes whenever the metadata of a project changes.
+
+        Args:
+            project (str): project name.
+
+        Returns:
+            t.Optional[Stamp]: stamp of the metadata, None if the project has none.
+        """
+
+    @abc.abstractmethod
+    def list_projects(self) -> t.List[str]:
+        """
+        List the projects which have metadata.
+
+        Returns:
+            t.List[str]: project names.
+        """
+
+    def find(self, lang: t.Optional[str] = None, tag: t.Optional[str] = None) -> t.Optional[t.List[str]]:
+        """
+        Find the projects matching all the given filters with the indexes of the backend.
+
+        Args:
+            lang (t.Optional[str], optional): programming language. Defaults to None.
+            tag (t.Optional[str], optional): project tag. Defaults to None.
+
+        Returns:
+            t.Optional[t.List[str]]: matching project names, None if the backend has no indexes
+                and the caller must filter the loaded metadata itself.
+        """
+        # pylint: disable=unused-argument
+        return None
+
+
+class JsonMetadataBackend(MetadataBackend):
+    """
+    Stores the metadata as `metadata.json` in each project directory.
+    """
+
+    name = "json"
+    FILE_NAME = "metadata.json"
+
+    def path(self, project: str) -> Path:
+        """
+        Get the metadata file of a project.
+
+        Args:
+            project (str): project name.
+
+        Returns:
+            Path: path of `metadata.json`.
+        """
+        return config.docfiles_dir.joinpath(project, self.FILE_NAME)
+
+    def load(self, project: str) -> t.Dict:
+        metadata_file = self.path(project)
+
+        log.info(f"reading {metadata_file}...")
+
+        if metadata_file.exists():
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def store(self, project: str, metadata: t.Dict) -> None:
+        # write to a temporary file and rename it, readers never see a partially written file
+        metadata_file = self.path(project)
+        temp_file = metadata_file.with_name(f".{self.FILE_NAME}.{uuid.uuid4().hex}")
+
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(temp_file, metadata_file)
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+
+    def exists(self, project: str) -> bool:
+        return self.path(project).exists()
+
+    def stamp(self, project: str) -> t.Optional[Stamp]:
+        try:
+            stat = self.path(project).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def list_projects(self) -> t.List[str]:
+        return sorted(path.parent.name for path in config.docfiles_dir.glob(f"*/{self.FILE_NAME}"))
+
+
+class SqliteMetadataBackend(MetadataBackend):
+    """
+    Stores the metadata in an SQLite database (`.metadata.db` in `docfiles_dir`) in WAL mode.
+
+    The metadata document is kept as JSON, while the language, tags and versions are
+    stored in indexed columns/tables so version lookups and the lang/tag filters of
+    `ProjectCatalog.find` are indexed queries. Several processes can read and write concurrently.
+    """
+
+    name = "sqlite"
+    DB_NAME = ".metadata.db"
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current thread, sqlite connections can not be shared between threads.
+
+        Returns:
+            sqlite3.Connection: connection to the metadata database.
+        """
+        db_path = config.docfiles_dir.joinpath(self.DB_NAME)
+
+        if getattr(self._local, "path", None) != db_path:
+            conn = sqlite3.connect(db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(SCHEMA)
+
+            self._local.conn = conn
+            self._local.path = db_path
+
+        return self._local.conn
+
+    def load(self, project: str) -> t.Dict:
+        conn = self._connect()
+        row = conn.execute("SELECT document FROM projects WHERE name = ?", (project,)).fetchone()
+
+        if row is None:
+            return {}
+
+        metadata = json.loads(row[0])
+        versions = dict(conn.execute("SELECT version, upload_date FROM versions WHERE project = ?", (project,)))
+
+        if versions or "versions" in metadata:
+            metadata["versions"] = OrderedDict(
+                (version, {"upload-date": versions[version]}) for version in natsort.natsorted(versions, reverse=True)
+            )
+
+        return metadata
+
+    def store(self, project: str, metadata: t.Dict) -> None:
+        document = {key: value for key, value in metadata.items() if key != "versions"}
+        if "versions" in metadata:
+            document["versions"] = {}  # versions live in their own table, keep the key
+
+        conn = self._connect()
+
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO projects (name, lang, document) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    lang = excluded.lang, document = excluded.document, revision = revision + 1
+                """,
+                (
+                    project,
+                    str(metadata.get("programming-lang", "")).lower(),
+                    json.dumps(document),
+                ),
+            )
+
+            conn.execute("DELETE FROM tags WHERE project = ?", (project,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO tags (project, tag) VALUES (?, ?)",
+                [(project, tag.lower()) for tag in metadata.get("tags", [])],
+            )
+
+            conn.execute("DELETE FROM versions WHERE project = ?", (project,))
+            conn.executemany(
+                "INSERT INTO versions (project, version, upload_date) VALUES (?, ?, ?)",
+                [(project, version, meta["upload-date"]) for version, meta in metadata.get("versions", {}).items()],
+            )
+
+    def exists(self, project: str) -> bool:
+        return self._connect().execute("SELECT 1 FROM projects WHERE name = ?", (project,)).fetchone() is not None
+
+    def stamp(self, project: str) -> t.Optional[Stamp]:
+        row = self._connect().execute("SELECT revision FROM projects WHERE name = ?", (project,)).fetchone()
+        return None if row is None else (row[0], 0)
+
+    def list_projects(self) -> t.List[str]:
+        return [name for (name,) in self._connect().execute("SELECT name FROM projects ORDER BY name")]
+
+    def find(self, lang: t.Optional[str] = None, tag: t.Optional[str] = None) -> t.Optional[t.List[str]]:
+        query = "SELECT name FROM projects WHERE 1 = 1"
+        args: t.List[str] = []
+
+        if lang:
+            query += " AND lang = ?"
+            args.append(lang.lower())
+
+        if tag:
+            query += " AND name IN (SELECT project FROM tags WHERE tag = ?)"
+            args.append(tag.lower())
+
+        return [name for (name,) in self._connect().execute(query + " ORDER BY name", args)]
+
+
+BACKENDS: t.Dict[str, MetadataBackend] = {
+    backend.name: backend for backend in (JsonMetadataBackend(), SqliteMetadataBackend())
+}
+
+
+def get_metadata_backend() -> MetadataBackend:
+    """
+    Get the backend selected by the `metadata_backend` config option.
+
+    Returns:
+        MetadataBackend: metadata backend.
+    """
+    return BACKENDS[config.metadata_backend]
+
+
+def copy_metadata(source: MetadataBackend, target: MetadataBackend) -> int:
+    """
+    Copy the metadata of all the projects between two backends.
+
+    Args:
+        source (MetadataBackend): backend to read from.
+        target (MetadataBackend): backend to write to.
+
+    Returns:
+        int: number of copied projects.
+    """
+    projects = source.list_projects()
+
+    for project in projects:
+        target.store(project, source.load(project))
+
+    log.info(f"copied metadata of {len(projects)} projects from {source.name} to {target.name}")
+    return len(projects)
+
+
+def migrate_json_to_sqlite() -> int:
+    """
+    One-shot migration of the existing `metadata.json` files into the SQLite backend.
+
+    Returns:
+        int: number of migrated projects.
+    """
+    return copy_metadata(BACKENDS["json"], BACKENDS["sqlite"])
+
+
+def export_sqlite_to_json() -> int:
+    """
+    Export the SQLite backend back to `metadata.json` files.
+
+    Returns:
+        int: number of exported projects.
+    """
+    return copy_metadata(BACKENDS["sqlite"], BACKENDS["json"])
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    """
+    Command line entry point, e.g. `python -m byteguide.libs.metastore migrate`.
+
+    Args:
+        argv (t.Optional[t.List[str]], optional): command line arguments. Defaults to None.
+    """
+    parser = argparse.ArgumentParser(description="Move byteguide project metadata between backends.")
+    parser.add_argument("action", choices=["migrate", "export"], help="migrate: json -> sqlite, export: sqlite -> json")
+    args = parser.parse_args(argv)
+
+    if args.action == "migrate":
+        migrate_json_to_sqlite()
+    else:
+        export_sqlite_to_json()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+""" Instrumentation of byteguide, exported in the Prometheus text format. """
+
+import abc
+import bisect
+import threading
+import time
+import typing as t
+
+from flask import Flask, g, request
+
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.page_cache import page_cache
+
+# label values in the order of the label names of a metric
+LabelValues = t.Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: t.Sequence[str], values: t.Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """
+    Base class of the metrics.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: t.Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> t.Iterator[str]:
+        """
+        Get the sample lines of the metric.
+
+        Returns:
+            t.Iterator[str]: sample lines.
+        """
+
+    def render(self) -> str:
+        """
+        Get the metric in the Prometheus text format.
+
+        Returns:
+            str: HELP, TYPE and sample lines.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: t.Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Increment the counter.
+
+        Args:
+            amount (float, optional): increment. Defaults to 1.
+            labels (str): label values.
+        """
+        key = self._label_values(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> t.Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, in cumulative buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: count of each bucket (not cumulative, the last one is +Inf), sum
+        self._values: t.Dict[LabelValues, t.Tuple[t.List[int], t.List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record an observation.
+
+        Args:
+            value (float): observed value, e.g. a duration in seconds.
+            labels (str): label values.
+        """
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+
+            counts, total = self._values[key]
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> t.Iterator[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+
+        for key, counts, total in values:
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Callback(Metric):
+    """
+    Value computed when the metrics are collected, e.g. the size of the catalog.
+    """
+
+    def __init__(self, name: str, documentation: str, func: t.Callable[[], float], kind: str = "gauge") -> None:
+        super().__init__(name, documentation)
+        self.func = func
+        self.kind = kind
+
+    def samples(self) -> t.Iterator[str]:
+        yield f"{self.name} {_format_value(self.func())}"
+
+
+M = t.TypeVar("M", bound=Metric)
+
+
+class Registry:
+    """
+    Collection of the metrics exported by the process.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: t.Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """
+        Add a metric to the registry.
+
+        Args:
+            metric (M): metric to add.
+
+        Returns:
+            M: the added metric.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Get all the metrics in the Prometheus text format.
+
+        Returns:
+            str: metrics exposition.
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class StageTimer:
+    """
+    Progress callback timing the stages of an upload, see `Uploader.upload`.
+    """
+
+    def __init__(self, histogram: Histogram, progress: t.Callable[[str], None]) -> None:
+        self.histogram = histogram
+        self.progress = progress
+        self.stage = ""
+        self.started = 0.0
+
+    def __call__(self, stage: str) -> None:
+        self.finish()
+        self.stage = stage
+        self.started = time.perf_counter()
+        self.progress(stage)
+
+    def finish(self) -> None:
+        """
+        Record the duration of the current stage.
+        """
+        if self.stage:
+            self.histogram.observe(time.perf_counter() - self.started, stage=self.stage)
+            self.stage = ""
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(
+    Histogram(
+        "byteguide_request_duration_seconds",
+        "Time spent handling requests.",
+        labelnames=("blueprint", "endpoint", "method", "status"),
+    )
+)
+UPLOAD_STAGE_DURATION = registry.register(
+    Histogram(
+        "byteguide_upload_stage_duration_seconds",
+        "Time spent in each stage of an upload.",
+        labelnames=("stage",),
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+    )
+)
+UPLOADS = registry.register(Counter("byteguide_uploads_total", "Uploads by status.", labelnames=("status",)))
+EXTRACTED_FILES = registry.register(Counter("byteguide_extracted_files_total", "Files extracted from uploads."))
+EXTRACTED_BYTES = registry.register(Counter("byteguide_extracted_bytes_total", "Bytes extracted from uploads."))
+EXTRACT_THROUGHPUT = registry.register(
+    Histogram(
+        "byteguide_extract_throughput_bytes_per_second",
+        "Extraction throughput of each uploaded archive.",
+        labelnames=("format",),
+        buckets=(1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9),
+    )
+)
+
+registry.register(
+    Callback("byteguide_catalog_projects", "Projects in the catalog.", lambda: len(project_catalog.projects()))
+)
+registry.register(
+    Callback(
+        "byteguide_catalog_versions",
+        "Versions of all the projects in the catalog.",
+        lambda: sum(len(entry.versions) for entry in project_catalog.projects()),
+    )
+)
+registry.register(
+    Callback("byteguide_catalog_generation", "Changes of the catalog.", project_catalog.current_generation)
+)
+registry.register(
+    Callback("byteguide_page_cache_hits_total", "Page cache hits.", lambda: page_cache.hits, kind="counter")
+)
+registry.register(
+    Callback("byteguide_page_cache_misses_total", "Page cache misses.", lambda: page_cache.misses, kind="counter")
+)
+registry.register(
+    Callback("byteguide_page_cache_bytes", "Size of the cached pages.", lambda: page_cache.stats()["bytes"])
+)
+
+
+def register_request_metrics(app: Flask) -> None:
+    """
+    Time every request of the app.
+
+    Args:
+        app (Flask): byteguide app.
+    """
+
+    @app.before_request
+    def start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_status(response):
+        g.response_status = response.status_code
+        return response
+
+    # teardown also runs when the request ends in an unhandled exception, after_request may not
+    @app.teardown_request
+    def record_duration(exc) -> None:  # pylint: disable=unused-argument
+        started = g.pop("request_started", None)
+
+        if started is not None:
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                blueprint=request.blueprint or "app",
+                endpoint=request.endpoint or "none",
+                method=request.method,
+                status=str(g.pop("response_status", 500)),
+            )
@@ -0,0 +1,136 @@
+""" Cache of rendered pages. """
+
+import functools
+import threading
+import typing as t
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+from byteguide.config import config
+from byteguide.libs.catalog import project_catalog
+
+CacheKey = t.Tuple[str, t.Tuple[t.Tuple[str, str], ...]]
+
+
+class PageCache:
+    """
+    Size-bounded LRU cache of rendered responses, keyed by request path and normalized query args.
+
+    Entries are tagged with the catalog generation they were rendered for. Registering,
+    uploading or deleting (in this or another process) bumps the generation, which
+    invalidates every entry rendered before.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, t.Tuple[int, Response]]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key() -> CacheKey:
+        args = tuple(sorted(request.args.items(multi=True)))
+        return request.path, args
+
+    def _get(self, key: CacheKey, generation: int) -> t.Optional[Response]:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key: CacheKey, generation: int, response: Response) -> None:
+        size = response.content_length or 0
+
+        if size > config.page_cache_max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1].content_length or 0
+
+            self._entries[key] = (generation, response)
+            self._size += size
+
+            while self._size > config.page_cache_max_bytes or len(self._entries) > config.page_cache_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted.content_length or 0
+                self.evictions += 1
+
+    def cached(self, view: t.Callable) -> t.Callable:
+        """
+        Decorate a view to serve its responses from the cache.
+
+        Only successful responses are cached.
+
+        Args:
+            view (t.Callable): view function.
+
+        Returns:
+            t.Callable: decorated view.
+        """
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not config.page_cache_enabled:
+                return view(*args, **kwargs)
+
+            key = self._key()
+            generation = project_catalog.current_generation()
+            cached = self._get(key, generation)
+
+            if cached is not None:
+                return self._copy(cached, "HIT")
+
+            response = make_response(view(*args, **kwargs))
+
+            if response.status_code == 200 and not response.direct_passthrough:
+                response.freeze()
+                self._put(key, generation, response)
+                return self._copy(response, "MISS")
+
+            return response
+
+        return wrapper
+
+    @staticmethod
+    def _copy(response: Response, status: str) -> Response:
+        copy = Response(response.get_data(), status=response.status, headers=response.headers.copy())
+        copy.headers["X-Cache"] = status
+        return copy
+
+    def clear(self) -> None:
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> t.Dict[str, int]:
+        """
+        Get the cache counters.
+
+        Returns:
+            t.Dict[str, int]: hits, misses, evictions, entries and bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+
+page_cache = PageCache()
@@ -0,0 +1,248 @@
+""" On-demand and sampled profiling of requests. """
+
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import typing as t
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+
+PROFILE_ID = re.compile(r"^\d+-[0-9a-f]{8}$")
+
+
+class RequestProfiler:
+    """
+    Profiles whole requests with cProfile and keeps the results in a bounded ring on disk.
+
+    A request is profiled if it carries the `profile_token` in the `profile_header` header
+    (and comes from one of the `profile_admin_addresses`, if any are set), or if it is sampled
+    (`profile_sample_rate`, 0 to 1). Without a `profile_token` nobody can request profiles.
+    cProfile can not run twice at once, sampled requests are skipped while another one is
+    profiled and requested ones wait for it.
+    The profiler wraps the WSGI app, so routing, views (including `DocsDirScanner`) and
+    template rendering are all captured.
+
+    Every profile is stored as `docfiles_dir/.profiles/<id>.prof` (a `pstats` dump) with
+    the request details in `<id>.json`, only the newest `profile_keep` are kept.
+    """
+
+    PROFILE_DIR = ".profiles"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        """Directory of the stored profiles."""
+        return config.docfiles_dir.joinpath(self.PROFILE_DIR)
+
+    @staticmethod
+    def is_admin(remote_addr: t.Optional[str], token: t.Optional[str]) -> bool:
+        """
+        Check if a client may request profiles.
+
+        Args:
+            remote_addr (t.Optional[str]): client address.
+            token (t.Optional[str]): value of the `profile_header` header.
+
+        Returns:
+            bool: True if the token is the `profile_token` and the address is allowed.
+        """
+        if not config.profile_token or not token or not hmac.compare_digest(token, config.profile_token):
+            return False
+
+        return not config.profile_admin_addresses or remote_addr in config.profile_admin_addresses
+
+    def should_profile(self, environ: t.Dict[str, t.Any]) -> t.Optional[str]:
+        """
+        Decide if a request is profiled.
+
+        Args:
+            environ (t.Dict[str, t.Any]): WSGI environment of the request.
+
+        Returns:
+            t.Optional[str]: reason for profiling ("requested" or "sampled"), None to not profile it.
+        """
+        header = "HTTP_" + config.profile_header.upper().replace("-", "_")
+
+        if environ.get(header) and self.is_admin(environ.get("REMOTE_ADDR"), environ.get(header)):
+            return "requested"
+
+        if config.profile_sample_rate > 0 and random.random() < config.profile_sample_rate:
+            return "sampled"
+
+        return None
+
+    def wrap(self, wsgi_app: t.Callable) -> t.Callable:
+        """
+        Wrap a WSGI app to profile the selected requests.
+
+        Args:
+            wsgi_app (t.Callable): app to wrap, e.g. `app.wsgi_app`.
+
+        Returns:
+            t.Callable: WSGI app.
+        """
+
+        def profiled_app(environ, start_response):
+            reason = self.should_profile(environ)
+
+            # sampled requests are not worth waiting for another profile to finish
+            acquired = reason is not None and self._active.acquire(  # pylint: disable=consider-using-with
+                blocking=reason == "requested"
+            )
+
+            if not acquired:
+                return wsgi_app(environ, start_response)
+
+            try:
+                return self._profile(wsgi_app, environ, start_response, reason)
+            finally:
+                self._active.release()
+
+        return profiled_app
+
+    def _profile(self, wsgi_app: t.Callable, environ: t.Dict[str, t.Any], start_response: t.Callable, reason: str):
+        """
+        Run a request under cProfile and store the profile.
+
+        Args:
+            wsgi_app (t.Callable): wrapped app.
+            environ (t.Dict[str, t.Any]): WSGI environment of the request.
+            start_response (t.Callable): WSGI start_response.
+            reason (str): why the request is profiled.
+
+        Returns:
+            t.List[bytes]: response body.
+        """
+
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status.append(status_line)
+            headers.append(("X-Profile-Id", profile_id))
+            return start_response(status_line, headers, exc_info)
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+
+        def run_request():
+            iterable = wsgi_app(environ, capture_status)
+            try:
+                # materialize the body, so the profile covers generating it
+                return list(iterable)
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+
+        try:
+            body = profile.runcall(run_request)
+        finally:
+            details = {
+                "id": profile_id,
+                "reason": reason,
+                "method": environ.get("REQUEST_METHOD"),
+                "path": environ.get("PATH_INFO"),
+                "query": environ.get("QUERY_STRING"),
+                "status": status[0] if status else None,
+                "duration": round(time.perf_counter() - started, 6),
+                "created": time.time(),
+            }
+            self._store(profile, details)
+
+        return body
+
+    def _store(self, profile: cProfile.Profile, details: t.Dict[str, t.Any]) -> None:
+        """
+        Write a profile and drop the oldest ones beyond `profile_keep`.
+
+        Args:
+            profile (cProfile.Profile): finished profile.
+            details (t.Dict[str, t.Any]): request details.
+        """
+        try:
+            self.root.mkdir(exist_ok=True)
+            profile.dump_stats(self.root.joinpath(f"{details['id']}.prof"))
+            self.root.joinpath(f"{details['id']}.json").write_text(json.dumps(details), encoding="utf-8")
+            self._trim()
+        except Exception as e:  # pylint: disable=broad-except
+            # profiling must never fail the request
+            log.exception(e)
+
+    def _trim(self) -> None:
+        """
+        Keep only the newest `profile_keep` profiles.
+        """
+        with self._lock:
+            profiles = sorted(self.root.glob("*.prof"), key=lambda path: int(path.stem.split("-")[0]))
+
+            for expired in profiles[: max(len(profiles) - config.profile_keep, 0)]:
+                expired.unlink(missing_ok=True)
+                expired.with_suffix(".json").unlink(missing_ok=True)
+
+    def list_profiles(self) -> t.List[t.Dict[str, t.Any]]:
+        """
+        List the stored profiles, newest first.
+
+        Returns:
+            t.List[t.Dict[str, t.Any]]: request details of each profile.
+        """
+        profiles = []
+
+        for details_file in self.root.glob("*.json"):
+            try:
+                profiles.append(json.loads(details_file.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue  # removed by another process while listing
+
+        return sorted(profiles, key=lambda details: details["created"], reverse=True)
+
+    def profile_path(self, profile_id: str) -> t.Optional[Path]:
+        """
+        Get the `pstats` dump of a profile.
+
+        Args:
+            profile_id (str): profile id.
+
+        Returns:
+            t.Optional[Path]: path of the dump, None if there is no such profile.
+        """
+        if not PROFILE_ID.match(profile_id):
+            return None
+
+        path = self.root.joinpath(f"{profile_id}.prof")
+        return path if path.is_file() else None
+
+    @staticmethod
+    def report(path: Path, sort: str = "cumulative", limit: int = 50) -> str:
+        """
+        Format a profile as text.
+
+        Args:
+            path (Path): `pstats` dump.
+            sort (str, optional): sort key. Defaults to "cumulative".
+            limit (int, optional): number of functions. Defaults to 50.
+
+        Returns:
+            str: pstats report.
+        """
+        stream = io.StringIO()
+        stats = pstats.Stats(os.fspath(path), stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+request_profiler = RequestProfiler()
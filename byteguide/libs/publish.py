@@ -0,0 +1,249 @@
+""" Atomic publishing of version directories. """
+
+import ctypes
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+import typing as t
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+def _load_renameat2() -> t.Optional[t.Callable[..., int]]:
+    """
+    Load `renameat2(2)` from libc, it is only available on Linux (glibc >= 2.28).
+
+    Returns:
+        t.Optional[t.Callable[..., int]]: renameat2 function, None if not available.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+
+    return getattr(libc, "renameat2", None)
+
+
+_renameat2 = _load_renameat2()
+
+
+def exchange_paths(src: Path, dst: Path) -> bool:
+    """
+    Atomically exchange two paths.
+
+    Args:
+        src (Path): first path.
+        dst (Path): second path.
+
+    Returns:
+        bool: True if the paths were exchanged, False if the platform does not support it.
+    """
+    if _renameat2 is None:
+        return False
+
+    result = _renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_EXCHANGE)
+    return result == 0
+
+
+class _Collector:
+    """
+    Removes retired directory trees in a background thread.
+    """
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Path]" = queue.Queue()
+        self._thread: t.Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.idle_hooks: t.List[t.Callable[[], t.Any]] = []
+
+    def _run(self) -> None:
+        while True:
+            path = self._queue.get()
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+                log.debug(f"removed {path}")
+
+                if self._queue.empty():
+                    self._run_idle_hooks()
+            finally:
+                self._queue.task_done()
+
+    def _run_idle_hooks(self) -> None:
+        for hook in self.idle_hooks:
+            try:
+                hook()
+            except Exception as e:  # pylint: disable=broad-except
+                log.exception(e)
+
+    def collect(self, path: Path) -> None:
+        """
+        Schedule a directory tree for removal.
+
+        Args:
+            path (Path): directory to remove.
+        """
+        with self._lock:
+            # threads do not survive a fork, (re)start it in the current process
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="byteguide-gc", daemon=True)
+                self._thread.start()
+
+        self._queue.put(path)
+
+    def join(self) -> None:
+        """
+        Wait until all scheduled directories are removed.
+        """
+        self._queue.join()
+
+
+class VersionPublisher:
+    """
+    Publishes version directories with an atomic rename.
+
+    Archives are extracted into a hidden staging directory inside the project
+    directory (i.e. on the same filesystem as the version directory), the staged
+    tree is then swapped in with a single rename and the replaced tree is removed
+    in the background. Readers never see a missing or half written version.
+    """
+
+    STAGING_DIR = ".staging"
+    TRASH_DIR = ".trash"
+    STALE_AFTER_S = 60 * 60
+
+    def __init__(self) -> None:
+        self._collector = _Collector()
+
+    @staticmethod
+    def _unique_name(version: str) -> str:
+        return f"{version}-{uuid.uuid4().hex}"
+
+    def stage(self, projdir: Path, version: str) -> Path:
+        """
+        Create a staging directory for a version.
+
+        Args:
+            projdir (Path): project directory.
+            version (str): version being published.
+
+        Returns:
+            Path: empty staging directory.
+        """
+        staging_root = projdir.joinpath(self.STAGING_DIR)
+        staging_root.mkdir(exist_ok=True)
+        self._sweep(projdir)
+
+        staged = staging_root.joinpath(self._unique_name(version))
+        staged.mkdir()
+
+        return staged
+
+    def publish(self, staged: Path, verdir: Path) -> None:
+        """
+        Swap a staged directory in as the version directory.
+
+        Args:
+            staged (Path): staged directory.
+            verdir (Path): version directory.
+        """
+        if not verdir.exists():
+            os.rename(staged, verdir)
+            return
+
+        if exchange_paths(staged, verdir):
+            # `staged` now points to the previous version tree
+            self._collector.collect(staged)
+            return
+
+        log.warning("atomic exchange is not supported, falling back to two renames")
+        retired = self._move_to_trash(verdir)
+        os.rename(staged, verdir)
+        self._collector.collect(retired)
+
+    def retire(self, path: Path) -> None:
+        """
+        Remove a directory tree, it disappears immediately and is deleted in the background.
+
+        Args:
+            path (Path): directory to remove.
+        """
+        self._collector.collect(self._move_to_trash(path))
+
+    def discard(self, staged: Path) -> None:
+        """
+        Discard a staged directory.
+
+        Args:
+            staged (Path): staged directory.
+        """
+        self._collector.collect(staged)
+
+    def wait(self) -> None:
+        """
+        Wait for background removals to finish.
+        """
+        self._collector.join()
+
+    def on_collected(self, hook: t.Callable[[], t.Any]) -> None:
+        """
+        Register a function to run in the background once all retired trees are removed.
+
+        Args:
+            hook (t.Callable[[], t.Any]): function to run.
+        """
+        self._collector.idle_hooks.append(hook)
+
+    def _move_to_trash(self, path: Path) -> Path:
+        """
+        Move a path into the project trash directory.
+
+        Args:
+            path (Path): path to move, it must be a direct child of a project directory
+                or of its staging directory.
+
+        Returns:
+            Path: new location of the path.
+        """
+        projdir = path.parent.parent if path.parent.name == self.STAGING_DIR else path.parent
+        trash_root = projdir.joinpath(self.TRASH_DIR)
+        trash_root.mkdir(exist_ok=True)
+
+        retired = trash_root.joinpath(self._unique_name(path.name))
+        os.rename(path, retired)
+
+        return retired
+
+    def _sweep(self, projdir: Path) -> None:
+        """
+        Collect leftovers of interrupted uploads.
+
+        Args:
+            projdir (Path): project directory.
+        """
+        now = time.time()
+
+        for root in (self.STAGING_DIR, self.TRASH_DIR):
+            root_dir = projdir.joinpath(root)
+            if not root_dir.is_dir():
+                continue
+
+            for entry in root_dir.iterdir():
+                try:
+                    if now - entry.stat().st_mtime > self.STALE_AFTER_S:
+                        self._collector.collect(entry)
+                except FileNotFoundError:
+                    continue
+
+
+version_publisher = VersionPublisher()
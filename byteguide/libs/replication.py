@@ -0,0 +1,444 @@
+""" Incremental replication of the docs tree to read-only nodes. """
+
+import json
+import os
+import threading
+import typing as t
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+from byteguide.libs.blobstore import HASH_ALGORITHM, blob_store, new_hash
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.compress import precompressor
+from byteguide.libs.delta import CHANGELOG, link_with_variants
+from byteguide.libs.extract import CHUNK_SIZE, safe_member_path
+from byteguide.libs.fs import MetaDataHandler, Uploader
+from byteguide.libs.journal import TOKEN_HEADER, ReplicationJournal
+from byteguide.libs.locks import project_locks
+from byteguide.libs.manifest import manifest_store
+from byteguide.libs.metastore import get_metadata_backend
+from byteguide.libs.publish import version_publisher
+from byteguide.libs.util import Validators
+
+
+class ReplicationError(Exception):
+    """
+    Raised when the writer can not be read or sends inconsistent data.
+    """
+
+
+class Replicator:
+    """
+    Keeps a read-only node in sync with the writer set in `replication_primary`.
+
+    The replica replays the journal of the writer (see `journal`) from the last event it
+    applied, kept in `docfiles_dir/.replication/state.json`; a new replica starts from a
+    snapshot of the whole tree. For each changed version the manifest is fetched and only
+    the files missing locally are downloaded, their size and checksum are verified, and the
+    version is staged and swapped in atomically like an upload. Deleted versions are removed
+    and the metadata of every changed project is copied, without its unique key.
+    """
+
+    STATE_NAME = "state.json"
+    LOCK_NAME = ".replicator.lock"
+
+    def __init__(self) -> None:
+        self._uploader = Uploader()
+        self._thread: t.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def state_path(self) -> Path:
+        """File keeping the position of the replica in the journal of the writer."""
+        return config.docfiles_dir.joinpath(ReplicationJournal.JOURNAL_DIR, self.STATE_NAME)
+
+    def _load_cursor(self) -> t.Optional[int]:
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # replicating another writer, its offsets mean nothing here
+        return state["seq"] if state.get("primary") == config.replication_primary else None
+
+    def _save_cursor(self, seq: int) -> None:
+        self.state_path.parent.mkdir(exist_ok=True)
+
+        temp_path = self.state_path.with_name(f".{self.STATE_NAME}-{uuid.uuid4().hex}")
+        temp_path.write_text(json.dumps({"primary": config.replication_primary, "seq": seq}), encoding="utf-8")
+        os.replace(temp_path, self.state_path)
+
+    def _open(self, path: str) -> t.Any:
+        """
+        Send a GET request to the writer.
+
+        Args:
+            path (str): path of the replication route, e.g. `/replication/snapshot`.
+
+        Returns:
+            t.Any: HTTP response.
+        """
+        request = urllib.request.Request(config.replication_primary.rstrip("/") + path)
+
+        if config.replication_token:
+            request.add_header(TOKEN_HEADER, config.replication_token)
+
+        # closed by the callers, which read the response in a `with` block
+        # pylint: disable-next=consider-using-with
+        return urllib.request.urlopen(request, timeout=config.replication_timeout)
+
+    def _get_json(self, path: str) -> t.Any:
+        with self._open(path) as response:
+            return json.load(response)
+
+    @staticmethod
+    def _quote(*parts: str) -> str:
+        return "/".join(urllib.parse.quote(part) for part in parts)
+
+    @staticmethod
+    def _check_config() -> None:
+        if not config.replication_primary:
+            raise ReplicationError("replication_primary is not set")
+
+        if not config.readonly:
+            raise ReplicationError("only read-only nodes can replicate, their changes would be overwritten")
+
+        if not config.replication_token:
+            raise ReplicationError("replication_token is not set, the writer does not serve replicas without it")
+
+    def sync(self) -> int:
+        """
+        Apply the changes made on the writer since the last sync.
+
+        Returns:
+            int: number of events applied.
+        """
+        self._check_config()
+        seq = self._load_cursor()
+        applied = 0
+
+        if seq is None:
+            snapshot = self._get_json("/replication/snapshot")
+            self._apply(snapshot["events"], full=True)
+            seq = snapshot["seq"]
+            self._save_cursor(seq)
+            applied += len(snapshot["events"])
+
+        while True:
+            try:
+                page = self._get_json(f"/replication/journal?after={seq}&limit={config.replication_batch_size}")
+            except urllib.error.HTTPError as e:
+                if e.code != 400:
+                    raise
+
+                # the journal of the writer was reset, start over from a snapshot
+                log.warning(f"offset {seq} is unknown to {config.replication_primary}, resyncing")
+                self.state_path.unlink(missing_ok=True)
+                return applied + self.sync()
+
+            if not page["events"]:
+                break
+
+            self._apply(page["events"])
+            seq = page["next"]
+            self._save_cursor(seq)
+            applied += len(page["events"])
+
+        if applied:
+            log.info(f"replicated {applied} changes from {config.replication_primary}")
+
+        return applied
+
+    def _apply(self, events: t.Sequence[t.Dict[str, t.Any]], full: bool = False) -> None:
+        """
+        Apply a batch of events, only the last change of each version is applied.
+
+        Args:
+            events (t.Sequence[t.Dict[str, t.Any]]): events, in journal order.
+            full (bool, optional): the events describe the whole tree, local versions missing
+                from them are removed. Defaults to False.
+        """
+        versions: t.Dict[t.Tuple[str, str], str] = {}
+        projects: t.Dict[str, None] = {}
+
+        for event in events:
+            project, version = event["project"], event.get("version")
+
+            if not Validators.is_valid_name(project) or (
+                version is not None and not Validators.is_valid_version(version)
+            ):
+                log.warning(f"skipping invalid replication event {event}")
+                continue
+
+            if version is not None:
+                versions[(project, version)] = event["event"]
+
+            projects[project] = None
+
+        if full:
+            for project in projects:
+                for version in self._local_versions(project):
+                    versions.setdefault((project, version), "delete")
+
+        for (project, version), change in versions.items():
+            if change == "delete":
+                self._uploader.delete(project, version)
+            else:
+                self._pull_version(project, version)
+
+        for project in projects:
+            self._pull_project(project)
+
+    @staticmethod
+    def _local_versions(project: str) -> t.List[str]:
+        return list(get_metadata_backend().load(project).get("versions") or {})
+
+    def _pull_version(self, project: str, version: str) -> None:
+        """
+        Copy a version of the writer, unless the local copy has the same files.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+        """
+        manifest = self._get_manifest(project, version)
+
+        if manifest is None:
+            log.info(f"{project} {version} is gone from the writer, waiting for its delete event")
+            return
+
+        verdir = config.docfiles_dir.joinpath(project, version)
+        local = manifest_store.load(project, version) if verdir.is_dir() else None
+
+        if local is not None and local["entries"] == manifest["entries"]:
+            return
+
+        self._publish_version(project, version, manifest, local)
+
+        log.info(f"replicated {project} {version}, {manifest['files']} files")
+        self._uploader.index_version(project, version)
+
+    def _get_manifest(self, project: str, version: str) -> t.Optional[t.Dict[str, t.Any]]:
+        """
+        Get the manifest of a version from the writer.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+
+        Returns:
+            t.Optional[t.Dict[str, t.Any]]: manifest, None if the writer does not have the version.
+        """
+        try:
+            manifest = self._get_json(f"/replication/projects/{self._quote(project)}/manifests/{self._quote(version)}")
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            return None
+
+        if manifest.get("algorithm") != HASH_ALGORITHM:
+            raise ReplicationError(f"{project} {version} is hashed with {manifest.get('algorithm')}")
+
+        return manifest
+
+    def _publish_version(
+        self, project: str, version: str, manifest: t.Dict[str, t.Any], local: t.Optional[t.Dict[str, t.Any]]
+    ) -> None:
+        """
+        Stage the files of a version and swap it in.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+            manifest (t.Dict[str, t.Any]): manifest of the version on the writer.
+            local (t.Optional[t.Dict[str, t.Any]]): manifest of the local copy of the version, if any.
+        """
+        projdir = config.docfiles_dir.joinpath(project)
+        verdir = projdir.joinpath(version)
+
+        projdir.mkdir(exist_ok=True)
+        staged = version_publisher.stage(projdir, version)
+        # files already on this node are linked instead of downloaded
+        known = {digest: verdir.joinpath(path) for path, _, _, digest in (local or {}).get("entries", [])}
+
+        try:
+            for path, size, mtime, digest in manifest["entries"]:
+                if safe_member_path(path) is None:
+                    raise ReplicationError(f"{project} {version} lists an invalid path {path!r}")
+
+                if path != CHANGELOG:
+                    self._pull_file(project, version, path, size, mtime, digest, staged, known)
+
+            if config.precompress_enabled:
+                precompressor.compress_tree(staged)
+
+            with project_locks.hold(project):
+                version_publisher.publish(staged, verdir)
+                manifest_store.save(project, manifest)
+        except BaseException:
+            version_publisher.discard(staged)
+            raise
+
+    def _pull_file(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        project: str,
+        version: str,
+        path: str,
+        size: int,
+        mtime: int,
+        digest: str,
+        staged: Path,
+        known: t.Mapping[str, Path],
+    ) -> None:
+        """
+        Place a file of a version in its staging directory, downloading it only if its content is not on this node.
+
+        Args:
+            project (str): project name.
+            version (str): version.
+            path (str): path of the file in the version.
+            size (int): size of the file, from the manifest.
+            mtime (int): modification time of the file, from the manifest.
+            digest (str): content hash of the file, from the manifest.
+            staged (Path): staging directory of the version.
+            known (t.Mapping[str, Path]): files of the local copy of the version, by content hash.
+        """
+        target = staged.joinpath(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        blob = blob_store.blob_path(digest)
+        local = known.get(digest)
+
+        if local is not None and local.is_file():
+            link_with_variants(local, target)
+            return
+
+        if config.dedup_enabled and blob.is_file():
+            blob_store.link(blob, target)
+            return
+
+        temp_path = blob_store.temp_file() if config.dedup_enabled else target
+
+        try:
+            received = self._download(
+                f"/replication/projects/{self._quote(project)}/files/{self._quote(version, *path.split('/'))}",
+                temp_path,
+            )
+
+            if temp_path.stat().st_size != size or received != digest:
+                raise ReplicationError(f"{project} {version} {path} does not match its checksum")
+
+            os.utime(temp_path, (mtime, mtime))
+
+            if temp_path != target:
+                blob_store.store(temp_path, digest, target)
+        except BaseException:
+            if temp_path != target:
+                temp_path.unlink(missing_ok=True)
+            raise
+
+    def _download(self, path: str, dest: Path) -> str:
+        """
+        Download a file from the writer, hashing it on the fly.
+
+        Args:
+            path (str): path of the replication route.
+            dest (Path): file to write.
+
+        Returns:
+            str: content hash of the downloaded file.
+        """
+        digest = new_hash()
+
+        with self._open(path) as response, open(dest, "wb") as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+
+        return digest.hexdigest()
+
+    def _pull_project(self, project: str) -> None:
+        """
+        Copy the metadata and changelog of a project, and point `latest` to its latest version.
+
+        Args:
+            project (str): project name.
+        """
+        try:
+            metadata = self._get_json(f"/replication/projects/{self._quote(project)}/metadata")
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            return
+
+        projdir = config.docfiles_dir.joinpath(project)
+        projdir.mkdir(exist_ok=True)
+
+        with project_locks.hold(project):
+            MetaDataHandler(project).save(metadata)
+            self._pull_changelog(project, projdir.joinpath(CHANGELOG))
+            self._uploader.update_latest_symlink(project)
+
+        project_catalog.refresh(project)
+
+    def _pull_changelog(self, project: str, changelog: Path) -> None:
+        temp_path = changelog.with_name(f".{CHANGELOG}-{uuid.uuid4().hex}")
+
+        try:
+            with self._open(f"/replication/projects/{self._quote(project)}/files/{CHANGELOG}") as response:
+                temp_path.write_bytes(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            changelog.unlink(missing_ok=True)
+            return
+
+        os.replace(temp_path, changelog)
+
+    def _sync_exclusively(self) -> None:
+        """
+        Sync unless another process is already syncing.
+        """
+        with project_locks.try_exclusive(self.LOCK_NAME) as acquired:
+            if acquired:
+                self.sync()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self._sync_exclusively()
+            except Exception as e:  # pylint: disable=broad-except
+                log.warning(f"replication from {config.replication_primary} failed: {e}")
+
+            if self._stop.wait(config.replication_interval):
+                return
+
+    def start(self) -> None:
+        """
+        Sync from the writer every `replication_interval` seconds, in the current process.
+        """
+        if not config.replication_primary or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        if not config.readonly:
+            log.warning("replication_primary is ignored, only read-only nodes replicate")
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="byteguide-replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background sync.
+        """
+        self._stop.set()
+
+
+replicator = Replicator()
@@ -0,0 +1,196 @@
+""" Retention policies for uploaded versions. """
+
+import datetime as dt
+import threading
+import typing as t
+
+import natsort
+from loguru import logger as log
+
+from byteguide.config import config
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.fs import Uploader
+from byteguide.libs.locks import project_locks
+
+
+class RetentionPolicy(t.NamedTuple):
+    """
+    Which versions of a project are kept, a version is kept if any of the rules keeps it.
+
+    The latest version is always kept. A policy without `keep_latest_n` and `keep_days`
+    keeps every version.
+    """
+
+    keep_latest_n: int  # 0 to disable the rule
+    keep_days: int  # 0 to disable the rule
+    pinned: t.FrozenSet[str]
+
+    @classmethod
+    def for_project(cls, metadata: t.Mapping[str, t.Any]) -> "RetentionPolicy":
+        """
+        Get the policy of a project, its metadata overrides the global `retention_*` options.
+
+        Args:
+            metadata (t.Mapping[str, t.Any]): project metadata.
+
+        Returns:
+            RetentionPolicy: policy of the project.
+        """
+        return cls(
+            keep_latest_n=int(metadata.get("keep-latest-n", config.retention_keep_latest_n) or 0),
+            keep_days=int(metadata.get("keep-days", config.retention_keep_days) or 0),
+            # metadata registered before the versions were validated may hold anything
+            pinned=frozenset(version for version in metadata.get("pinned-versions") or [] if isinstance(version, str)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """True if the policy removes anything at all."""
+        return bool(self.keep_latest_n or self.keep_days)
+
+    def expired(self, versions: t.Sequence[t.Tuple[str, str]], today: dt.date) -> t.List[str]:
+        """
+        Select the versions the policy removes.
+
+        Args:
+            versions (t.Sequence[t.Tuple[str, str]]): (version, upload date) pairs, dates as `YYYY-MM-DD`.
+            today (dt.date): reference date of `keep_days`.
+
+        Returns:
+            t.List[str]: versions to remove, oldest first.
+        """
+        if not self.enabled or not versions:
+            return []
+
+        latest_first = natsort.natsorted(versions, key=lambda version: version[0], reverse=True)
+        expired = []
+
+        for index, (version, upload_date) in enumerate(latest_first):
+            if index == 0 or version in self.pinned:
+                continue
+
+            if self.keep_latest_n and index < self.keep_latest_n:
+                continue
+
+            if self.keep_days and (today - dt.date.fromisoformat(upload_date)).days < self.keep_days:
+                continue
+
+            expired.append(version)
+
+        return expired[::-1]
+
+
+class Pruner:
+    """
+    Removes the versions expired by the retention policies, in a background thread.
+
+    Only one server process prunes at a time, the others skip the round. Versions are
+    removed with `Uploader.delete`, which updates the metadata and the `latest` link.
+    """
+
+    LOCK_NAME = ".pruner.lock"
+
+    def __init__(self) -> None:
+        self._uploader = Uploader()
+        self._thread: t.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def plan(self, project: t.Optional[str] = None) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """
+        Report what the retention policies would remove, without removing anything.
+
+        Args:
+            project (t.Optional[str], optional): report a single project. Defaults to None, for all.
+
+        Returns:
+            t.Dict[str, t.Dict[str, t.Any]]: per project, its policy and the versions to remove and keep.
+        """
+        today = dt.date.today()
+        report = {}
+
+        for entry in project_catalog.projects():
+            name = entry.path.name
+
+            if project is not None and name != project:
+                continue
+
+            policy = RetentionPolicy.for_project(entry.metadata)
+            expired = policy.expired(entry.versions, today)
+
+            report[name] = {
+                "policy": {
+                    "keep-latest-n": policy.keep_latest_n,
+                    "keep-days": policy.keep_days,
+                    "pinned-versions": sorted(policy.pinned),
+                },
+                "delete": expired,
+                "keep": [version for version, _ in entry.versions if version not in expired],
+            }
+
+        return report
+
+    def prune(self, dry_run: bool = False) -> t.Dict[str, t.List[str]]:
+        """
+        Remove the expired versions of all the projects.
+
+        Args:
+            dry_run (bool, optional): only report the versions. Defaults to False.
+
+        Returns:
+            t.Dict[str, t.List[str]]: removed (or, for a dry run, expired) versions per project.
+        """
+        expired = {name: details["delete"] for name, details in self.plan().items() if details["delete"]}
+
+        if dry_run or config.readonly:
+            return expired
+
+        removed: t.Dict[str, t.List[str]] = {}
+
+        for name, versions in expired.items():
+            for version in versions:
+                deleted, message = self._uploader.delete(name, version)
+
+                if deleted:
+                    removed.setdefault(name, []).append(version)
+                else:
+                    log.warning(f"failed to prune {name} {version}: {message}")
+
+        if removed:
+            log.info(f"pruned expired versions {removed}")
+
+        return removed
+
+    def _prune_exclusively(self) -> None:
+        """
+        Prune unless another process is already pruning.
+        """
+        with project_locks.try_exclusive(self.LOCK_NAME) as acquired:
+            if acquired:
+                self.prune()
+
+    def _run(self) -> None:
+        while not self._stop.wait(config.retention_interval):
+            try:
+                self._prune_exclusively()
+            except Exception as e:  # pylint: disable=broad-except
+                log.exception(e)
+
+    def start(self) -> None:
+        """
+        Start pruning every `retention_interval` seconds, in the current process.
+        """
+        if not config.retention_enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="byteguide-pruner", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background pruning.
+        """
+        self._stop.set()
+
+
+pruner = Pruner()
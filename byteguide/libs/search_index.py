@@ -0,0 +1,260 @@
+""" Full-text search over the contents of uploaded documentation. """
+
+import functools
+import re
+import sqlite3
+import threading
+import typing as t
+from html.parser import HTMLParser
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    version TEXT NOT NULL,
+    path TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_proj_ver ON pages (project, version);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(title, body, tokenize = 'porter unicode61');
+"""
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# pages written per transaction, other workers can write to the index in between
+BATCH_PAGES = 200
+WRITE_ATTEMPTS = 3
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Collects the visible text and the title of an HTML page.
+    """
+
+    SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.chunks: t.List[str] = []
+        self._stack: t.List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.VOID_TAGS:
+            self._stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._stack:
+            while self._stack.pop() != tag:
+                pass
+
+    def handle_data(self, data):
+        if not data.strip() or any(tag in self.SKIPPED_TAGS for tag in self._stack):
+            return
+
+        if self._stack and self._stack[-1] == "title":
+            self.title += data.strip()
+        else:
+            self.chunks.append(data)
+
+    @property
+    def text(self) -> str:
+        """Visible text of the page."""
+        return " ".join(" ".join(self.chunks).split())
+
+
+def html_to_text(html: str) -> t.Tuple[str, str]:
+    """
+    Extract the title and the visible text of an HTML page.
+
+    Args:
+        html (str): HTML document.
+
+    Returns:
+        t.Tuple[str, str]: title and text of the page.
+    """
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+
+    return parser.title, parser.text
+
+
+class FullTextIndex:
+    """
+    Inverted index over the text of every uploaded HTML page.
+
+    The index is an SQLite FTS5 table stored as `.search.db` in `docfiles_dir`, so it
+    survives restarts. It is updated one version at a time by the uploader, in short
+    transactions so that several server processes can index at once, and queries are
+    ranked with BM25 (title matches weigh more than body matches).
+    """
+
+    DB_NAME = ".search.db"
+    HTML_SUFFIXES = (".html", ".htm")
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current thread, sqlite connections can not be shared between threads.
+
+        Returns:
+            sqlite3.Connection: connection to the index database.
+        """
+        db_path = config.docfiles_dir.joinpath(self.DB_NAME)
+
+        if getattr(self._local, "path", None) != db_path:
+            conn = sqlite3.connect(db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+            self._local.conn = conn
+            self._local.path = db_path
+
+        return self._local.conn
+
+    def _delete(self, conn: sqlite3.Connection, where: str, args: t.Tuple[t.Any, ...]) -> None:
+        conn.execute(f"DELETE FROM pages_fts WHERE rowid IN (SELECT id FROM pages WHERE {where})", args)
+        conn.execute(f"DELETE FROM pages WHERE {where}", args)
+
+    def _write(self, write: t.Callable[[sqlite3.Connection], t.Any]) -> t.Any:
+        """
+        Run a write in its own transaction, retried if the database stays locked by another process.
+
+        Args:
+            write (t.Callable[[sqlite3.Connection], t.Any]): runs the statements.
+
+        Returns:
+            t.Any: result of `write`.
+        """
+        conn = self._connect()
+
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                with conn:
+                    return write(conn)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == WRITE_ATTEMPTS:
+                    raise
+
+                log.warning(f"search index is locked, retrying ({attempt}/{WRITE_ATTEMPTS})")
+
+        return None
+
+    @staticmethod
+    def _insert(
+        project: str, version: str, pages: t.Sequence[t.Tuple[str, str, str]], conn: sqlite3.Connection
+    ) -> None:
+        for rel_path, title, text in pages:
+            cursor = conn.execute(
+                "INSERT INTO pages (project, version, path, title) VALUES (?, ?, ?, ?)",
+                (project, version, rel_path, title or rel_path),
+            )
+            conn.execute("INSERT INTO pages_fts (rowid, title, body) VALUES (?, ?, ?)", (cursor.lastrowid, title, text))
+
+    def index_version(self, project: str, version: str, verdir: Path) -> int:
+        """
+        (Re)index all the HTML pages of a version.
+
+        Args:
+            project (str): project name.
+            version (str): version name.
+            verdir (Path): version directory.
+
+        Returns:
+            int: number of indexed pages.
+        """
+        # new rows get higher ids (AUTOINCREMENT never reuses the ids of deleted rows),
+        # the previous pages are searchable until the new ones are in
+        last_id = self._write(lambda conn: conn.execute("SELECT COALESCE(MAX(id), 0) FROM pages").fetchone()[0])
+        batch: t.List[t.Tuple[str, str, str]] = []
+        count = 0
+
+        for page in verdir.rglob("*"):
+            if page.suffix.lower() not in self.HTML_SUFFIXES or not page.is_file():
+                continue
+
+            title, text = html_to_text(page.read_text(encoding="utf-8", errors="replace"))
+            batch.append((page.relative_to(verdir).as_posix(), title, text))
+            count += 1
+
+            if len(batch) >= BATCH_PAGES:
+                self._write(functools.partial(self._insert, project, version, batch))
+                batch = []
+
+        if batch:
+            self._write(functools.partial(self._insert, project, version, batch))
+
+        self._write(
+            lambda conn: self._delete(conn, "project = ? AND version = ? AND id <= ?", (project, version, last_id))
+        )
+
+        log.info(f"indexed {count} pages of {project}/{version}")
+        return count
+
+    def delete_version(self, project: str, version: str) -> None:
+        """
+        Remove a version from the index.
+
+        Args:
+            project (str): project name.
+            version (str): version name.
+        """
+        self._write(lambda conn: self._delete(conn, "project = ? AND version = ?", (project, version)))
+
+    @staticmethod
+    def to_match_expr(query: str) -> str:
+        """
+        Convert a user query into an FTS5 match expression, all the words must match.
+
+        Args:
+            query (str): user query.
+
+        Returns:
+            str: match expression, empty if the query does not contain any words.
+        """
+        return " ".join(f'"{token}"' for token in TOKEN_RE.findall(query))
+
+    def search(self, query: str, limit: int = 50) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Search the pages matching the query.
+
+        Args:
+            query (str): words to search for.
+            limit (int, optional): maximum number of hits. Defaults to 50.
+
+        Returns:
+            t.List[t.Dict[str, t.Any]]: hits ordered by relevance.
+        """
+        match_expr = self.to_match_expr(query)
+
+        if not match_expr:
+            return []
+
+        rows = self._connect().execute(
+            """
+            SELECT pages.project, pages.version, pages.path, pages.title,
+                   snippet(pages_fts, 1, '', '', '...', 16), bm25(pages_fts, 10.0, 1.0) AS rank
+            FROM pages_fts JOIN pages ON pages.id = pages_fts.rowid
+            WHERE pages_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match_expr, limit),
+        )
+
+        return [
+            {"project": project, "version": version, "path": path, "title": title, "snippet": snippet, "score": -rank}
+            for project, version, path, title, snippet, rank in rows
+        ]
+
+
+full_text_index = FullTextIndex()
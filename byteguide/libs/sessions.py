@@ -0,0 +1,203 @@
+""" Resumable chunked upload sessions. """
+
+import json
+import os
+import time
+import typing as t
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+
+from byteguide.config import config
+from byteguide.libs.blobstore import hash_file
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SessionError(Exception):
+    """
+    Raised for invalid session operations, carries the HTTP status to answer with.
+    """
+
+    def __init__(self, message: str, status: int, offset: t.Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadSessions:
+    """
+    Assembles large archives from chunks sent in separate requests.
+
+    Each session is a `docfiles_dir/.sessions/<id>.part` file the chunks are appended to,
+    with its details in `<id>.json`. A chunk must start at the current size of the part
+    file, so after a dropped connection the client asks for the offset and resumes from
+    there. Chunks are copied to disk as they arrive, memory use does not depend on the
+    archive or chunk size. Any server process can serve any request of a session. Archives
+    are limited to their declared `size`, or to `max_stream_upload_mb` without one.
+    """
+
+    SESSION_DIR = ".sessions"
+
+    @property
+    def root(self) -> Path:
+        """Directory of the sessions."""
+        return config.docfiles_dir.joinpath(self.SESSION_DIR)
+
+    @staticmethod
+    def max_size() -> int:
+        """Largest archive a session accepts, `max_stream_upload_mb`."""
+        return config.max_stream_upload_mb * 1024 * 1024
+
+    def _paths(self, session_id: str) -> t.Tuple[Path, Path]:
+        if not session_id.isalnum():
+            raise SessionError(f"Session {session_id} not found", 404)
+
+        return self.root.joinpath(f"{session_id}.part"), self.root.joinpath(f"{session_id}.json")
+
+    def create(self, filename: str, uniq_key: str, size: t.Optional[int] = None) -> t.Dict[str, t.Any]:
+        """
+        Start a session.
+
+        Args:
+            filename (str): name of the archive, e.g. `proj_name-version.tar.gz`.
+            uniq_key (str): unique key for the project.
+            size (t.Optional[int], optional): total size of the archive, if known. Defaults to None.
+
+        Returns:
+            t.Dict[str, t.Any]: session details.
+        """
+        self.root.mkdir(exist_ok=True)
+        self._expire()
+
+        session_id = uuid.uuid4().hex
+        session: t.Dict[str, t.Any] = {
+            "session-id": session_id,
+            "filename": filename,
+            "unique-key": uniq_key,
+            "size": size,
+            "created": time.time(),
+        }
+        part, details = self._paths(session_id)
+
+        part.touch()
+        details.write_text(json.dumps(session), encoding="utf-8")
+
+        log.info(f"started upload session {session_id} for {filename}")
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> t.Dict[str, t.Any]:
+        """
+        Get the details of a session, `offset` is the number of bytes received so far.
+
+        Args:
+            session_id (str): id of the session.
+
+        Returns:
+            t.Dict[str, t.Any]: session details.
+        """
+        part, details = self._paths(session_id)
+
+        try:
+            session = json.loads(details.read_text(encoding="utf-8"))
+            session["offset"] = part.stat().st_size
+        except FileNotFoundError as e:
+            raise SessionError(f"Session {session_id} not found", 404) from e
+
+        return session
+
+    def write_chunk(self, session_id: str, offset: int, stream: t.IO[bytes]) -> int:
+        """
+        Append a chunk to a session.
+
+        Args:
+            session_id (str): id of the session.
+            offset (int): position of the chunk in the archive, must be the current offset.
+            stream (t.IO[bytes]): chunk content.
+
+        Returns:
+            int: new offset.
+        """
+        session = self.get(session_id)
+        part, _ = self._paths(session_id)
+
+        with open(part, "r+b") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError as e:
+                    raise SessionError("Another chunk of this session is being written", 409) from e
+
+            current = os.fstat(f.fileno()).st_size
+
+            if offset != current:
+                raise SessionError(f"Chunk starts at {offset}, expected {current}", 409, current)
+
+            f.seek(current)
+            limit = self.max_size() if session["size"] is None else session["size"]
+
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                f.write(chunk)
+
+                if f.tell() > limit:
+                    f.truncate(current)
+                    raise SessionError(f"Chunk exceeds the session size limit of {limit} bytes", 413, current)
+
+            return f.tell()
+
+    def assemble(self, session_id: str, sha256: str) -> t.Tuple[t.Dict[str, t.Any], Path]:
+        """
+        Check that a session is complete and its content matches the checksum.
+
+        Args:
+            session_id (str): id of the session.
+            sha256 (str): expected hex digest of the whole archive.
+
+        Returns:
+            t.Tuple[t.Dict[str, t.Any], Path]: session details and the assembled archive.
+        """
+        session = self.get(session_id)
+        part, _ = self._paths(session_id)
+
+        if session["size"] is not None and session["offset"] != session["size"]:
+            raise SessionError(f"Received {session['offset']} of {session['size']} bytes", 409, session["offset"])
+
+        digest = hash_file(part)
+
+        if digest != sha256.lower():
+            raise SessionError(f"Checksum mismatch, received archive has sha256 {digest}", 422, session["offset"])
+
+        return session, part
+
+    def remove(self, session_id: str) -> None:
+        """
+        Remove a session and its data.
+
+        Args:
+            session_id (str): id of the session.
+        """
+        for path in self._paths(session_id):
+            path.unlink(missing_ok=True)
+
+    def _expire(self) -> None:
+        """
+        Remove the sessions which were not written to for `upload_session_ttl` seconds.
+        """
+        deadline = time.time() - config.upload_session_ttl
+
+        for part in self.root.glob("*.part"):
+            try:
+                if part.stat().st_mtime < deadline:
+                    log.info(f"removing expired upload session {part.stem}")
+                    self.remove(part.stem)
+            except FileNotFoundError:
+                continue
+
+
+upload_sessions = UploadSessions()
@@ -2,27 +2,30 @@
 
 import re
 import typing as t
+from functools import lru_cache
 from pathlib import Path
 
 from loguru import logger as log
+from werkzeug.datastructures.file_storage import FileStorage
 
 from byteguide.libs.dtypes import ProjectEntry
 
 
-def project_sort_key(project: ProjectEntry) -> str:
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> t.Pattern[str]:
     """
-    Get the sort key for a project.
+    Compile a user supplied search pattern, compiled patterns are cached.
 
     Args:
-        project: The project.
+        pattern: The regex pattern.
 
     Returns:
-        The sort key.
+        The compiled pattern.
     """
-    return project.metadata["name"].lower()
+    return re.compile(pattern)
 
 
-def file_from_request(request) -> str:
+def file_from_request(request) -> FileStorage:
     """
     Get the uploaded file from a POST request, which should contain exactly one file.
 
@@ -42,13 +45,32 @@ def file_from_request(request) -> str:
     return uploaded_files[0]
 
 
+def files_from_request(request) -> t.List[FileStorage]:
+    """
+    Get all the uploaded files from a POST request, in the order they were sent.
+
+    Args:
+        request: The POST request.
+
+    Returns:
+        The uploaded files.
+    """
+    uploaded_files = [file for key in request.files for file in request.files.getlist(key)]
+
+    if not uploaded_files:
+        raise ValueError("Request does not contain uploaded file")
+
+    return uploaded_files
+
+
 class Validators:
     """Provides methods for validating input."""
 
     @staticmethod
     def is_valid_version(version: str) -> bool:
         """Check if a version string is valid."""
-        return Validators.is_alphanumeric(version, [".", "-"])
+        # hidden names are reserved for byteguide's own bookkeeping (staging, trash...)
+        return not version.startswith(".") and Validators.is_alphanumeric(version, [".", "-"])
 
     @staticmethod
     def is_valid_name(name: str) -> bool:
@@ -70,7 +92,7 @@ def get_directory_listing(path: t.Union[str, Path]) -> t.List[ProjectEntry]:
         path = Path(path)
 
     for entry in path.iterdir():
-        if entry.is_dir():
+        if entry.is_dir() and not entry.name.startswith("."):
             result.append(ProjectEntry(entry))
 
     return result
@@ -95,4 +117,16 @@ def validate_register_project(data: t.Dict) -> t.List[str]:
     if "tags" in data and not isinstance(data["tags"], list):  # optional
         errors.append("Project 'tags' must be a list!")
 
+    for prop in ("keep-latest-n", "keep-days"):  # optional retention policy
+        if prop in data and (not isinstance(data[prop], int) or isinstance(data[prop], bool) or data[prop] < 0):
+            errors.append(f"Project '{prop}' must be a non-negative integer!")
+
+    if "pinned-versions" in data and (
+        not isinstance(data["pinned-versions"], list)
+        or not all(
+            isinstance(version, str) and Validators.is_valid_version(version) for version in data["pinned-versions"]
+        )
+    ):
+        errors.append("Project 'pinned-versions' must be a list of versions!")
+
     return errors
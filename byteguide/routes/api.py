@@ -0,0 +1,236 @@
+""" JSON API routes for byteguide. """
+import base64
+import binascii
+import functools
+import typing as t
+
+import natsort
+from flask import Blueprint, jsonify, make_response, request
+
+from byteguide.config import config
+from byteguide.libs.fs import docs_dir_scanner
+from byteguide.libs.page_cache import page_cache
+
+api_routes = Blueprint("api", __name__, url_prefix="/api")
+
+FIELDS = ("name", "description", "owner", "owner-email", "programming-lang", "tags", "versions", "latest", "changelog")
+FILTERS = ("lang", "pattern", "tag")
+
+natural_key = natsort.natsort_keygen()
+
+
+class BadRequest(ValueError):
+    """
+    Raised for invalid query parameters.
+    """
+
+
+def conditional(view: t.Callable) -> t.Callable:
+    """
+    Tag the responses of a view with an ETag of their content and answer `If-None-Match` with 304.
+
+    Args:
+        view (t.Callable): view function.
+
+    Returns:
+        t.Callable: decorated view.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BadRequest as e:
+            return jsonify({"error": str(e)}), 400
+
+        if response.status_code == 200:
+            response.add_etag()
+            response.headers["Cache-Control"] = "no-cache"
+            response.make_conditional(request)
+
+        return response
+
+    return wrapper
+
+
+def to_api_project(project: t.Dict[str, t.Any], fields: t.Sequence[str]) -> t.Dict[str, t.Any]:
+    """
+    Convert the template data of a project to its API representation.
+
+    Args:
+        project (t.Dict[str, t.Any]): project as returned by `DocsDirScanner`.
+        fields (t.Sequence[str]): fields to include.
+
+    Returns:
+        t.Dict[str, t.Any]: project document, never includes the upload key.
+    """
+    versions = [{"version": ver, "upload-date": date} for ver, date in project["versions"]]
+
+    document = {key: project.get(key) for key in FIELDS}
+    document["versions"] = versions
+    document["latest"] = versions[-1]["version"] if versions else None
+
+    return {key: document[key] for key in fields}
+
+
+def parse_fields() -> t.Sequence[str]:
+    """
+    Get the fields requested with `fields=name,versions`.
+
+    Returns:
+        t.Sequence[str]: requested fields, all of them if none is requested.
+    """
+    requested = request.args.get("fields")
+
+    if not requested:
+        return FIELDS
+
+    fields = [field.strip() for field in requested.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+
+    if unknown:
+        raise BadRequest(f"unknown fields {unknown}, valid fields are {list(FIELDS)}")
+
+    return fields
+
+
+def parse_limit() -> int:
+    """
+    Get the page size requested with `limit=`.
+
+    Returns:
+        int: page size.
+    """
+    limit = request.args.get("limit", config.api_page_size)
+
+    try:
+        limit = int(limit)
+    except ValueError as e:
+        raise BadRequest(f"invalid limit {limit!r}") from e
+
+    if not 1 <= limit <= config.api_max_page_size:
+        raise BadRequest(f"limit must be between 1 and {config.api_max_page_size}")
+
+    return limit
+
+
+def encode_cursor(name: str) -> str:
+    """
+    Create the cursor pointing after a project.
+
+    Args:
+        name (str): name of the last project of a page.
+
+    Returns:
+        str: opaque cursor.
+    """
+    return base64.urlsafe_b64encode(name.lower().encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    Get the project name a cursor points after.
+
+    Args:
+        cursor (str): cursor returned in `next`.
+
+    Returns:
+        str: lowercase project name.
+    """
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise BadRequest(f"invalid cursor {cursor!r}") from e
+
+
+@api_routes.route("/projects", methods=["GET"])
+@conditional
+@page_cache.cached
+def list_projects():
+    """
+    List the projects, one page at a time, in the order of the browse page.
+
+    Args:
+        lang (str): programming language filter.
+        pattern (str): project name pattern filter.
+        tag (str): project tag filter.
+        fields (str): comma separated fields to return, all by default.
+        limit (int): page size.
+        cursor (str): `next` cursor of the previous page.
+
+    Example:
+        GET /api/projects?limit=20
+        GET /api/projects?lang=python&tag=ml&fields=name,latest
+        GET /api/projects?cursor=cHJvag==
+
+    Returns:
+        A JSON doc with the `projects` of the page and the `next` cursor (null on the last page).
+        Responses carry an ETag, polling with `If-None-Match` returns 304 until something changes.
+    """
+    fields = parse_fields()
+    limit = parse_limit()
+    filters = {key: request.args[key] for key in FILTERS if request.args.get(key)}
+
+    if filters:
+        projects = list(docs_dir_scanner.search_by_filter(**filters).values())
+    else:
+        projects = list(docs_dir_scanner.get_all_projects().values())
+
+    if request.args.get("cursor"):
+        after = natural_key(decode_cursor(request.args["cursor"]))
+        projects = [project for project in projects if natural_key(project["name"].lower()) > after]
+
+    page = projects[:limit]
+    next_cursor = encode_cursor(page[-1]["name"]) if len(projects) > limit else None
+
+    return jsonify({"projects": [to_api_project(project, fields) for project in page], "next": next_cursor})
+
+
+@api_routes.route("/projects/<name>", methods=["GET"])
+@conditional
+@page_cache.cached
+def get_project(name: str):
+    """
+    Get a single project, the name is case-insensitive.
+
+    Args:
+        fields (str): comma separated fields to return, all by default.
+
+    Example:
+        GET /api/projects/Sample-Proj
+        GET /api/projects/sample-proj?fields=latest
+
+    Returns:
+        A JSON doc of the project, 404 if it is not registered.
+    """
+    fields = parse_fields()
+    project = docs_dir_scanner.get_project(name)
+
+    if project is None:
+        return jsonify({"error": f"Project {name} not found"}), 404
+
+    return jsonify(to_api_project(project, fields))
+
+
+@api_routes.route("/projects/<name>/<version>/manifest", methods=["GET"])
+@conditional
+@page_cache.cached
+def get_manifest(name: str, version: str):
+    """
+    Get the files of a version with their size, modification time and content hash.
+
+    Example:
+        GET /api/projects/sample-proj/1.0/manifest
+        GET /api/projects/sample-proj/latest/manifest
+
+    Returns:
+        A JSON doc with the number of `files`, their total `size` and the `entries`, one
+        `[path, size, mtime, digest]` row per file (see `columns`). 404 if the version is
+        unknown or was uploaded before manifests were recorded.
+    """
+    manifest = docs_dir_scanner.get_manifest(name, version)
+
+    if manifest is None:
+        return jsonify({"error": f"No manifest for {name} {version}"}), 404
+
+    return jsonify(manifest)
@@ -1,12 +1,15 @@
 """ Common routes for the byteguide. """
-from flask import Blueprint, current_app, jsonify, render_template
+from flask import Blueprint, Response, current_app, jsonify, render_template
 
 from byteguide.config import get_instance_config
+from byteguide.libs.metrics import registry
+from byteguide.libs.page_cache import page_cache
 
 common_routes = Blueprint("common", __name__, template_folder="templates")
 
 
 @common_routes.route("/", methods=["GET"])
+@page_cache.cached
 def home():
     """Return the landing page."""
     return render_template("landing.html", config=get_instance_config(), show_nav_bar_links=True)
@@ -27,3 +30,14 @@ def url_map():
 def faq():
     """Return a document about how to get started with ByteGuide"""
     return render_template("faq.html", config=get_instance_config(), show_nav_bar_links=True)
+
+
+@common_routes.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Return the metrics of this server process in the Prometheus text format.
+
+    Note:
+        Each gunicorn worker keeps its own metrics, the `pid` target label of the scrape tells them apart.
+    """
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -4,12 +4,15 @@ from pathlib import Path
 from flask import Blueprint, render_template, jsonify, redirect, request
 
 from byteguide.libs.fs import docs_dir_scanner
+from byteguide.libs.page_cache import page_cache
+from byteguide.libs.search_index import full_text_index
 from byteguide.config import config
 
 display_routes = Blueprint("browse", __name__, template_folder="templates", url_prefix="/browse")
 
 
 @display_routes.route("/", methods=["GET"])
+@page_cache.cached
 def browse_all():
     """
     Browse all projects uploaded to byteguide.
@@ -60,13 +63,31 @@ def search():
         GET /browse/search?pattern=python*
         GET /browse/search?lang=java
         GET /browse/search?tag=ml
+        GET /browse/search?lang=python&tag=ml&pattern=core*
+        GET /browse/search?q=connection+pool
 
     Returns:
-        A list of projects matching the search criteria.
+        A list of projects matching the search criteria, or for `q` the ranked
+        list of documentation pages containing all the words of the query.
     """
-    arguments = request.args
-    arguments = dict(arguments)
-    projects = docs_dir_scanner.search_by_filter(**arguments)
+    if "q" in request.args:
+        # not cached: the index is updated after the catalog generation changes, and by other processes
+        return search_text(request.args["q"])
+
+    return search_projects()
+
+
+@page_cache.cached
+def search_projects():
+    """
+    Search for projects by language, tag and name pattern.
+
+    Returns:
+        A list of projects matching the query args.
+    """
+    arguments = dict(request.args)
+    filters = {key: arguments[key] for key in ("lang", "pattern", "tag") if key in arguments}
+    projects = docs_dir_scanner.search_by_filter(**filters)
 
     error = None
     if not projects:
@@ -75,6 +96,28 @@ def search():
     return render_template("browse.html", projects=projects, config=config, error=error, show_search=True)
 
 
+def search_text(query: str):
+    """
+    Full-text search across the contents of all uploaded documentation.
+
+    Args:
+        query (str): words to search for.
+
+    Returns:
+        Ranked list of matching pages with their project and version.
+    """
+    hits = full_text_index.search(query) if config.search_index_enabled else []
+
+    for hit in hits:
+        hit["url"] = "/".join([config.docfiles_link_root, hit["project"], hit["version"], hit["path"]])
+
+    error = None
+    if not hits:
+        error = f"no pages found matching '{query}'"
+
+    return render_template("search_results.html", hits=hits, query=query, config=config, error=error, show_search=True)
+
+
 @display_routes.route("/view/<project>/<version>", methods=["GET"])
 def view(project, version):
     """
@@ -0,0 +1,113 @@
+""" Documentation file serving routes for byteguide. """
+import mimetypes
+import os
+from pathlib import Path
+
+from flask import Blueprint, abort, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from byteguide.config import config
+from byteguide.libs.compress import negotiate
+
+docs_routes = Blueprint("docs", __name__, url_prefix="/docs")
+
+LATEST = "latest"
+
+
+def resolve_version(project: str, version: str) -> str:
+    """
+    Resolve the `latest` alias to the version it points to.
+
+    Args:
+        project (str): name of the project.
+        version (str): version of the project, or `latest`.
+
+    Returns:
+        str: concrete version, the alias itself if it can not be resolved.
+    """
+    if version != LATEST:
+        return version
+
+    try:
+        return os.readlink(config.docfiles_dir.joinpath(project, LATEST))
+    except OSError:
+        return version
+
+
+@docs_routes.route("/<project>/<version>/<path:filename>", methods=["GET"])
+def serve(project: str, version: str, filename: str):
+    """
+    Serve a file of an uploaded documentation version.
+
+    - Precompressed `.br`/`.gz` variants written at upload time are sent instead of
+      the original file when the client accepts them.
+    - Conditional (`If-None-Match`/`If-Modified-Since`) and `Range` requests are handled,
+      the file body is handed to the server's `wsgi.file_wrapper` (sendfile) or to the
+      front proxy with `X-Sendfile` when `docs_x_sendfile` is enabled.
+    - A version can be reuploaded in place, so every response is revalidated once stale: after
+      `docs_version_max_age` for explicit versions, `docs_latest_max_age` for `latest`. The ETag
+      includes the inode, which changes whenever the content of a file is replaced.
+
+    Args:
+        project (str): name of the project.
+        version (str): version of the project, or `latest`.
+        filename (str): path of the file inside the version.
+
+    Example:
+        GET /docs/<project>/<version>/index.html
+    """
+    # hidden paths are byteguide's own bookkeeping (staging, trash...), never serve them
+    if any(part.startswith(".") for part in (project, version, *filename.split("/"))):
+        abort(404)
+
+    # serve `latest` from the version it points to, so both share validators (ETag, Last-Modified)
+    real_version = resolve_version(project, version)
+    path = safe_join(str(config.docfiles_dir), project, real_version, filename)
+
+    if path is None:
+        abort(404)
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    file_path, encoding = negotiate(Path(path), request.accept_encodings)
+
+    if encoding is None and not file_path.is_file():
+        abort(404)
+
+    is_alias = version == LATEST
+    stat = file_path.stat()
+
+    response = send_file(
+        file_path,
+        request.environ,
+        mimetype=mimetype,
+        use_x_sendfile=config.docs_x_sendfile,
+        conditional=True,
+        # mtime and size alone miss reuploads of archives with fixed timestamps (reproducible builds)
+        etag=f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        max_age=config.docs_latest_max_age if is_alias else config.docs_version_max_age,
+    )
+    # pages are displayed, not downloaded
+    response.headers.remove("Content-Disposition")
+    response.vary.add("Accept-Encoding")
+    response.cache_control.must_revalidate = True
+
+    if encoding:
+        response.content_encoding = encoding
+
+    return response
+
+
+@docs_routes.route("/<project>/<version>/", methods=["GET"])
+def serve_index(project: str, version: str):
+    """
+    Serve the root `index.html` of an uploaded documentation version.
+
+    Args:
+        project (str): name of the project.
+        version (str): version of the project, or `latest`.
+
+    Example:
+        GET /docs/<project>/<version>/
+    """
+    return serve(project, version, "index.html")
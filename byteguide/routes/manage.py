@@ -1,11 +1,26 @@
 """ Manage routes for the byteguide. """
+import contextlib
+import json
+import shutil
+import tempfile
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, send_file, url_for
 from loguru import logger as log
+from werkzeug.datastructures import FileStorage
+from werkzeug.wsgi import get_input_stream
 
 from byteguide.config import config
 from byteguide.libs import util
-from byteguide.libs.fs import DocsDirScanner, MetaDataHandler, Uploader
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.delta import Delta
+from byteguide.libs.dtypes import Status
+from byteguide.libs.extract import archive_suffix
+from byteguide.libs.fs import MetaDataHandler, Uploader
+from byteguide.libs.jobs import QueueFullError, upload_jobs
+from byteguide.libs.page_cache import page_cache
+from byteguide.libs.profiler import request_profiler
+from byteguide.libs.retention import pruner
+from byteguide.libs.sessions import SessionError, upload_sessions
 
 manage_routes = Blueprint("manage", __name__, template_folder="templates", url_prefix="/manage")
 
@@ -53,12 +68,8 @@ def register():
     result = {"message": "", "project": register_project["name"], "unique-key": ""}
 
     metadata_handler = MetaDataHandler(proj_name)
-    dir_scan = DocsDirScanner()
 
-    all_projects = dir_scan.get_all_projects()
-    existing_projs = [proj.lower() for proj in all_projects]
-
-    if proj_path.exists() or proj_name.lower() in existing_projs:
+    if proj_path.exists() or project_catalog.lookup(proj_name) is not None:
         proj_json = metadata_handler.read_metadata()
         result["message"] = f"project ['{proj_name.lower()}'] already registered!"
         result["unique-key"] = proj_json["unique-key"]
@@ -88,10 +99,25 @@ def upload():
         http://127.0.0.1:5000/manage/upload
     ```
 
+    Pass `-F async=true` to run the upload in the background, the request returns
+    `202 Accepted` as soon as the archive is stored and the job can be followed at
+    `/manage/jobs/<job-id>`.
+
+    Several versions (of one or more projects) can be uploaded at once, either as
+    several files or as a bundle zip of `proj_name-version.zip` files (`-F bundle=true`).
+    Pass the keys of the projects as a JSON object in `unique-keys`:
+    ```bash
+    $ curl -X POST -F file=@proj-1.0.zip -F file=@proj-1.1.zip -F file=@other-2.0.zip \
+        -F 'unique-keys={"proj": "unique-key", "other": "other-key"}' \
+        http://127.0.0.1:5000/manage/upload
+    ```
+
     Returns:
         A JSON doc with the following keys:
         - `status`: status of the upload
         - `message`: message indicating success or failure of the upload
+        - `job-id`, `job-url`: id and status url of the job (async uploads only)
+        - `results`: `file`, `status` and `message` (or `job-id`) of each version (batch uploads only)
     """
     if config.readonly:
         return jsonify({"status": "failed", "message": "Readonly mode is enabled."}), 403
@@ -103,6 +129,13 @@ def upload():
     reupload = request.form.get("reupload", "false")
 
     reupload = reupload.lower() == "true"
+    run_async = request.form.get("async", "false").lower() == "true"
+
+    if request.form.get("bundle", "false").lower() == "true" or len(util.files_from_request(request)) > 1:
+        return upload_batch(unique_key, reupload, run_async)
+
+    if run_async:
+        return upload_async(unique_key, reupload)
 
     # zip file name should be "proj_name-version.zip"
     try:
@@ -117,6 +150,441 @@ def upload():
     return jsonify(response)
 
 
+def upload_async(unique_key: str, reupload: bool):
+    """
+    Store the uploaded archive and queue its upload.
+
+    Args:
+        unique_key (str): unique key for the project.
+        reupload (bool): reupload version.
+
+    Returns:
+        `202 Accepted` with the job id, or `503` if the upload queue is full.
+    """
+    try:
+        uploaded_file = util.file_from_request(request)
+        job = upload_jobs.submit(uploaded_file, uniq_key=unique_key, reupload=reupload)
+    except QueueFullError as e:
+        return jsonify({"status": "failed", "message": str(e)}), 503
+    except Exception as e:  # pylint: disable=broad-except
+        log.error(e)
+        return jsonify({"status": "failed", "message": str(e)}), 400
+
+    job_url = url_for("manage.job_status", job_id=job.job_id)
+    response = {"status": job.state.value, "message": "", "job-id": job.job_id, "job-url": job_url}
+
+    return jsonify(response), 202, {"Location": job_url}
+
+
+@manage_routes.route("/upload/<filename>", methods=["PUT"])
+def upload_stream(filename: str):
+    """
+    Upload a version archive sent as the raw request body, e.g. with `curl -T`.
+
+    `.tar`, `.tar.gz` and `.tar.zst` archives are extracted while the body arrives, the
+    archive is never stored as a whole, so it may be larger than `max_content_mb`
+    (up to `max_stream_upload_mb`). `.zip` archives need random access and are spooled first.
+
+    Example:
+    ```bash
+    $ curl -T proj_name-1.0.tar.gz -H 'X-Unique-Key: unique-key' \
+        http://127.0.0.1:5000/manage/upload/proj_name-1.0.tar.gz?reupload=true
+    ```
+
+    Returns:
+        A JSON doc with the `status` of the upload and a `message`.
+    """
+    if config.readonly:
+        return jsonify({"status": "failed", "message": "Readonly mode is enabled."}), 403
+
+    unique_key = request.headers.get("X-Unique-Key", "")
+    reupload = request.args.get("reupload", "false").lower() == "true"
+
+    # read the body directly, `request.stream` is capped at `max_content_mb`
+    stream = get_input_stream(request.environ, max_content_length=config.max_stream_upload_mb * 1024 * 1024)
+
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spooled:
+            if archive_suffix(filename) == ".zip":
+                shutil.copyfileobj(stream, spooled)
+                spooled.seek(0)
+                stream = spooled
+
+            uploaded_file = FileStorage(stream=stream, filename=filename)
+            status = uploader.upload(uploaded_file, uniq_key=unique_key, reupload=reupload)
+    except Exception as e:  # pylint: disable=broad-except
+        log.error(e)
+        return jsonify({"status": "failed", "message": str(e)}), 400
+
+    return jsonify({"status": status.value, "message": ""})
+
+
+@manage_routes.route("/upload/delta", methods=["POST"])
+def upload_delta():
+    """
+    Upload only the files which changed since a published version.
+
+    Fetch the manifest of the published version, send an archive of the added and changed
+    files and the JSON list of the `deleted` paths. The other files are taken from the
+    published version (`base`, by default the uploaded version itself) and the result is
+    published atomically.
+
+    Example:
+    ```bash
+    $ curl http://127.0.0.1:5000/api/projects/proj_name/1.0/manifest
+    $ curl -X POST -F file=@proj_name-1.0.zip \
+        -F unique-key=unique-key \
+        -F 'deleted=["old/page.html"]' \
+        http://127.0.0.1:5000/manage/upload/delta
+    ```
+
+    Pass `-F base=1.0` to build another version, e.g. `proj_name-1.1.zip`, from version 1.0.
+
+    Returns:
+        A JSON doc with the `status` of the upload and a `message`.
+    """
+    if config.readonly:
+        return jsonify({"status": "failed", "message": "Readonly mode is enabled."}), 403
+
+    try:
+        deleted = json.loads(request.form.get("deleted", "[]"))
+        if not isinstance(deleted, list) or not all(isinstance(path, str) for path in deleted):
+            raise ValueError("'deleted' must be a JSON list of paths")
+
+        delta = Delta(
+            base=request.form.get("base") or None,
+            deleted=tuple(deleted),
+            reupload=request.form.get("reupload", "false").lower() == "true",
+        )
+        uploaded_file = util.file_from_request(request)
+        status = uploader.upload_delta(uploaded_file, request.form.get("unique-key", ""), delta)
+    except Exception as e:  # pylint: disable=broad-except
+        log.error(e)
+        return jsonify({"status": "failed", "message": str(e)}), 400
+
+    return jsonify({"status": status.value, "message": ""})
+
+
+@manage_routes.route("/upload/session", methods=["POST"])
+def create_upload_session():
+    """
+    Start a resumable upload of a large archive, sent in chunks.
+
+    Example:
+    ```bash
+    $ curl -X POST -H 'Content-Type: application/json' \
+        -d '{"filename": "proj_name-1.0.tar.gz", "unique-key": "unique-key", "size": 734003200}' \
+        http://127.0.0.1:5000/manage/upload/session
+    $ curl -T chunk-0 http://127.0.0.1:5000/manage/upload/session/<session-id>?offset=0
+    $ curl -T chunk-1 http://127.0.0.1:5000/manage/upload/session/<session-id>?offset=104857600
+    ...
+    $ curl -X POST -H 'Content-Type: application/json' -d '{"sha256": "<sha256 of the archive>"}' \
+        http://127.0.0.1:5000/manage/upload/session/<session-id>/commit
+    ```
+
+    If a chunk fails, `GET /manage/upload/session/<session-id>` returns the `offset` to resume from.
+    Sessions not written to for `upload_session_ttl` seconds are removed, archives are limited to
+    `max_stream_upload_mb`.
+
+    Returns:
+        `201 Created` with the `session-id`, `url` and current `offset` of the session.
+    """
+    if config.readonly:
+        return jsonify({"status": "failed", "message": "Readonly mode is enabled."}), 403
+
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get("filename", ""))
+    size = data.get("size")
+
+    if archive_suffix(filename) is None or "-" not in filename:
+        return jsonify({"status": "failed", "message": f"Invalid archive name {filename!r}"}), 400
+
+    if size is not None and (not isinstance(size, int) or size < 0):
+        return jsonify({"status": "failed", "message": "'size' must be a non-negative integer"}), 400
+
+    if size is not None and size > upload_sessions.max_size():
+        return (
+            jsonify({"status": "failed", "message": f"Archives are limited to {config.max_stream_upload_mb} MB"}),
+            413,
+        )
+
+    status = uploader.check_key(filename, str(data.get("unique-key", "")))
+
+    if status != Status.OK:
+        return jsonify({"status": status.value, "message": ""}), 403
+
+    session = upload_sessions.create(filename, data["unique-key"], size)
+    session_url = url_for("manage.upload_session", session_id=session["session-id"])
+
+    return jsonify({**public_session(session), "url": session_url}), 201, {"Location": session_url}
+
+
+def public_session(session: dict) -> dict:
+    """
+    Get the details of a session which can be returned to the client, without the unique key.
+
+    Args:
+        session (dict): session details.
+
+    Returns:
+        dict: session details.
+    """
+    return {key: value for key, value in session.items() if key != "unique-key"}
+
+
+@manage_routes.route("/upload/session/<session_id>", methods=["GET", "PUT", "DELETE"])
+def upload_session(session_id: str):
+    """
+    Get the `offset` of a session (GET), append the chunk sent as the request body at `?offset=` (PUT)
+    or abort the session (DELETE).
+
+    Returns:
+        The session details with the new `offset`, `409` with the expected `offset` if the chunk
+        does not start where the previous one ended.
+    """
+    try:
+        if request.method == "GET":
+            return jsonify(public_session(upload_sessions.get(session_id)))
+
+        if config.readonly:
+            return jsonify({"status": "failed", "message": "Readonly mode is enabled."}), 403
+
+        if request.method == "DELETE":
+            upload_sessions.get(session_id)
+            upload_sessions.remove(session_id)
+            return jsonify({"status": "OK", "message": f"Session {session_id} removed"})
+
+        offset = request.args.get("offset", "")
+        if not offset.isdigit():
+            return jsonify({"status": "failed", "message": "'offset' query argument is required"}), 400
+
+        # chunks are copied to disk as they arrive, the body is never buffered
+        stream = get_input_stream(request.environ, max_content_length=config.max_stream_upload_mb * 1024 * 1024)
+        upload_sessions.write_chunk(session_id, int(offset), stream)
+
+        return jsonify(public_session(upload_sessions.get(session_id)))
+
+    except SessionError as e:
+        return jsonify({"status": "failed", "message": str(e), "offset": e.offset}), e.status
+
+
+@manage_routes.route("/upload/session/<session_id>/commit", methods=["POST"])
+def commit_upload_session(session_id: str):
+    """
+    Verify the assembled archive against its `sha256` and upload it.
+
+    The JSON body may also set `reupload` and `async` like the form fields of `/manage/upload`.
+    The session is kept if the upload does not succeed, so it can be committed again (e.g. with `reupload`).
+
+    Returns:
+        A JSON doc with the `status` of the upload, or the job details for `async` commits.
+    """
+    if config.readonly:
+        return jsonify({"status": "failed", "message": "Readonly mode is enabled."}), 403
+
+    data = request.get_json(silent=True) or {}
+
+    try:
+        session, archive = upload_sessions.assemble(session_id, str(data.get("sha256", "")))
+    except SessionError as e:
+        return jsonify({"status": "failed", "message": str(e), "offset": e.offset}), e.status
+
+    reupload = bool(data.get("reupload"))
+
+    try:
+        if data.get("async"):
+            # the assembled archive is moved to the job queue, not copied
+            job = upload_jobs.submit_file(archive, session["filename"], session["unique-key"], reupload=reupload)
+            upload_sessions.remove(session_id)
+
+            job_url = url_for("manage.job_status", job_id=job.job_id)
+            response = {"status": job.state.value, "message": "", "job-id": job.job_id, "job-url": job_url}
+            return jsonify(response), 202, {"Location": job_url}
+
+        with open(archive, "rb") as stream:
+            uploaded_file = FileStorage(stream=stream, filename=session["filename"])
+            status = uploader.upload(uploaded_file, session["unique-key"], reupload=reupload)
+
+    except QueueFullError as e:
+        return jsonify({"status": "failed", "message": str(e)}), 503
+    except Exception as e:  # pylint: disable=broad-except
+        log.error(e)
+        return jsonify({"status": "failed", "message": str(e)}), 400
+
+    if status.succeeded:
+        upload_sessions.remove(session_id)
+
+    return jsonify({"status": status.value, "message": ""})
+
+
+def upload_batch(unique_key: str, reupload: bool, run_async: bool):
+    """
+    Upload several versions sent as multiple files or as a bundle.
+
+    Args:
+        unique_key (str): unique key of the projects missing from `unique-keys`.
+        reupload (bool): reupload versions.
+        run_async (bool): queue the uploads instead of waiting for them.
+
+    Returns:
+        The status of each version, overall `OK` only if all of them were uploaded.
+    """
+    # the versions of a bundle are spooled to temporary files, closed once they are uploaded or queued
+    with contextlib.ExitStack() as stack:
+        try:
+            uniq_keys = json.loads(request.form.get("unique-keys", "{}"))
+            if not isinstance(uniq_keys, dict):
+                raise ValueError("'unique-keys' must be a JSON object of project name to unique key")
+
+            files = util.files_from_request(request)
+            if request.form.get("bundle", "false").lower() == "true":
+                files = [file for bundle in files for file in uploader.expand_bundle(bundle)]
+                for file in files:
+                    stack.callback(file.close)
+
+            if len(files) > config.batch_max_items:
+                raise ValueError(f"At most {config.batch_max_items} versions can be uploaded at once.")
+
+        except Exception as e:  # pylint: disable=broad-except
+            log.error(e)
+            return jsonify({"status": "failed", "message": str(e)}), 400
+
+        if run_async:
+            queued = queue_batch(files, uniq_keys, unique_key, reupload)
+            accepted = all("job-id" in result for result in queued)
+            return jsonify({"status": "QUEUED" if accepted else "failed", "message": "", "results": queued}), 202
+
+        results = uploader.upload_many(files, uniq_keys, default_key=unique_key, reupload=reupload)
+        failed = sum(not Status(result["status"]).succeeded for result in results)
+        status = Status.OK.value if not failed else Status.ERROR.value
+
+        return jsonify(
+            {"status": status, "message": f"{len(results) - failed} of {len(results)} uploaded", "results": results}
+        )
+
+
+def queue_batch(files: list, uniq_keys: dict, unique_key: str, reupload: bool) -> list:
+    """
+    Queue the upload of each version of a batch, see `upload_batch`.
+
+    Args:
+        files (list): uploaded versions.
+        uniq_keys (dict): unique key of each project.
+        unique_key (str): unique key of the projects missing from `uniq_keys`.
+        reupload (bool): reupload versions.
+
+    Returns:
+        list: the queued job of each version, or why it could not be queued.
+    """
+    queued = []
+    for uploaded_file in files:
+        name = str(uploaded_file.filename).rsplit("-", maxsplit=1)[0]
+        try:
+            job = upload_jobs.submit(uploaded_file, uniq_key=uniq_keys.get(name, unique_key), reupload=reupload)
+        except Exception as e:  # pylint: disable=broad-except
+            queued.append({"file": str(uploaded_file.filename), "status": "failed", "message": str(e)})
+        else:
+            job_url = url_for("manage.job_status", job_id=job.job_id)
+            queued.append({"file": job.filename, "status": job.state.value, "job-id": job.job_id, "job-url": job_url})
+
+    return queued
+
+
+@manage_routes.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    """
+    Get the progress of an asynchronous upload.
+
+    Example:
+        GET /manage/jobs/<job-id>
+
+    Returns:
+        A JSON doc with the job `state` (QUEUED, RUNNING, DONE, FAILED), current `stage`,
+        per-stage `timings` in seconds and the final upload `status` once done.
+    """
+    job = upload_jobs.get(job_id)
+
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+
+    return jsonify(job)
+
+
+@manage_routes.route("/cache", methods=["GET"])
+def cache_stats():
+    """
+    Get the hit/miss counters of the rendered page cache.
+
+    Example:
+        GET /manage/cache
+    """
+    return jsonify(page_cache.stats())
+
+
+@manage_routes.route("/profiles", methods=["GET"])
+def list_profiles():
+    """
+    List the stored request profiles, newest first. Only allowed with the `profile_token`.
+
+    Profile a request by sending it with the `X-Byteguide-Profile: <profile_token>` header,
+    its id is returned in the `X-Profile-Id` response header.
+
+    Example:
+        GET /manage/profiles
+    """
+    if not request_profiler.is_admin(request.remote_addr, request.headers.get(config.profile_header)):
+        return jsonify({"error": "Profiles require the profile token."}), 403
+
+    profiles = request_profiler.list_profiles()
+
+    for profile in profiles:
+        profile["url"] = url_for("manage.get_profile", profile_id=profile["id"])
+
+    return jsonify({"profiles": profiles})
+
+
+@manage_routes.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id: str):
+    """
+    Download a request profile, a `pstats` dump (`python -m pstats <file>`, snakeviz, ...).
+
+    Example:
+        GET /manage/profiles/<profile-id>
+        GET /manage/profiles/<profile-id>?format=text&sort=tottime
+    """
+    if not request_profiler.is_admin(request.remote_addr, request.headers.get(config.profile_header)):
+        return jsonify({"error": "Profiles require the profile token."}), 403
+
+    path = request_profiler.profile_path(profile_id)
+
+    if path is None:
+        return jsonify({"error": f"Profile {profile_id} not found"}), 404
+
+    if request.args.get("format") == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "ncalls", "filename"):
+            return jsonify({"error": f"invalid sort {sort!r}"}), 400
+
+        return Response(request_profiler.report(path, sort), mimetype="text/plain")
+
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=path.name)
+
+
+@manage_routes.route("/retention", methods=["GET"])
+def retention_report():
+    """
+    Dry run of the retention policies, reports which versions the pruner would delete.
+
+    Example:
+        GET /manage/retention
+        GET /manage/retention?project=Sample-Proj
+
+    Returns:
+        A JSON doc with, per project, its `policy` and the versions to `delete` and `keep`.
+    """
+    return jsonify(pruner.plan(request.args.get("project")))
+
+
 @manage_routes.route("/delete", methods=["POST"])
 def delete():
     """
@@ -0,0 +1,141 @@
+""" Routes read by the read-only replicas to copy the docs tree of the writer (see `libs.replication`). """
+import hmac
+import json
+
+from flask import Blueprint, Response, abort, jsonify, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from byteguide.config import config
+from byteguide.libs.delta import CHANGELOG
+from byteguide.libs.journal import TOKEN_HEADER, replication_journal
+from byteguide.libs.locks import project_locks
+from byteguide.libs.manifest import manifest_store
+from byteguide.libs.metastore import get_metadata_backend
+
+replication_routes = Blueprint("replication", __name__, url_prefix="/replication")
+
+
+def _is_hidden(*parts: str) -> bool:
+    return any(part.startswith(".") for part in parts)
+
+
+@replication_routes.before_request
+def authorize():
+    """
+    Only let replicas in: they must send the `replication_token` in the `X-Replication-Token` header,
+    the routes are disabled while no token is set.
+    """
+    if not config.replication_journal_enabled or not config.replication_token:
+        abort(404)
+
+    if not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ""), config.replication_token):
+        abort(403)
+
+
+@replication_routes.route("/journal", methods=["GET"])
+def get_journal():
+    """
+    Get the changes made after an offset of the journal.
+
+    Example:
+        GET /replication/journal?after=0&limit=500
+
+    Returns:
+        A JSON doc with the `events` and the offset to read the `next` ones from, 400 if
+        `after` is not the offset of an event.
+    """
+    try:
+        after = int(request.args.get("after", 0))
+        limit = min(int(request.args.get("limit", config.replication_batch_size)), config.replication_batch_size)
+        events, offset = replication_journal.read(after, max(limit, 1))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"events": events, "next": offset})
+
+
+@replication_routes.route("/snapshot", methods=["GET"])
+def get_snapshot():
+    """
+    Get the whole docs tree as events, for a replica starting from scratch.
+
+    Example:
+        GET /replication/snapshot
+
+    Returns:
+        A JSON doc with the `events` and the journal offset (`seq`) to continue from.
+    """
+    return jsonify(replication_journal.snapshot())
+
+
+@replication_routes.route("/projects/<project>/metadata", methods=["GET"])
+def get_metadata(project: str):
+    """
+    Get the metadata of a project, as stored (keys are not sorted, the order of the versions matters)
+    but without the `unique-key`, replicas do not accept uploads.
+
+    Example:
+        GET /replication/projects/sample-proj/metadata
+    """
+    backend = get_metadata_backend()
+
+    if _is_hidden(project) or not backend.exists(project):
+        abort(404)
+
+    metadata = backend.load(project)
+    metadata.pop("unique-key", None)
+
+    return Response(json.dumps(metadata), mimetype="application/json")
+
+
+@replication_routes.route("/projects/<project>/manifests/<version>", methods=["GET"])
+def get_manifest(project: str, version: str):
+    """
+    Get the manifest of a version, the manifest of a version uploaded before manifests were
+    recorded is built on the first request.
+
+    Example:
+        GET /replication/projects/sample-proj/manifests/1.0
+    """
+    if _is_hidden(project, version) or version == "latest":
+        abort(404)
+
+    manifest = manifest_store.load(project, version)
+
+    if manifest is None:
+        with project_locks.hold(project):
+            manifest = manifest_store.scan(project, version)
+
+            if manifest is None:
+                abort(404)
+
+            manifest_store.save(project, manifest)
+
+    return jsonify(manifest)
+
+
+@replication_routes.route("/projects/<project>/files/<path:path>", methods=["GET"])
+def get_file(project: str, path: str):
+    """
+    Download a file of a version, or the changelog of a project.
+
+    Example:
+        GET /replication/projects/sample-proj/files/1.0/index.html
+        GET /replication/projects/sample-proj/files/changelog.html
+    """
+    parts = path.split("/")
+
+    # the other files of the project directory (metadata.json...) are not served
+    if _is_hidden(project, *parts) or (len(parts) == 1 and path != CHANGELOG):
+        abort(404)
+
+    file_path = safe_join(str(config.docfiles_dir), project, path)
+
+    if file_path is None:
+        abort(404)
+
+    try:
+        return send_file(file_path, request.environ, mimetype="application/octet-stream", max_age=0)
+    except (FileNotFoundError, IsADirectoryError):
+        abort(404)
@@ -0,0 +1,80 @@
+""" Production server for byteguide, a pre-forking multi-worker gunicorn server. """
+import typing as t
+
+from gunicorn.app.base import BaseApplication  # type: ignore
+from loguru import logger as log
+
+from byteguide import app
+from byteguide.config import config
+from byteguide.libs.catalog import project_catalog
+from byteguide.libs.replication import replicator
+from byteguide.libs.retention import pruner
+
+
+def warm_up() -> None:
+    """
+    Prepare a worker before it accepts traffic: load the project catalog and compile the templates.
+    """
+    projects = project_catalog.projects()
+
+    templates = app.jinja_env.list_templates(extensions=["html"])
+    for template in templates:
+        app.jinja_env.get_template(template)
+
+    log.info(f"worker warmed up, {len(projects)} projects and {len(templates)} templates loaded")
+
+
+def post_worker_init(worker: t.Any) -> None:  # pylint: disable=unused-argument
+    """
+    gunicorn hook, runs in each worker once the app is loaded and before it starts serving.
+
+    Args:
+        worker (t.Any): gunicorn worker.
+    """
+    warm_up()
+    pruner.start()
+    replicator.start()
+
+
+def server_options() -> t.Dict[str, t.Any]:
+    """
+    Get the gunicorn settings from the byteguide config.
+
+    Returns:
+        t.Dict[str, t.Any]: gunicorn settings.
+    """
+    return {
+        "bind": f"{config.host}:{config.port}",
+        "workers": config.workers,
+        "threads": config.threads,
+        "worker_class": "gthread",
+        # recycle workers after a number of requests, the jitter avoids restarting them all at once
+        "max_requests": config.worker_max_requests,
+        "max_requests_jitter": config.worker_max_requests_jitter,
+        "timeout": config.worker_timeout,
+        "graceful_timeout": config.graceful_timeout,
+        "post_worker_init": post_worker_init,
+    }
+
+
+class ByteGuideServer(BaseApplication):  # pylint: disable=abstract-method
+    """
+    gunicorn application serving byteguide.
+    """
+
+    def load_config(self):
+        for key, value in server_options().items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return app
+
+
+def run() -> None:
+    """
+    Run byteguide with gunicorn.
+
+    Send `SIGHUP` to the master process for a graceful reload (new workers are started
+    and warmed up before the old ones are stopped), `SIGTERM` for a graceful shutdown.
+    """
+    ByteGuideServer().run()
@@ -1,5 +1,14 @@
 from byteguide import app
 from byteguide.config import config
+from byteguide.libs.replication import replicator
+from byteguide.libs.retention import pruner
 
 if __name__ == "__main__":
-    app.run(host=config.host, port=config.port, debug=config.debug)
+    if config.debug:
+        pruner.start()
+        replicator.start()
+        app.run(host=config.host, port=config.port, debug=config.debug)
+    else:
+        from byteguide.server import run
+
+        run()